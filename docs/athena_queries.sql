@@ -3,7 +3,7 @@
 -- Ajuste conforme seu ambiente:
 --   - Workgroup: selecione o workgroup do projeto no Console do Athena
 --   - Database:  b3-pipeline-db-dev (exemplo)
---   - Tabela:    dataset_petr4 (exemplo)
+--   - Tabela:    dataset_petr4 (exemplo); agregações em agg_mensal e agg_total (Q7/Q8)
 --
 -- Dica: rode de cima para baixo durante a gravação do vídeo.
 
@@ -61,30 +61,32 @@ GROUP BY 1,2,3,4
 ORDER BY year DESC, month DESC, day DESC
 LIMIT 50;
 
--- Q7 — agregação mensal (R5-A) demonstrada via SQL
+-- Q7 — agregação mensal (R5-A), gravada pelo Glue em agg_mensal (um registro por ticker/mês)
 SELECT
   ticker,
   year,
   month,
-  COUNT(*) AS qtd_dias,
-  AVG(preco_fechamento) AS preco_medio,
-  MIN(preco_fechamento) AS preco_min,
-  MAX(preco_fechamento) AS preco_max,
-  SUM(volume_negociado) AS volume_total
-FROM dataset_petr4
-GROUP BY 1,2,3
-ORDER BY year DESC, month DESC;
+  qtd_dias_negociacao AS qtd_dias,
+  preco_medio_mensal AS preco_medio,
+  preco_minimo_mensal AS preco_min,
+  preco_maximo_mensal AS preco_max,
+  volume_total_mensal AS volume_total,
+  preco_desvio_padrao
+FROM agg_mensal
+WHERE dataset = 'petr4'
+ORDER BY ultima_data DESC;
 
--- Q8 — resumo do período (R5-A)
+-- Q8 — resumo do período (R5-A), gravado pelo Glue em agg_total (um registro por ticker)
 SELECT
   ticker,
-  MIN(date) AS data_inicio,
-  MAX(date) AS data_fim,
-  COUNT(*) AS total_dias,
-  AVG(preco_fechamento) AS preco_medio_periodo,
-  SUM(volume_negociado) AS volume_total_periodo
-FROM dataset_petr4
-GROUP BY 1;
+  data_inicio,
+  data_fim,
+  total_dias_analisados AS total_dias,
+  preco_medio_periodo,
+  volume_total_periodo,
+  variacao_percentual_periodo
+FROM agg_total
+WHERE dataset = 'petr4';
 
 -- Q9 — (extra, opcional) top variações diárias (boa para demonstrar análise)
 SELECT
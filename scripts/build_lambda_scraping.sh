@@ -24,10 +24,9 @@ echo "1. Copiando código Lambda..."
 cp "$LAMBDA_DIR/lambda_scraping.py" "$BUILD_DIR/"
 
 echo "2. Instalando dependências no build..."
+# Sem pandas/requests: só pyarrow (+ numpy). boto3 e urllib3 já vêm no runtime python3.12.
 pip install \
-    pandas==2.2.0 \
-    pyarrow==15.0.0 \
-    requests==2.31.0 \
+    -r "$LAMBDA_DIR/requirements.txt" \
     -t "$BUILD_DIR/" \
     --platform manylinux2014_x86_64 \
     --only-binary=:all: \
@@ -39,8 +38,24 @@ find . -type d -name "tests" -exec rm -rf {} + 2>/dev/null || true
 find . -type d -name "__pycache__" -exec rm -rf {} + 2>/dev/null || true
 find . -name "*.pyc" -delete
 find . -name "*.dist-info" -type d -exec rm -rf {} + 2>/dev/null || true
+# Cabeçalhos C++/Cython e módulos do pyarrow que a Lambda não usa (Flight, Substrait)
+rm -rf pyarrow/include pyarrow/src
+find pyarrow -name "*.pxd" -o -name "*.pyx" -o -name "*.pxi" | xargs rm -f
+rm -f pyarrow/libarrow_flight.so* pyarrow/_flight*.so pyarrow/flight.py
+rm -f pyarrow/libarrow_substrait.so* pyarrow/_substrait*.so pyarrow/substrait.py
+# Bytecode pré-compilado para o runtime (/var/task é somente leitura: sem .pyc, todo
+# cold start recompila). unchecked-hash: válido mesmo com mtimes alterados pelo ZIP.
+if command -v python3.12 >/dev/null 2>&1; then
+    python3.12 -m compileall -q -j 0 --invalidation-mode unchecked-hash .
+else
+    echo "⚠️  python3.12 não encontrado: pacote sem .pyc pré-compilado"
+fi
 cd -
 
+echo "3b. Validando import e medindo cold start do pacote..."
+python scripts/measure_lambda_cold_start.py --build-dir "$BUILD_DIR" --runs 3 || \
+    echo "⚠️  Medição local indisponível (plataforma do build difere da local?)"
+
 echo "4. Criando ZIP..."
 cd "$BUILD_DIR"
 zip -r "../$(basename "$OUTPUT_ZIP")" . -q
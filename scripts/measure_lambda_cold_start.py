@@ -0,0 +1,157 @@
+#!/usr/bin/env python3
+"""
+Mede o custo de cold start da Lambda de scraping
+
+Local (reprodutível): importa o módulo em N processos novos e reporta o tempo de
+import (mediana), o tempo total do processo e os pacotes mais caros (-X importtime).
+Com --max-import-ms, falha (exit 1) se a mediana passar do limite — para pegar
+regressões (ex: alguém voltar a importar pandas).
+
+AWS (opcional): com --function-name, lê as linhas REPORT do CloudWatch Logs e
+resume Init Duration (cold starts), Duration e memória.
+
+Uso:
+    python scripts/measure_lambda_cold_start.py                       # código em src/lambda
+    python scripts/measure_lambda_cold_start.py --build-dir build/lambda_scraping --max-import-ms 1500
+    python scripts/measure_lambda_cold_start.py --function-name b3-pipeline-scraping-dev --since-hours 48
+"""
+
+import argparse
+import json
+import os
+import re
+import statistics
+import subprocess
+import sys
+import time
+from pathlib import Path
+
+IMPORT_SNIPPET = """
+import json, time
+t0 = time.perf_counter()
+import {module}
+print(json.dumps({{"import_ms": (time.perf_counter() - t0) * 1000}}))
+"""
+
+_IMPORTTIME_RE = re.compile(r"^import time:\s+(\d+) \|\s+(\d+) \|( *)(\S+)$")
+_REPORT_RE = {
+    'duration_ms': re.compile(r"\tDuration: ([\d.]+) ms"),
+    'init_ms': re.compile(r"Init Duration: ([\d.]+) ms"),
+    'memory_mb': re.compile(r"Max Memory Used: (\d+) MB"),
+}
+
+
+def _percentile(values: list[float], pct: float) -> float:
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, max(0, round(pct / 100 * (len(ordered) - 1))))
+    return ordered[index]
+
+
+def _dir_size_mb(path: Path) -> float:
+    return sum(f.stat().st_size for f in path.rglob('*') if f.is_file()) / 1024 / 1024
+
+
+def measure_import(code_dir: Path, module: str, runs: int) -> dict:
+    """Importa `module` em `runs` interpretadores novos (sem cache de processo)"""
+    env = dict(os.environ)
+    env['PYTHONPATH'] = str(code_dir)
+    # Criação do cliente S3 no import precisa de região (não de credenciais)
+    env.setdefault('AWS_DEFAULT_REGION', 'sa-east-1')
+
+    import_ms, process_ms = [], []
+    top_level: dict[str, int] = {}
+    for _ in range(runs):
+        started = time.perf_counter()
+        result = subprocess.run(
+            [sys.executable, '-X', 'importtime', '-c', IMPORT_SNIPPET.format(module=module)],
+            cwd=code_dir, env=env, capture_output=True, text=True
+        )
+        process_ms.append((time.perf_counter() - started) * 1000)
+        if result.returncode != 0:
+            raise RuntimeError(f"Falha ao importar {module}:\n{result.stderr[-2000:]}")
+
+        import_ms.append(json.loads(result.stdout.strip().splitlines()[-1])['import_ms'])
+
+        # Custo cumulativo dos imports feitos diretamente pelo módulo (última execução).
+        # -X importtime lista filhos antes do pai: os de nível 2 que precedem o módulo.
+        children: dict[str, int] = {}
+        for line in result.stderr.splitlines():
+            match = _IMPORTTIME_RE.match(line)
+            if not match:
+                continue
+            depth = len(match.group(3))
+            if depth == 3:
+                children[match.group(4)] = int(match.group(2))
+            elif depth == 1:
+                if match.group(4) == module:
+                    top_level = children
+                children = {}
+
+    heaviest = sorted(top_level.items(), key=lambda item: item[1], reverse=True)[:10]
+    return {
+        'runs': runs,
+        'import_ms_median': round(statistics.median(import_ms), 1),
+        'import_ms_max': round(max(import_ms), 1),
+        'process_ms_median': round(statistics.median(process_ms), 1),
+        'heaviest_imports_ms': {name: round(us / 1000, 1) for name, us in heaviest},
+        'package_mb': round(_dir_size_mb(code_dir), 1),
+    }
+
+
+def fetch_cloudwatch_reports(function_name: str, since_hours: float, region: str = None) -> dict:
+    """Resume as linhas REPORT da função (Init Duration só aparece em cold starts)"""
+    import boto3
+
+    logs = boto3.client('logs', region_name=region)
+    paginator = logs.get_paginator('filter_log_events')
+    start = int((time.time() - since_hours * 3600) * 1000)
+
+    values: dict[str, list[float]] = {key: [] for key in _REPORT_RE}
+    invocations = 0
+    for page in paginator.paginate(logGroupName=f"/aws/lambda/{function_name}",
+                                   startTime=start, filterPattern='REPORT'):
+        for event in page.get('events', []):
+            invocations += 1
+            for key, pattern in _REPORT_RE.items():
+                match = pattern.search(event['message'])
+                if match:
+                    values[key].append(float(match.group(1)))
+
+    summary = {'invocations': invocations, 'cold_starts': len(values['init_ms'])}
+    for key, series in values.items():
+        if series:
+            summary[key] = {
+                'p50': round(_percentile(series, 50), 1),
+                'p90': round(_percentile(series, 90), 1),
+                'max': round(max(series), 1),
+            }
+    return summary
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Mede import/init (cold start) da Lambda de scraping')
+    parser.add_argument('--build-dir', default='src/lambda',
+                        help='Diretório com o código (e dependências, se for o build empacotado)')
+    parser.add_argument('--module', default='lambda_scraping')
+    parser.add_argument('--runs', type=int, default=5, help='Processos novos a medir')
+    parser.add_argument('--max-import-ms', type=float, help='Falha se a mediana do import passar disso')
+    parser.add_argument('--function-name', help='Função na AWS para resumir as linhas REPORT')
+    parser.add_argument('--since-hours', type=float, default=24)
+    parser.add_argument('--region')
+
+    args = parser.parse_args()
+
+    report = {'local': measure_import(Path(args.build_dir).resolve(), args.module, args.runs)}
+    if args.function_name:
+        report['aws'] = fetch_cloudwatch_reports(args.function_name, args.since_hours, args.region)
+
+    print(json.dumps(report, indent=2, ensure_ascii=False))
+
+    median = report['local']['import_ms_median']
+    if args.max_import_ms is not None and median > args.max_import_ms:
+        print(f"❌ Import de {args.module}: {median:.0f} ms > limite de {args.max_import_ms:.0f} ms")
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,139 @@
+#!/usr/bin/env python3
+"""
+Regrava arquivos do raw fora do contrato (ingestion.raw_schema) na versão atual
+
+Substitui o antigo convert_parquet_to_csv.py (correção pontual de timestamp em
+nanossegundos): cada arquivo legado é lido pelo pyarrow, convertido com
+conform_raw e gravado no mesmo caminho. Arquivos já conformes são pulados, então
+o script pode ser reexecutado.
+
+No S3, cada regravação é um ObjectCreated em raw/ (o trigger coalesce por ticker
+e reprocessa as datas regravadas).
+
+Uso:
+    python scripts/migrate_raw_schema.py --root local_data/raw --dry-run
+    python scripts/migrate_raw_schema.py --s3-bucket meu-bucket --prefix raw/dataset=petr4/
+"""
+
+import argparse
+import logging
+import os
+import sys
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from io import BytesIO
+from pathlib import Path
+
+import pyarrow as pa
+import pyarrow.parquet as pq
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / "src"))
+
+from ingestion.raw_schema import RAW_SCHEMA_VERSION, RawSchemaError, conform_raw, validate_raw_schema
+from ingestion.s3_uploader import FINGERPRINT_METADATA_KEY, content_fingerprint
+
+logging.basicConfig(
+    level=logging.INFO,
+    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s'
+)
+logger = logging.getLogger(__name__)
+
+# Colunas de partição gravadas dentro de arquivos compactados (mês/ano)
+PARTITION_COLUMNS = ('year', 'month', 'day')
+
+
+def _migrate_table(table: pa.Table) -> pa.Table:
+    return conform_raw(table, keep=PARTITION_COLUMNS)
+
+
+def _to_bytes(table: pa.Table) -> bytes:
+    buffer = pa.BufferOutputStream()
+    pq.write_table(table, buffer, compression='snappy')
+    return buffer.getvalue().to_pybytes()
+
+
+def migrate_local(root: Path, dry_run: bool = False) -> dict:
+    stats = {'migrated': 0, 'conform': 0, 'failed': 0}
+    for path in sorted(root.rglob('*.parquet')):
+        if path.name.startswith(('.', '_')):
+            continue
+        problems = validate_raw_schema(pq.read_schema(path))
+        if not problems:
+            stats['conform'] += 1
+            continue
+        logger.info(f"{path}: {'; '.join(problems)}")
+        try:
+            table = _migrate_table(pq.read_table(path))
+        except RawSchemaError as e:
+            logger.error(f"❌ {path}: {e}")
+            stats['failed'] += 1
+            continue
+        if not dry_run:
+            tmp_path = path.with_name(f".{path.name}.{uuid.uuid4().hex}.tmp")
+            pq.write_table(table, tmp_path, compression='snappy')
+            os.replace(tmp_path, path)
+        stats['migrated'] += 1
+    return stats
+
+
+def migrate_s3(bucket: str, prefix: str, dry_run: bool = False, max_workers: int = 16) -> dict:
+    import boto3
+    from botocore.config import Config
+
+    s3 = boto3.client('s3', config=Config(max_pool_connections=max_workers))
+    keys = []
+    for page in s3.get_paginator('list_objects_v2').paginate(Bucket=bucket, Prefix=prefix):
+        keys.extend(obj['Key'] for obj in page.get('Contents', []) if obj['Key'].endswith('.parquet'))
+
+    def _migrate(key: str) -> str:
+        body = s3.get_object(Bucket=bucket, Key=key)['Body'].read()
+        problems = validate_raw_schema(pq.read_schema(BytesIO(body)))
+        if not problems:
+            return 'conform'
+        logger.info(f"s3://{bucket}/{key}: {'; '.join(problems)}")
+        try:
+            table = _migrate_table(pq.read_table(BytesIO(body)))
+        except RawSchemaError as e:
+            logger.error(f"❌ s3://{bucket}/{key}: {e}")
+            return 'failed'
+        if not dry_run:
+            s3.put_object(
+                Bucket=bucket,
+                Key=key,
+                Body=_to_bytes(table),
+                ContentType='application/x-parquet',
+                Metadata={FINGERPRINT_METADATA_KEY: content_fingerprint(table)}
+            )
+        return 'migrated'
+
+    stats = {'migrated': 0, 'conform': 0, 'failed': 0}
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        for result in executor.map(_migrate, keys):
+            stats[result] += 1
+    return stats
+
+
+def main():
+    parser = argparse.ArgumentParser(description=f'Migra o raw para o contrato v{RAW_SCHEMA_VERSION}')
+    parser.add_argument('--root', help='Raiz local do raw (saída de save_local_parquet)')
+    parser.add_argument('--s3-bucket', help='Bucket do data lake')
+    parser.add_argument('--prefix', default='raw/', help='Prefixo no S3')
+    parser.add_argument('--max-workers', type=int, default=16)
+    parser.add_argument('--dry-run', action='store_true', help='Só lista os arquivos fora do contrato')
+
+    args = parser.parse_args()
+    if bool(args.root) == bool(args.s3_bucket):
+        parser.error('Informe exatamente um de --root ou --s3-bucket')
+
+    if args.root:
+        stats = migrate_local(Path(args.root), dry_run=args.dry_run)
+    else:
+        stats = migrate_s3(args.s3_bucket, args.prefix, dry_run=args.dry_run, max_workers=args.max_workers)
+
+    logger.info(f"{'(dry-run) ' if args.dry_run else ''}Migração: {stats}")
+    if stats['failed']:
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -5,11 +5,16 @@ def main() -> None:
     s3 = boto3.client("s3")
 
     bucket = "pos-tech-b3-pipeline-cezar-2026"
-    key = "glue/scripts/glue_etl_job.py"
-    file_path = "src/glue/glue_etl_job.py"
+    # O script importa indicators.py e etl_plan.py (--extra-py-files no job)
+    files = {
+        "glue/scripts/glue_etl_job.py": "src/glue/glue_etl_job.py",
+        "glue/scripts/indicators.py": "src/glue/indicators.py",
+        "glue/scripts/etl_plan.py": "src/glue/etl_plan.py",
+    }
 
-    print(f"Fazendo upload de {file_path} para s3://{bucket}/{key}...")
-    s3.upload_file(file_path, bucket, key)
+    for key, file_path in files.items():
+        print(f"Fazendo upload de {file_path} para s3://{bucket}/{key}...")
+        s3.upload_file(file_path, bucket, key)
     print("✅ Upload concluído!")
 
 
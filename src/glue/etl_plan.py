@@ -0,0 +1,321 @@
+"""
+Planejamento do Glue ETL (glue_etl_job.py): funções puras, sem Spark
+
+- Contrato do raw: validação pelos footers, agrupamento dos arquivos por schema físico
+  e a regra de desempate do mesmo pregão gravado por produtores diferentes
+- Modo incremental: arquivos a ler e períodos refined a reescrever para as datas
+  alteradas, meses agregados tocados e continuidade do estado dos indicadores
+- Dimensionamento dos arquivos de saída
+
+O Glue recebe o módulo via --extra-py-files (como indicators.py); o motor local
+(local_etl.py) e os testes o importam do pacote glue.
+"""
+
+import bisect
+import calendar
+from datetime import date
+
+# Layout em S3 das agregações persistidas e do estado dos indicadores
+AGG_MONTHLY_PREFIX = "refined_agg/agg_mensal"
+AGG_TOTAL_PREFIX = "refined_agg/agg_total"
+INDICATOR_STATE_PREFIX = "refined_agg/indicadores_estado"
+
+
+# ===================================================================
+# Contrato do raw
+# ===================================================================
+
+# Versão do contrato do raw (src/ingestion/raw_schema.py), gravada na metadata do Parquet
+RAW_SCHEMA_VERSION = 1
+SCHEMA_VERSION_KEY = b"raw_schema_version"
+
+# Schema alvo do raw: só estas colunas são lidas (demais metadados de produtor são podados).
+# extraction_timestamp/data_source só desempatam (ticker, Date) repetidos
+RAW_TARGET_COLUMNS = {
+    "ticker": "string",
+    "Date": "string",
+    "Open": "double",
+    "High": "double",
+    "Low": "double",
+    "Close": "double",
+    "Volume": "double",
+    "extraction_timestamp": "string",
+    "data_source": "string",
+}
+
+# (ticker, Date) repetidos: fica a linha do produtor de maior prioridade (data_source,
+# nesta ordem; desconhecido/nulo por último), depois a de extraction_timestamp mais
+# recente (nulo por último) e, por fim, a do último arquivo na ordem dos caminhos
+RAW_SOURCE_PRIORITY = ("real_api_extraction", "brapi_lambda", "yahoo_finance_manual_csv")
+
+# Tipos Arrow (footer) -> tipos Spark para o schema de leitura de cada grupo
+_SPARK_TYPES = {
+    "int8": "tinyint", "int16": "smallint", "int32": "int", "int64": "bigint",
+    "float": "float", "double": "double", "string": "string", "large_string": "string",
+    "date32[day]": "date", "bool": "boolean",
+}
+
+
+def _spark_type(arrow_type) -> str | None:
+    name = str(arrow_type)
+    if name.startswith("timestamp"):
+        return "timestamp"
+    return _SPARK_TYPES.get(name)
+
+
+def check_raw_contract(schemas: dict) -> list[str]:
+    """
+    Validação barata (só footers) do contrato do raw.
+
+    Arquivos legados (sem a versão) continuam legíveis pela projeção por grupo;
+    timestamps em nanossegundos não são lidos pelo Spark e interrompem o job.
+
+    Returns:
+        URIs legadas (fora da versão atual do contrato)
+    """
+    legacy, unreadable = [], []
+    for uri, schema in schemas.items():
+        version = (schema.metadata or {}).get(SCHEMA_VERSION_KEY)
+        if version is None or int(version) != RAW_SCHEMA_VERSION:
+            legacy.append(uri)
+        if any(str(schema.field(name).type) == "timestamp[ns]"
+               for name in RAW_TARGET_COLUMNS if name in schema.names):
+            unreadable.append(uri)
+    if unreadable:
+        raise ValueError(
+            f"{len(unreadable)} arquivos com timestamp em nanossegundos (ex: {unreadable[0]}); "
+            "regrave o raw com scripts/migrate_raw_schema.py"
+        )
+    return legacy
+
+
+def group_by_schema(schemas: dict) -> dict[tuple, list[str]]:
+    """
+    Agrupa os arquivos pelo tipo físico das colunas alvo (um grupo por produtor).
+
+    A chave é ((coluna_alvo, coluna_no_arquivo, tipo_spark), ...), só com as colunas
+    presentes; colunas extras não separam grupos (são podadas na leitura).
+    """
+    groups: dict[tuple, list[str]] = {}
+    for uri, schema in schemas.items():
+        signature = []
+        for target in RAW_TARGET_COLUMNS:
+            # Normalizar nomes: 'ticker' pode vir como 'Ticker' no arquivo
+            source = next((name for name in (target, target.capitalize()) if name in schema.names), None)
+            if source is None:
+                continue
+            spark_type = _spark_type(schema.field(source).type)
+            if spark_type is not None:
+                signature.append((target, source, spark_type))
+        groups.setdefault(tuple(signature), []).append(uri)
+    return groups
+
+
+# ===================================================================
+# Saída refined e modo incremental
+# ===================================================================
+
+# Saída refined: tamanho alvo por arquivo e layout de partições
+DEFAULT_TARGET_FILE_MB = 128
+REFINED_LAYOUTS = {
+    "day": ["year", "month", "day"],
+    "month": ["year", "month"],
+}
+# Refined tem ~2x as colunas do raw (médias, variação, partições derivadas)
+REFINED_BYTES_RATIO = 2.0
+
+
+def plan_output_files(rows: int, input_bytes: int, input_rows: int,
+                      target_file_bytes: int) -> tuple[int, int]:
+    """
+    Número de tarefas de escrita e limite de linhas por arquivo para o tamanho alvo.
+
+    Bytes por linha estimados pelo Parquet de entrada (comprimido) x REFINED_BYTES_RATIO.
+
+    Returns:
+        (num_partitions, max_records_per_file)
+    """
+    bytes_per_row = max(1.0, REFINED_BYTES_RATIO * input_bytes / max(1, input_rows))
+    estimated_bytes = rows * bytes_per_row
+    num_partitions = max(1, -(-int(estimated_bytes) // target_file_bytes))
+    max_records_per_file = max(1, int(target_file_bytes / bytes_per_row))
+    return num_partitions, max_records_per_file
+
+
+# Linhas anteriores exigidas pelas janelas: rowsBetween(-4, 0) das médias de 5 dias
+# (o lag de 1 dia do Preco_Dia_Anterior cabe nelas)
+WINDOW_LOOKBACK_ROWS = 4
+
+
+# --CHANGED_DATES: "ticker:data" (ou "data" para todos os tickers); "ticker:*" = histórico completo
+ALL_DATES = "*"
+
+
+def parse_changed_dates(text: str, tickers: list[str]) -> dict[str, list[str]]:
+    """
+    --CHANGED_DATES -> {ticker: datas alteradas "yyyy-MM-dd" ordenadas}.
+
+    Ticker ausente do resultado é processado com o histórico completo (inclusive
+    os de --TICKERS sem datas, na dúvida).
+    """
+    dates: dict[str, set[str]] = {}
+    full = set()
+    for entry in (part.strip() for part in (text or "").split(",")):
+        if not entry:
+            continue
+        ticker, _, value = entry.rpartition(":")
+        targets = [ticker.strip().lower()] if ticker else tickers
+        for target in targets:
+            if value.strip() == ALL_DATES:
+                full.add(target)
+            else:
+                dates.setdefault(target, set()).add(value.strip())
+    return {ticker: sorted(dates[ticker]) for ticker in tickers if ticker in dates and ticker not in full}
+
+
+def _partition_value(uri: str, name: str) -> int | None:
+    needle = f"{name}="
+    for part in uri.split("/"):
+        if part.startswith(needle) and part[len(needle):].isdigit():
+            return int(part[len(needle):])
+    return None
+
+
+def file_date_range(uri: str) -> tuple[date, date] | None:
+    """Período coberto pelo arquivo: o dia, ou o mês/ano inteiro (arquivos compactados)"""
+    year = _partition_value(uri, "year")
+    month = _partition_value(uri, "month")
+    day = _partition_value(uri, "day")
+    if year is None:
+        return None
+    if month is None:
+        return date(year, 1, 1), date(year, 12, 31)
+    if day is None:
+        return date(year, month, 1), date(year, month, calendar.monthrange(year, month)[1])
+    return date(year, month, day), date(year, month, day)
+
+
+def plan_incremental_read(uris: list[str], changed_dates: list[str],
+                          lookback_rows: int = WINDOW_LOOKBACK_ROWS, whole_months: bool = False,
+                          through_end: bool = False):
+    """
+    Arquivos a ler e períodos a reescrever para um conjunto de datas alteradas.
+
+    Uma data alterada afeta a própria linha e as `lookback_rows` seguintes (que a
+    têm na janela); cada linha afetada precisa das `lookback_rows` anteriores.
+    As linhas são contadas pelas partições listadas (dias de pregão); um arquivo
+    compactado (mês/ano) conta como janela inteira, exceto o que contém a data
+    alterada (ela pode ser a última linha dele). Com `whole_months` (layout
+    refined por mês), os meses tocados são reescritos por completo; com
+    `through_end`, tudo a partir da primeira partição afetada (indicadores de
+    memória longa sem estado contínuo até as linhas seguintes).
+
+    Returns:
+        (uris a ler, [(início, fim)] afetados) ou None se algum arquivo estiver
+        fora do layout year=/month=/day= (cai no processamento completo)
+    """
+    units: dict[tuple[date, date], list[str]] = {}
+    for uri in uris:
+        period = file_date_range(uri)
+        if period is None:
+            return None
+        units.setdefault(period, []).append(uri)
+
+    periods = sorted(units)
+    weight = [1 if start == end else lookback_rows + 1 for start, end in periods]
+
+    affected: set[int] = set()
+    for changed in sorted(date.fromisoformat(d) for d in changed_dates):
+        index = next((i for i, (_, end) in enumerate(periods) if end >= changed), len(periods))
+        if index == len(periods):
+            continue
+        affected.add(index)
+        rows, index = 1, index + 1
+        while index < len(periods) and rows < lookback_rows + 1:
+            affected.add(index)
+            rows += weight[index]
+            index += 1
+
+    if through_end and affected:
+        affected |= set(range(min(affected), len(periods)))
+
+    if whole_months:
+        months = {(day.year, day.month) for index in affected for day in periods[index]}
+        affected |= {index for index, (start, end) in enumerate(periods)
+                     if (start.year, start.month) in months or (end.year, end.month) in months}
+
+    to_read = set(affected)
+    for index in affected:
+        rows = 0
+        previous = index - 1
+        while previous >= 0 and rows < lookback_rows:
+            to_read.add(previous)
+            rows += weight[previous]
+            previous -= 1
+
+    # Partições afetadas consecutivas viram um único intervalo
+    ranges: list[list[date]] = []
+    for index in sorted(affected):
+        start, end = periods[index]
+        if ranges and index - 1 in affected:
+            ranges[-1][1] = end
+        else:
+            ranges.append([start, end])
+
+    read_uris = sorted(uri for index in to_read for uri in units[periods[index]])
+    return read_uris, [(start, end) for start, end in ranges]
+
+
+def months_in_ranges(ranges: list[tuple[date, date]]) -> list[str]:
+    """Meses ("yyyy-MM") cobertos pelos intervalos"""
+    months = set()
+    for start, end in ranges:
+        year, month = start.year, start.month
+        while (year, month) <= (end.year, end.month):
+            months.add(f"{year:04d}-{month:02d}")
+            year, month = (year + 1, 1) if month == 12 else (year, month + 1)
+    return sorted(months)
+
+
+def indicator_carry_ok(uris: list[str], last_date: str, ranges: list[tuple[date, date]]) -> bool:
+    """
+    O estado (na última data processada) pode continuar nas linhas a reescrever?
+
+    Exige que ele seja anterior ao primeiro período afetado e que todo arquivo
+    com linhas depois dele esteja dentro dos períodos afetados: linhas fora deles
+    (antes do primeiro, entre dois ou após o último) nunca seriam incorporadas ao
+    estado nem reescritas com ele.
+    """
+    last = date.fromisoformat(last_date)
+    start = min(range_start for range_start, _ in ranges)
+    if last >= start:
+        return False
+    for uri in uris:
+        period = file_date_range(uri)
+        if period is None:
+            return False
+        if period[1] > last and not any(range_start <= period[0] and period[1] <= range_end
+                                         for range_start, range_end in ranges):
+            return False
+    return True
+
+
+def pick_indicator_carry(uris: list[str], candidates: list[tuple[str, str]],
+                         ranges: list[tuple[date, date]]) -> tuple[str, str] | None:
+    """
+    Primeiro estado gravado (data, estado), na ordem dada, que pode continuar nas
+    linhas a reescrever. No layout "month" o último estado costuma cair dentro do
+    mês reescrito; o do fim do mês anterior é a alternativa.
+    """
+    return next(((last_date, state) for last_date, state in candidates
+                 if last_date and state and indicator_carry_ok(uris, last_date, ranges)), None)
+
+
+def month_checkpoint_split(dates) -> int:
+    """
+    Linhas (datas "yyyy-MM-dd" ordenadas) anteriores ao mês da última: o estado
+    dos indicadores após elas é o ponto de retomada do fim do mês anterior
+    """
+    if len(dates) == 0:
+        return 0
+    return bisect.bisect_left(dates, f"{dates[-1][:7]}-01")
@@ -5,61 +5,344 @@ Atende Requisitos R5 (A, B, C) do Tech Challenge
 Transformações implementadas:
 A) Agrupamento numérico: GROUP BY por ticker com agregações (AVG, SUM, COUNT)
 B) Renomear colunas: Close -> Preco_Fechamento, Volume -> Volume_Negociado
-C) Cálculo com base na data: Moving Average 5 dias, Variação Percentual
+C) Cálculo com base na data: Moving Average 5 dias, Variação Percentual e
+   indicadores técnicos (indicators.py, enviado via --extra-py-files)
 
 Input: s3://bucket/raw/dataset=petr4/ticker=petr4/year=YYYY/month=MM/day=DD/
 Output: s3://bucket/refined/dataset=petr4/ticker=petr4/year=YYYY/month=MM/day=DD/
+Agregações: s3://bucket/refined_agg/agg_mensal/dataset=petr4/ticker=petr4/ (estado por mês)
+            s3://bucket/refined_agg/agg_total/dataset=petr4/ticker=petr4/ (fusão dos meses)
+
+Multi-ticker (--TICKERS=a,b,c ou --TICKERS=all): um único run processa vários
+tickers do dataset (janelas por ticker) e grava refined/dataset=X/ticker=Y/...
+para cada um. Sem --TICKERS, processa apenas --TICKER.
+
+Planejamento (contrato do raw, leitura incremental, tamanho dos arquivos) em
+etl_plan.py, também enviado via --extra-py-files.
+
+Modo incremental (--CHANGED_DATES=ticker:data,..., enviado pela Lambda de trigger
+com todos os tickers do dataset que mudaram; data sem ticker vale para todos): lê só as
+partições alteradas, as seguintes cujas janelas elas afetam e o lookback que
+essas janelas precisam; reescreve apenas as partições refined afetadas
+(partitionOverwriteMode=dynamic). Os meses tocados são lidos inteiros e seu estado
+agregado substitui o gravado; o total é refeito só a partir do agregado mensal.
+Os indicadores continuam do estado gravado em refined_agg/indicadores_estado
+(O(1) por pregão novo); no layout "month" (mês reescrito inteiro), do estado do
+fim do mês anterior, gravado junto. Sem estado contínuo até as datas alteradas, o
+ticker é reprocessado por inteiro (ex: 1º run do layout "month" sobre estados
+antigos, que não têm o do fim do mês). Sem --CHANGED_DATES, processa todo o histórico.
 """
 
 import sys
+from concurrent.futures import ThreadPoolExecutor
 
 import boto3
+import numpy as np
+import pyarrow.fs as pafs
+import pyarrow.parquet as pq
 from awsglue.utils import getResolvedOptions
 from pyspark.context import SparkContext
 from awsglue.context import GlueContext
 from awsglue.job import Job
+from pyspark import StorageLevel
+from pyspark.sql import Observation
 from pyspark.sql import functions as F
+from pyspark.sql.types import DoubleType, StringType, StructField, StructType
 from pyspark.sql.window import Window
 
+from etl_plan import (
+    AGG_MONTHLY_PREFIX,
+    AGG_TOTAL_PREFIX,
+    DEFAULT_TARGET_FILE_MB,
+    INDICATOR_STATE_PREFIX,
+    RAW_SCHEMA_VERSION,
+    RAW_SOURCE_PRIORITY,
+    RAW_TARGET_COLUMNS,
+    REFINED_LAYOUTS,
+    check_raw_contract,
+    group_by_schema,
+    month_checkpoint_split,
+    months_in_ranges,
+    parse_changed_dates,
+    pick_indicator_carry,
+    plan_incremental_read,
+    plan_output_files,
+)
+from indicators import compute_indicators_split, dumps_state, indicator_columns, loads_state
+
 
-def list_parquet_files(bucket: str, prefix: str) -> list[str]:
+def list_parquet_files(bucket: str, prefix: str) -> dict[str, int]:
+    """URIs dos Parquet sob o prefixo, com o tamanho em bytes (usado para dimensionar a saída)"""
     s3 = boto3.client("s3", region_name="sa-east-1")
     paginator = s3.get_paginator("list_objects_v2")
-    uris: list[str] = []
+    sizes: dict[str, int] = {}
     for page in paginator.paginate(Bucket=bucket, Prefix=prefix):
         for obj in page.get("Contents", []):
             key = obj.get("Key")
             if key and key.endswith(".parquet"):
-                uris.append(f"s3://{bucket}/{key}")
-    return sorted(uris)
+                sizes[f"s3://{bucket}/{key}"] = obj.get("Size", 0)
+    return dict(sorted(sizes.items()))
+
+
+def list_ticker_prefixes(bucket: str, prefix: str) -> list[str]:
+    """Tickers com dados sob o prefixo (subprefixos ticker=, sem listar os arquivos)"""
+    s3 = boto3.client("s3", region_name="sa-east-1")
+    paginator = s3.get_paginator("list_objects_v2")
+    tickers = []
+    for page in paginator.paginate(Bucket=bucket, Prefix=prefix, Delimiter="/"):
+        for common in page.get("CommonPrefixes", []):
+            part = common["Prefix"].rstrip("/").rsplit("/", 1)[-1]
+            if part.startswith("ticker="):
+                tickers.append(part[len("ticker="):])
+    return sorted(tickers)
+
+
+def read_footer_schemas(uris: list[str], max_workers: int = 32) -> dict:
+    """Schema físico de cada arquivo (só o footer; leituras em paralelo no driver)"""
+    fs = pafs.S3FileSystem(region="sa-east-1")
+
+    def _schema(uri: str):
+        with fs.open_input_file(uri[len("s3://"):]) as f:
+            return pq.read_schema(f)
+
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        return dict(zip(uris, executor.map(_schema, uris)))
+
+
+RAW_FILE_COLUMN = "_arquivo_raw"
+
+
+def project_raw(df, signature: tuple):
+    """Projeção única que concilia o grupo com RAW_TARGET_COLUMNS"""
+    present = {target: (source, spark_type) for target, source, spark_type in signature}
+    columns = []
+    for target, target_type in RAW_TARGET_COLUMNS.items():
+        if target not in present:
+            # Sem coluna ticker no arquivo: vem do caminho (raw/dataset=/ticker=/...)
+            fallback = F.regexp_extract(F.input_file_name(), "ticker=([^/]+)", 1) if target == "ticker" \
+                else F.lit(None)
+            columns.append(fallback.cast(target_type).alias(target))
+            continue
+        source, spark_type = present[target]
+        col = F.col(f"`{source}`")
+        if target == "Date":
+            # Timestamp/date -> "yyyy-MM-dd"; string (ex: "2025-01-02 00:00:00") -> 10 primeiros caracteres
+            col = F.date_format(col, "yyyy-MM-dd") if spark_type in ("timestamp", "date") \
+                else F.substring(col.cast("string"), 1, 10)
+        elif target == "ticker":
+            col = F.lower(F.trim(col.cast("string")))
+        else:
+            col = col.cast(target_type)
+        columns.append(col.alias(target))
+    # Caminho do arquivo: último critério de desempate (drop_duplicate_sessions)
+    return df.select(*columns, F.input_file_name().alias(RAW_FILE_COLUMN))
+
+
+def drop_duplicate_sessions(df):
+    """Uma linha por (ticker, Date), escolhida pela regra de RAW_SOURCE_PRIORITY (etl_plan)"""
+    priority = F.create_map(*[F.lit(value) for rank, source in enumerate(RAW_SOURCE_PRIORITY)
+                              for value in (source, rank)])
+    ranking = Window.partitionBy("ticker", "Date").orderBy(
+        F.coalesce(priority[F.col("data_source")], F.lit(len(RAW_SOURCE_PRIORITY))),
+        F.col("extraction_timestamp").desc_nulls_last(),
+        F.col(RAW_FILE_COLUMN).desc(),
+    )
+    return df.withColumn("_rank", F.row_number().over(ranking)) \
+        .filter(F.col("_rank") == 1) \
+        .drop("_rank", "extraction_timestamp", "data_source", RAW_FILE_COLUMN)
+
+
+# Agregações persistidas (R5-A) em refined_agg/: estado mesclável por (ticker, mês).
+# O total do ticker é a fusão dos meses; no incremental só os meses tocados são
+# recalculados (a partir das linhas do mês) e fundidos ao estado já gravado
+MONTHLY_STATE_COLUMNS = [
+    "ticker", "year", "month",
+    "Qtd_Dias_Negociacao", "Soma_Preco_Fechamento", "Soma_Quadrados_Preco_Fechamento",
+    "Preco_Minimo_Mensal", "Preco_Maximo_Mensal", "Volume_Total_Mensal",
+    "Primeira_Data", "Ultima_Data", "Preco_Primeiro_Fechamento", "Preco_Ultimo_Fechamento",
+]
+
+
+def _sample_stddev(count_col, sum_col, sum_sq_col):
+    """Desvio padrão amostral a partir de (n, soma, soma dos quadrados); nulo com n < 2"""
+    variance = (sum_sq_col - sum_col * sum_col / count_col) / (count_col - 1)
+    return F.when(count_col > 1, F.sqrt(F.greatest(variance, F.lit(0.0))))
+
+
+def monthly_state(df):
+    """Estado mensal a partir das linhas diárias (colunas MONTHLY_STATE_COLUMNS)"""
+    return df.groupBy("ticker", "year", "month").agg(
+        F.count("*").alias("Qtd_Dias_Negociacao"),
+        F.sum("Preco_Fechamento").alias("Soma_Preco_Fechamento"),
+        F.sum(F.col("Preco_Fechamento") * F.col("Preco_Fechamento")).alias("Soma_Quadrados_Preco_Fechamento"),
+        F.min("Low").alias("Preco_Minimo_Mensal"),
+        F.max("High").alias("Preco_Maximo_Mensal"),
+        F.sum("Volume_Negociado").alias("Volume_Total_Mensal"),
+        F.min("Date").alias("Primeira_Data"),
+        F.max("Date").alias("Ultima_Data"),
+        F.min_by("Preco_Fechamento", "Date").alias("Preco_Primeiro_Fechamento"),
+        F.max_by("Preco_Fechamento", "Date").alias("Preco_Ultimo_Fechamento"),
+    )
+
+
+def with_monthly_metrics(state):
+    """Métricas derivadas do estado mensal (as mesmas colunas da agregação original)"""
+    count = F.col("Qtd_Dias_Negociacao")
+    return state \
+        .withColumn("Preco_Medio_Mensal", F.col("Soma_Preco_Fechamento") / count) \
+        .withColumn("Volume_Medio_Mensal", F.col("Volume_Total_Mensal") / count) \
+        .withColumn("Preco_Desvio_Padrao", _sample_stddev(
+            count, F.col("Soma_Preco_Fechamento"), F.col("Soma_Quadrados_Preco_Fechamento"))) \
+        .withColumn("Periodo", F.concat(F.col("year"), F.lit("-"), F.lpad(F.col("month"), 2, "0")))
+
+
+def total_from_monthly(state):
+    """Total por ticker pela fusão dos estados mensais (só lê o agregado mensal)"""
+    total = state.groupBy("ticker").agg(
+        F.sum("Qtd_Dias_Negociacao").alias("Total_Dias_Analisados"),
+        F.sum("Soma_Preco_Fechamento").alias("Soma_Preco_Fechamento"),
+        F.sum("Soma_Quadrados_Preco_Fechamento").alias("Soma_Quadrados_Preco_Fechamento"),
+        F.sum("Volume_Total_Mensal").alias("Volume_Total_Periodo"),
+        F.min("Preco_Minimo_Mensal").alias("Preco_Minimo_Periodo"),
+        F.max("Preco_Maximo_Mensal").alias("Preco_Maximo_Periodo"),
+        F.min("Primeira_Data").alias("Data_Inicio"),
+        F.max("Ultima_Data").alias("Data_Fim"),
+        F.min_by("Preco_Primeiro_Fechamento", "Primeira_Data").alias("Preco_Primeiro_Fechamento"),
+        F.max_by("Preco_Ultimo_Fechamento", "Ultima_Data").alias("Preco_Ultimo_Fechamento"),
+    )
+    count = F.col("Total_Dias_Analisados")
+    return total \
+        .withColumn("Preco_Medio_Periodo", F.col("Soma_Preco_Fechamento") / count) \
+        .withColumn("Preco_Desvio_Padrao_Periodo", _sample_stddev(
+            count, F.col("Soma_Preco_Fechamento"), F.col("Soma_Quadrados_Preco_Fechamento"))) \
+        .withColumn("Variacao_Percentual_Periodo",
+                    (F.col("Preco_Ultimo_Fechamento") / F.col("Preco_Primeiro_Fechamento") - 1) * 100)
+
+
+# Estado de continuação dos indicadores (um JSON por ticker, na última data processada)
+# e o do fim do mês anterior ao último (retomada do layout "month", que reescreve o mês)
+INDICATOR_STATE_COLUMN = "_Estado_Indicadores"
+CHECKPOINT_DATE_COLUMN = "_Data_Fim_Mes_Anterior"
+CHECKPOINT_STATE_COLUMN = "_Estado_Fim_Mes_Anterior"
+
+
+def read_indicator_states(bucket: str, dataset: str, max_workers: int = 32) -> dict[str, list[tuple[str, str]]]:
+    """{ticker: [(última data, estado JSON), (fim do mês anterior, estado JSON)]} do run anterior"""
+    uris = list_parquet_files(bucket, f"{INDICATOR_STATE_PREFIX}/dataset={dataset}/")
+    fs = pafs.S3FileSystem(region="sa-east-1")
+
+    def _read(uri: str):
+        table = pq.read_table(uri[len("s3://"):], filesystem=fs)
+        ticker = next(p[len("ticker="):] for p in uri.split("/") if p.startswith("ticker="))
+        # Arquivos anteriores ao ponto de retomada mensal só têm o último estado
+        candidates = [(table[date_col][-1].as_py(), table[state_col][-1].as_py())
+                      for date_col, state_col in (("Ultima_Data", "Estado"),
+                                                  ("Data_Fim_Mes_Anterior", "Estado_Fim_Mes_Anterior"))
+                      if date_col in table.column_names]
+        return ticker, candidates
+
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        return dict(executor.map(_read, uris))
+
+
+class ActionBudget:
+    """
+    Contabiliza as ações Spark (jobs) e estágios de cada etapa do job.
+
+    Cada etapa roda num job group próprio (setJobGroup); no fim, o statusTracker
+    informa quantos jobs e estágios cada grupo disparou (estágios pulados por
+    cache/shuffle reaproveitado não contam como executados).
+    """
+
+    def __init__(self, spark_context, prefix: str):
+        self.sc = spark_context
+        self.prefix = prefix
+        self.steps: list[str] = []
+
+    def step(self, name: str) -> None:
+        group = f"{self.prefix}:{name}"
+        self.sc.setJobGroup(group, name)
+        self.steps.append(group)
+
+    def report(self) -> dict:
+        tracker = self.sc.statusTracker()
+        totals = {"jobs": 0, "stages": 0, "skipped_stages": 0}
+        print("\nORÇAMENTO DE AÇÕES SPARK (jobs / estágios executados / pulados):")
+        for group in self.steps:
+            jobs = tracker.getJobIdsForGroup(group)
+            executed = skipped = 0
+            for job_id in jobs:
+                info = tracker.getJobInfo(job_id)
+                for stage_id in (info.stageIds if info else []):
+                    stage = tracker.getStageInfo(stage_id)
+                    if stage is not None and stage.numCompletedTasks > 0:
+                        executed += 1
+                    else:
+                        skipped += 1
+            print(f"  - {group.split(':', 1)[1]}: {len(jobs)} / {executed} / {skipped}")
+            totals["jobs"] += len(jobs)
+            totals["stages"] += executed
+            totals["skipped_stages"] += skipped
+        print(f"  Total: {totals['jobs']} ações, {totals['stages']} estágios executados, "
+              f"{totals['skipped_stages']} pulados")
+        return totals
+
 
 # Parâmetros do Job
+# Opcionais: só são resolvidos se vierem na chamada (getResolvedOptions exige os listados)
+OPTIONAL_ARGS = ['CHANGED_DATES', 'REFINED_LAYOUT', 'TARGET_FILE_MB', 'TICKERS']
+
 args = getResolvedOptions(sys.argv, [
     'JOB_NAME',
     'S3_BUCKET',
     'DATASET',
     'TICKER',
     'CRAWLER_NAME'
-])
+] + [name for name in OPTIONAL_ARGS if f'--{name}' in sys.argv])
+
+# day: year=/month=/day= (compatível com o catálogo atual; cada folha ticker/dia tem uma
+# linha, logo um arquivo minúsculo: o tamanho alvo não se aplica); month: year=/month=
+refined_layout = args.get('REFINED_LAYOUT') or 'day'
+if refined_layout not in REFINED_LAYOUTS:
+    raise ValueError(f"--REFINED_LAYOUT inválido: {refined_layout} (use {', '.join(REFINED_LAYOUTS)})")
+target_file_bytes = int(args.get('TARGET_FILE_MB') or DEFAULT_TARGET_FILE_MB) * 1024 * 1024
+
+dataset_norm = args['DATASET'].lower()
+tickers_arg = (args.get('TICKERS') or '').strip()
+if tickers_arg.lower() == 'all':
+    tickers = list_ticker_prefixes(args['S3_BUCKET'], f"raw/dataset={dataset_norm}/")
+elif tickers_arg:
+    tickers = sorted({t.strip().lower() for t in tickers_arg.split(',') if t.strip()})
+else:
+    tickers = [args['TICKER'].lower()]
+
+# Datas (YYYY-MM-DD) alteradas no raw por ticker, enviadas pela Lambda de trigger;
+# ticker ausente = todas as datas
+changed_by_ticker = parse_changed_dates(args.get('CHANGED_DATES', ''), tickers)
 
 # Inicialização
 sc = SparkContext()
 glueContext = GlueContext(sc)
 spark = glueContext.spark_session
 
-# Desabilitar leitura vetorizada do Parquet para permitir conversão de tipos
-spark.conf.set("spark.sql.parquet.enableVectorizedReader", "false")
+# Leitura vetorizada: cada grupo de arquivos é lido com o próprio schema físico
+# (contrato do raw), as conversões ficam na projeção
+spark.conf.set("spark.sql.parquet.enableVectorizedReader", "true")
 spark.conf.set("spark.sql.sources.partitionOverwriteMode", "dynamic")
 
 job = Job(glueContext)
 job.init(args['JOB_NAME'], args)
 
+budget = ActionBudget(sc, args['JOB_NAME'])
+
 print("=" * 70)
 print("GLUE ETL JOB - INICIANDO")
 print(f"Dataset: {args['DATASET']}")
-print(f"Ticker: {args['TICKER']}")
+print(f"Tickers ({len(tickers)}): {', '.join(tickers[:20])}{' ...' if len(tickers) > 20 else ''}")
 print(f"Bucket: {args['S3_BUCKET']}")
 print(f"Crawler: {args['CRAWLER_NAME']}")
+print("Datas alteradas: " + (", ".join(f"{t} ({len(d)})" for t, d in list(changed_by_ticker.items())[:20])
+                             if changed_by_ticker else "todas"))
 print("=" * 70)
 
 
@@ -68,55 +351,111 @@ print("=" * 70)
 # ===================================================================
 print("\n[1/5] Lendo dados RAW do S3...")
 
-input_path = f"s3://{args['S3_BUCKET']}/raw/dataset={args['DATASET']}/ticker={args['TICKER']}/"
-print(f"Input Path: {input_path}")
+input_path = f"s3://{args['S3_BUCKET']}/raw/dataset={dataset_norm}/"
+print(f"Input Path: {input_path} ({len(tickers)} tickers)")
 
 # Ler Parquet (formato mandatório por R2 do Tech Challenge)
 try:
-    print("Listando arquivos Parquet (S3) e lendo arquivo-a-arquivo para evitar conflito de schema...")
+    print("Listando arquivos Parquet (S3) e agrupando por schema físico (footer)...")
 
-    input_prefix = f"raw/dataset={args['DATASET']}/ticker={args['TICKER']}/"
-    parquet_files = list_parquet_files(args["S3_BUCKET"], input_prefix)
+    # Um prefixo por ticker (listagens em paralelo); o "all" já veio dos prefixos ticker=
+    with ThreadPoolExecutor(max_workers=16) as executor:
+        listings = dict(zip(tickers, executor.map(
+            lambda t: list_parquet_files(args["S3_BUCKET"], f"raw/dataset={dataset_norm}/ticker={t}/"),
+            tickers)))
+    file_sizes = {uri: size for listing in listings.values() for uri, size in listing.items()}
 
-    if not parquet_files:
+    if not file_sizes:
         raise ValueError(f"Nenhum arquivo Parquet encontrado em {input_path}")
 
-    print(f"✅ Arquivos Parquet encontrados: {len(parquet_files)}")
-
-    dfs = []
-    for uri in parquet_files:
-        df_part = spark.read.parquet(uri)
-
-        # Normalizar nomes: usar 'ticker' como chave (coluna pode vir como 'Ticker' no arquivo)
-        if "ticker" not in df_part.columns and "Ticker" in df_part.columns:
-            df_part = df_part.withColumnRenamed("Ticker", "ticker")
-
-        # Forçar tipos numéricos para double (elimina long vs double)
-        for col_name in ["Open", "High", "Low", "Close", "Volume"]:
-            if col_name in df_part.columns:
-                df_part = df_part.withColumn(col_name, F.col(col_name).cast("double"))
-
-        # Padronizar Date como string
-        if "Date" in df_part.columns:
-            df_part = df_part.withColumn("Date", F.col("Date").cast("string"))
-
-        # Remover partições físicas do raw (recriadas depois)
-        columns_to_drop = [c for c in ["year", "month", "day"] if c in df_part.columns]
-        if columns_to_drop:
-            df_part = df_part.drop(*columns_to_drop)
-
-        dfs.append(df_part)
-
-    df_raw = dfs[0]
-    for df_part in dfs[1:]:
-        df_raw = df_raw.unionByName(df_part, allowMissingColumns=True)
-    
-    count = df_raw.count()
-    print(f"✅ Registros lidos: {count}")
-    
-    if count == 0:
-        raise ValueError(f"Nenhum registro encontrado em {input_path}")
+    print(f"✅ Arquivos Parquet encontrados: {len(file_sizes)}")
+
+    # Estado agregado e dos indicadores já gravados: sem eles o ticker precisa do histórico completo
+    agg_tickers = set(list_ticker_prefixes(args["S3_BUCKET"], f"{AGG_MONTHLY_PREFIX}/dataset={dataset_norm}/"))
+    indicator_states = read_indicator_states(args["S3_BUCKET"], dataset_norm) if changed_by_ticker else {}
+
+    # Incremental (por ticker): só as partições alteradas + as afetadas pelas janelas + lookback.
+    # Os meses tocados são lidos inteiros (o estado mensal é recalculado das linhas do mês).
+    # affected_ranges: {ticker: [(início, fim)]}; affected_months: {ticker: ["yyyy-MM"]};
+    # indicator_carry: {ticker: (data, estado, estados gravados)}; ticker ausente = reescrita completa
+    parquet_files = []
+    affected_ranges = {}
+    affected_months = {}
+    indicator_carry = {}
+    for ticker, listing in listings.items():
+        plan = agg_plan = None
+        changed_dates = changed_by_ticker.get(ticker)
+        if changed_dates and listing:
+            if ticker not in agg_tickers:
+                print(f"⚠️ {ticker}: sem estado agregado em {AGG_MONTHLY_PREFIX}/; histórico completo")
+            else:
+                plan = plan_incremental_read(list(listing), changed_dates,
+                                             whole_months=refined_layout == "month")
+                agg_plan = plan_incremental_read(list(listing), changed_dates, whole_months=True)
+                if plan is None:
+                    print(f"⚠️ {ticker}: arquivos fora do layout year=/month=/day=; histórico completo")
+                elif not plan[1]:
+                    print(f"⚠️ {ticker}: nenhuma partição afetada pelas datas alteradas; histórico completo")
+                    plan = None
+                else:
+                    # EMA/RSI/ATR têm memória longa: linhas após o estado fora dos períodos
+                    # afetados (ex: correção no passado) mudam também; reescrita até o fim
+                    stored = [(last_date, state) for last_date, state in indicator_states.get(ticker, [])
+                              if state and loads_state(state) is not None]
+                    carry = pick_indicator_carry(list(listing), stored, plan[1])
+                    if carry is None:
+                        plan = plan_incremental_read(list(listing), changed_dates, through_end=True,
+                                                     whole_months=refined_layout == "month")
+                        carry = pick_indicator_carry(list(listing), stored, plan[1])
+                    if carry is None:
+                        print(f"⚠️ {ticker}: sem estado dos indicadores até as datas alteradas; "
+                              "histórico completo")
+                        plan = None
+                    else:
+                        indicator_carry[ticker] = (*carry, stored)
+        if plan is None:
+            parquet_files.extend(listing)
+        else:
+            # Meses inteiros (agregados) + janelas das partições reescritas
+            parquet_files.extend(sorted(set(agg_plan[0]) | set(plan[0])))
+            affected_ranges[ticker] = plan[1]
+            affected_months[ticker] = months_in_ranges(agg_plan[1])
+    if affected_ranges:
+        print(f"✅ Modo incremental: {len(parquet_files)} arquivos lidos, "
+              f"{len(affected_ranges)}/{len(tickers)} tickers com reescrita parcial")
+        for ticker, ranges in list(affected_ranges.items())[:20]:
+            print(f"   - {ticker}: " + ", ".join(f"{start} a {end}" for start, end in ranges)
+                  + f" (meses agregados: {', '.join(affected_months[ticker])})")
+
+    # Uma leitura por schema físico (não por arquivo): o plano fica raso e o scan é
+    # distribuído; cada grupo lê só as colunas alvo com schema explícito (sem inferência)
+    schemas = read_footer_schemas(parquet_files)
+    legacy_files = check_raw_contract(schemas)
+    print(f"✅ Contrato raw v{RAW_SCHEMA_VERSION}: {len(schemas) - len(legacy_files)} arquivos conformes, "
+          f"{len(legacy_files)} legados")
+    if legacy_files:
+        print("⚠️ Arquivos legados são convertidos na leitura; regrave-os com scripts/migrate_raw_schema.py")
+
+    groups = group_by_schema(schemas)
+    print(f"✅ Schemas distintos no raw: {len(groups)}")
+
+    df_raw = None
+    for signature, uris in groups.items():
+        if not any(target == "Date" for target, _, _ in signature):
+            print(f"⚠️ {len(uris)} arquivos sem coluna Date ignorados (ex: {uris[0]})")
+            continue
+        read_schema = ", ".join(f"`{source}` {spark_type}" for _, source, spark_type in signature)
+        print(f"   - {len(uris)} arquivos: {read_schema}")
+        df_group = project_raw(spark.read.schema(read_schema).parquet(*uris), signature)
+        df_raw = df_group if df_raw is None else df_raw.unionByName(df_group)
+
+    if df_raw is None:
+        raise ValueError(f"Nenhum arquivo Parquet com coluna Date em {input_path}")
+
+    # Mesmo pregão gravado por produtores diferentes (extrator, CSV, Lambda)
+    df_raw = drop_duplicate_sessions(df_raw)
     
+    # Sem ação aqui: a contagem sai da materialização do cache (ETAPA 4)
     df_raw.printSchema()
     print(f"Colunas do DataFrame: {df_raw.columns}")
     
@@ -187,6 +526,55 @@ print("   - Volume_Media_Movel_5d (média móvel 5 dias)")
 print("   - Variacao_Percentual_Diaria (% mudança vs dia anterior)")
 print("   - Dias_Desde_Inicio (dias desde primeira data)")
 
+# Indicadores técnicos: série de cada ticker em pandas/NumPy (kernels vetorizados).
+# Tickers em modo incremental continuam do estado gravado só nas linhas novas
+# (as de lookback não são reescritas); a última linha leva o novo estado e o do
+# fim do mês anterior (o layout "month" reescreve o mês inteiro e retoma dele)
+INDICATOR_COLUMNS = indicator_columns()
+
+
+def add_indicators(pdf):
+    pdf = pdf.sort_values("Date", ignore_index=True)
+    ticker = pdf["ticker"].iloc[0]
+    last_date, state, stored = indicator_carry.get(ticker, (None, None, []))
+    rows = (pdf["Date"] > last_date).to_numpy() if last_date else np.ones(len(pdf), dtype=bool)
+    dates = pdf["Date"].to_numpy()[rows]
+    split = month_checkpoint_split(dates)
+    bars = {
+        "high": pdf["High"].to_numpy(dtype=float)[rows],
+        "low": pdf["Low"].to_numpy(dtype=float)[rows],
+        "close": pdf["Preco_Fechamento"].to_numpy(dtype=float)[rows],
+        "volume": pdf["Volume_Negociado"].to_numpy(dtype=float)[rows],
+    }
+    columns, checkpoint, new_state = compute_indicators_split(bars, split, loads_state(state) if state else None)
+    for column in INDICATOR_COLUMNS:
+        values = np.full(len(pdf), np.nan)
+        values[rows] = columns[column]
+        pdf[column] = values
+    for column in (INDICATOR_STATE_COLUMN, CHECKPOINT_DATE_COLUMN, CHECKPOINT_STATE_COLUMN):
+        pdf[column] = None
+    if rows.any():
+        # Fim do mês anterior: das linhas novas, o estado herdado ou o ponto já gravado
+        month_start = f"{dates[-1][:7]}-01"
+        previous = [(dates[split - 1], dumps_state(checkpoint))] if checkpoint else []
+        previous += [(last_date, state)] + stored
+        end_of_month = next(((day, text) for day, text in previous if day and text and day < month_start),
+                            (None, None))
+        last = len(pdf) - 1
+        pdf.loc[last, INDICATOR_STATE_COLUMN] = dumps_state(new_state)
+        pdf.loc[last, CHECKPOINT_DATE_COLUMN], pdf.loc[last, CHECKPOINT_STATE_COLUMN] = end_of_month
+    return pdf
+
+
+indicator_schema = StructType(
+    df_with_calculations.schema.fields
+    + [StructField(column, DoubleType()) for column in INDICATOR_COLUMNS]
+    + [StructField(column, StringType())
+       for column in (INDICATOR_STATE_COLUMN, CHECKPOINT_DATE_COLUMN, CHECKPOINT_STATE_COLUMN)]
+)
+df_with_calculations = df_with_calculations.groupBy("ticker").applyInPandas(add_indicators, indicator_schema)
+print(f"   - Indicadores: {', '.join(INDICATOR_COLUMNS)}")
+
 
 # ===================================================================
 # ETAPA 4: TRANSFORMAÇÃO A - AGRUPAMENTO E AGREGAÇÕES (Requisito R5-A)
@@ -201,38 +589,55 @@ df_with_periods = df_with_calculations \
     .withColumn("day", F.dayofmonth(F.to_date(F.col("Date"), "yyyy-MM-dd")).cast("string")) \
     .withColumn("Week", F.weekofyear(F.to_date(F.col("Date"), "yyyy-MM-dd")))
 
-# Agregações mensais (R5-A: agrupamento, soma, contagem)
-df_monthly_agg = df_with_periods.groupBy("ticker", "year", "month").agg(
-    F.count("*").alias("Qtd_Dias_Negociacao"),
-    F.avg("Preco_Fechamento").alias("Preco_Medio_Mensal"),
-    F.min("Low").alias("Preco_Minimo_Mensal"),
-    F.max("High").alias("Preco_Maximo_Mensal"),
-    F.sum("Volume_Negociado").alias("Volume_Total_Mensal"),
-    F.avg("Volume_Negociado").alias("Volume_Medio_Mensal"),
-    F.stddev("Preco_Fechamento").alias("Preco_Desvio_Padrao"),
-    F.first("Date").alias("Primeira_Data"),
-    F.last("Date").alias("Ultima_Data")
-).withColumn("Periodo", F.concat(F.col("year"), F.lit("-"), F.lpad(F.col("month"), 2, "0")))
-
-print(f"✅ Agregações mensais criadas: {df_monthly_agg.count()} registros")
+# Intermediário compartilhado por agregações e escrita: calculado uma única vez.
+# A contagem materializa o cache (única passada sobre o S3 e as janelas)
+df_with_periods = df_with_periods.persist(StorageLevel.MEMORY_AND_DISK)
+budget.step("leitura_janelas_cache")
+count = df_with_periods.count()
+print(f"✅ Registros lidos: {count}")
+
+if count == 0:
+    raise ValueError(f"Nenhum registro encontrado em {input_path}")
+
+# Agregações mensais (R5-A: agrupamento, soma, contagem) como estado mesclável.
+# Tickers completos: todos os meses; incrementais: só os meses tocados (lidos inteiros),
+# fundidos ao estado já gravado dos demais meses
+output_monthly_path = f"s3://{args['S3_BUCKET']}/{AGG_MONTHLY_PREFIX}/dataset={dataset_norm}/"
+output_total_path = f"s3://{args['S3_BUCKET']}/{AGG_TOTAL_PREFIX}/dataset={dataset_norm}/"
+
+df_month_rows = df_with_periods
+if affected_months:
+    full_tickers = [t for t in tickers if t not in affected_months]
+    month_filter = F.col("ticker").isin(full_tickers) if full_tickers else F.lit(False)
+    for ticker, months in affected_months.items():
+        month_filter = month_filter | ((F.col("ticker") == ticker) & F.substring("Date", 1, 7).isin(months))
+    df_month_rows = df_month_rows.filter(month_filter)
+
+df_monthly_state = monthly_state(df_month_rows)
+
+if affected_months:
+    # Estado gravado dos tickers incrementais, menos os meses recalculados
+    df_previous_state = spark.read.parquet(output_monthly_path) \
+        .withColumn("ticker", F.col("ticker").cast("string")) \
+        .filter(F.col("ticker").isin(list(affected_months))) \
+        .select(*MONTHLY_STATE_COLUMNS) \
+        .join(df_monthly_state.select("ticker", "year", "month"), ["ticker", "year", "month"], "left_anti")
+    df_monthly_state = df_monthly_state.unionByName(df_previous_state)
+
+# Cache: materializado pela escrita do mensal (que sobrescreve o caminho lido acima);
+# o total é calculado dele depois, sem reler o S3. Contagens saem das escritas (ETAPA 5)
+df_monthly_agg = with_monthly_metrics(df_monthly_state).persist(StorageLevel.MEMORY_AND_DISK)
+
+print("✅ Agregações mensais (estado por ticker/mês):")
 print("   - Qtd_Dias_Negociacao (COUNT)")
-print("   - Preco_Medio_Mensal (AVG)")
+print("   - Preco_Medio_Mensal (AVG = soma / contagem)")
 print("   - Volume_Total_Mensal (SUM)")
 print("   - Volume_Medio_Mensal (AVG)")
-print("   - Preco_Desvio_Padrao (STDDEV)")
-
-# Agregação geral (totalizador)
-df_total_agg = df_with_periods.groupBy("ticker").agg(
-    F.count("*").alias("Total_Dias_Analisados"),
-    F.sum("Volume_Negociado").alias("Volume_Total_Periodo"),
-    F.avg("Preco_Fechamento").alias("Preco_Medio_Periodo"),
-    F.min("Low").alias("Preco_Minimo_Periodo"),
-    F.max("High").alias("Preco_Maximo_Periodo"),
-    F.min("Date").alias("Data_Inicio"),
-    F.max("Date").alias("Data_Fim")
-)
+print("   - Preco_Desvio_Padrao (STDDEV pela soma dos quadrados)")
 
-print(f"✅ Agregação geral criada: {df_total_agg.count()} registro")
+# Agregação geral (totalizador): fusão dos meses, sem reler o diário
+df_total_agg = total_from_monthly(df_monthly_agg)
+print("✅ Agregação geral: um registro por ticker (fusão dos meses)")
 
 
 # ===================================================================
@@ -240,35 +645,98 @@ print(f"✅ Agregação geral criada: {df_total_agg.count()} registro")
 # ===================================================================
 print("\n[5/5] Escrevendo dados refinados no S3...")
 
-# Output principal (R6): refined/ particionado por data e por ação/índice (ticker) e dataset
-ticker_norm = args['TICKER'].lower()
-dataset_norm = args['DATASET'].lower()
-output_daily_path = (
-    f"s3://{args['S3_BUCKET']}/refined/"
-    f"dataset={dataset_norm}/ticker={ticker_norm}/"
-)
+# Output principal (R6): refined/ particionado por ação/índice (ticker) e data, por dataset
+output_daily_path = f"s3://{args['S3_BUCKET']}/refined/dataset={dataset_norm}/"
 print(f"Output Daily Path: {output_daily_path}")
 
-# Evitar metadados inválidos no Athena: colunas duplicadas com partições (ex: ticker=...)
 df_daily_out = df_with_periods
-for col_to_drop in ["ticker", "dataset"]:
-    if col_to_drop in df_daily_out.columns:
-        df_daily_out = df_daily_out.drop(col_to_drop)
 
-# df_daily_out já tem year, month, day como strings criadas na ETAPA 4
+# Incremental: as linhas de lookback só alimentam as janelas; apenas as partições
+# afetadas são reescritas (as demais ficam intactas com partitionOverwriteMode=dynamic)
+if affected_ranges:
+    full_tickers = [t for t in tickers if t not in affected_ranges]
+    affected_filter = F.col("ticker").isin(full_tickers) if full_tickers else F.lit(False)
+    for ticker, ranges in affected_ranges.items():
+        dates = None
+        for start, end in ranges:
+            between = F.col("Date").between(start.isoformat(), end.isoformat())
+            dates = between if dates is None else dates | between
+        affected_filter = affected_filter | ((F.col("ticker") == ticker) & dates)
+    df_daily_out = df_daily_out.filter(affected_filter)
+
+# Evitar metadados inválidos no Athena: colunas duplicadas com partições (ex: dataset=...)
+if "dataset" in df_daily_out.columns:
+    df_daily_out = df_daily_out.drop("dataset")
+df_daily_out = df_daily_out.drop(INDICATOR_STATE_COLUMN, CHECKPOINT_DATE_COLUMN, CHECKPOINT_STATE_COLUMN)
+
+# Layout "month": a coluna day continua nos dados, só deixa de ser partição
+# ticker é partição (refined/dataset=X/ticker=Y/...): cada ticker no próprio prefixo
+partition_cols = ["ticker", *REFINED_LAYOUTS[refined_layout]]
+if refined_layout != "day":
+    df_daily_out = df_daily_out.withColumn("day", F.col("day").cast("int"))
+
+# Arquivos no tamanho alvo: tarefas por faixa de datas (paralelas e contíguas) e
+# linhas ordenadas por (ticker, Date) dentro de cada arquivo (min/max do Parquet podam).
+# Só o layout "month" chega perto do alvo: no "day" cada partição tem uma linha
+input_bytes = sum(file_sizes[uri] for uri in parquet_files)
+num_partitions, max_records_per_file = plan_output_files(count, input_bytes, count, target_file_bytes)
+print(f"Layout: {refined_layout} ({'/'.join(partition_cols)}), {num_partitions} tarefas de escrita, "
+      f"até {max_records_per_file} linhas por arquivo (alvo {target_file_bytes // (1024 * 1024)} MB)")
+if refined_layout == "day":
+    print("⚠️ Layout day: um arquivo por ticker/dia, o tamanho alvo não é atingido "
+          "(use --REFINED_LAYOUT=month após migrar a tabela refined do catálogo)")
+
+# Linhas gravadas medidas na própria escrita (Observation), sem uma ação extra
+daily_metrics = Observation("escrita_diaria")
+budget.step("escrita_diaria")
+
 df_daily_out \
-    .repartition(1) \
+    .observe(daily_metrics, F.count(F.lit(1)).alias("rows")) \
+    .repartitionByRange(num_partitions, *partition_cols, "Date") \
+    .sortWithinPartitions(*partition_cols, "Date") \
     .write \
     .mode("overwrite") \
-    .partitionBy("year", "month", "day") \
+    .option("maxRecordsPerFile", max_records_per_file) \
+    .partitionBy(*partition_cols) \
     .parquet(output_daily_path)
 
-print(f"✅ Dados diários escritos: {df_daily_out.count()} registros")
-
-# Mantemos as agregações (R5-A) calculadas no job, mas não gravamos outputs adicionais
-# para evitar poluir o S3 refined/ e criar múltiplas tabelas no Glue Catalog.
-print(f"✅ Agregações mensais calculadas (R5-A): {df_monthly_agg.count()} registros")
-print(f"✅ Agregação total calculada (R5-A): {df_total_agg.count()} registro")
+print(f"✅ Dados diários escritos: {daily_metrics.get['rows']} registros")
+
+# Estado dos indicadores só depois do diário: um run que falha não avança o estado
+output_indicator_state_path = f"s3://{args['S3_BUCKET']}/{INDICATOR_STATE_PREFIX}/dataset={dataset_norm}/"
+budget.step("estado_indicadores")
+df_with_periods \
+    .filter(F.col(INDICATOR_STATE_COLUMN).isNotNull()) \
+    .select("ticker", F.col("Date").alias("Ultima_Data"), F.col(INDICATOR_STATE_COLUMN).alias("Estado"),
+            F.col(CHECKPOINT_DATE_COLUMN).alias("Data_Fim_Mes_Anterior"),
+            F.col(CHECKPOINT_STATE_COLUMN).alias("Estado_Fim_Mes_Anterior")) \
+    .repartition("ticker") \
+    .write.mode("overwrite").partitionBy("ticker").parquet(output_indicator_state_path)
+print(f"✅ Estado dos indicadores gravado: {output_indicator_state_path}")
+
+# Agregações (R5-A) em tabelas próprias: um arquivo pequeno por ticker, reescrito
+# só para os tickers processados (partitionOverwriteMode=dynamic)
+# Linhas medidas nas próprias escritas (Observation), como no diário
+budget.step("escrita_agregacoes")
+monthly_metrics = Observation("escrita_mensal")
+total_metrics = Observation("escrita_total")
+print(f"Output Monthly Path: {output_monthly_path}")
+df_monthly_agg \
+    .observe(monthly_metrics, F.count(F.lit(1)).alias("rows")) \
+    .repartition("ticker").sortWithinPartitions("ticker", "Primeira_Data") \
+    .write.mode("overwrite").partitionBy("ticker").parquet(output_monthly_path)
+print(f"✅ Agregações mensais escritas (R5-A): {monthly_metrics.get['rows']} registros")
+
+print(f"Output Total Path: {output_total_path}")
+df_total_agg \
+    .observe(total_metrics, F.count(F.lit(1)).alias("rows")) \
+    .repartition("ticker") \
+    .write.mode("overwrite").partitionBy("ticker").parquet(output_total_path)
+print(f"✅ Agregação total escrita (R5-A): {total_metrics.get['rows']} registros")
+
+budget.report()
+df_monthly_agg.unpersist()
+df_with_periods.unpersist()
 
 
 # ===================================================================
@@ -283,7 +751,8 @@ print(f"  ✅ R5-B: Renomeação de colunas (Close, Volume)")
 print(f"  ✅ R5-C: Cálculos temporais (Moving Avg, Variação %, Dias)")
 print("\nOUTPUTS GERADOS:")
 print(f"  1. Daily: {output_daily_path}")
-print("  2. Monthly/Summary: (não gravados; demonstrados via SQL no Athena)")
+print(f"  2. Monthly: {output_monthly_path}")
+print(f"  3. Summary: {output_total_path}")
 print("=" * 70)
 
 
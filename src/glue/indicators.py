@@ -0,0 +1,347 @@
+"""
+Indicadores técnicos vetorizados com estado serializável (retomada incremental)
+
+Cada indicador calcula a série inteira de um ticker com kernels NumPy e devolve o
+estado de continuação (valor da EMA, últimos N fechamentos etc.). O mesmo cálculo
+aceita esse estado como ponto de partida: um novo pregão atualiza todos os
+indicadores em O(1) em relação ao histórico (no máximo a janela do indicador),
+com o mesmo resultado do cálculo completo.
+
+Indicadores (nulos até completar a janela):
+- EMA_Nd: média móvel exponencial (alfa = 2 / (N + 1), semente no 1º fechamento)
+- RSI_Nd: índice de força relativa com suavização de Wilder (alfa = 1 / N)
+- Bollinger_{Media,Superior,Inferior}_Nd: média de N e +/- k desvios (populacional)
+- ATR_Nd: média de Wilder do true range
+- VWAP_Nd: preço típico (H + L + C) / 3 ponderado por volume nas últimas N barras
+  (barras diárias: não há sessão intradiária para acumular)
+- Volatilidade_Nd: desvio dos log-retornos em N barras, anualizado (252), em %
+
+Módulo autocontido (só NumPy): o Glue o recebe via --extra-py-files e o motor
+local (local_etl.py) o importa do pacote glue.
+
+Uso:
+    columns, state = compute_indicators(bars)
+    columns, state = compute_indicators(new_bars, state)   # continua de onde parou
+    columns, checkpoint, state = compute_indicators_split(bars, split)   # + estado após `split` barras
+    text = dumps_state(state); state = loads_state(text)
+"""
+
+import json
+
+import numpy as np
+from numpy.lib.stride_tricks import sliding_window_view
+
+INDICATOR_STATE_VERSION = 1
+
+# Pregões por ano (anualização da volatilidade)
+TRADING_DAYS_PER_YEAR = 252
+
+# Tamanho do bloco do kernel da EMA (matriz de pesos bloco x bloco)
+_EWM_BLOCK = 64
+
+
+# ===================================================================
+# Kernels
+# ===================================================================
+
+def ewm(values: np.ndarray, alpha: float, initial: float = None) -> np.ndarray:
+    """
+    y[t] = (1 - alpha) * y[t-1] + alpha * x[t], a partir de `initial` (padrão: x[0]).
+
+    Vetorizado por blocos: dentro de cada bloco a recorrência é um produto por uma
+    matriz triangular de pesos alpha * (1 - alpha)^(j - k); só o último valor do
+    bloco passa ao seguinte.
+    """
+    n = len(values)
+    out = np.empty(n)
+    if n == 0:
+        return out
+    decay = 1.0 - alpha
+    size = min(_EWM_BLOCK, n)
+    lags = np.subtract.outer(np.arange(size), np.arange(size))
+    weights = np.where(lags >= 0, alpha * decay ** np.maximum(lags, 0), 0.0)
+    carry = decay ** np.arange(1, size + 1)
+
+    previous = values[0] if initial is None else initial
+    for start in range(0, n, size):
+        block = values[start:start + size]
+        m = len(block)
+        out[start:start + m] = weights[:m, :m] @ block + carry[:m] * previous
+        previous = out[start + m - 1]
+    return out
+
+
+def _rolling(values: np.ndarray, window: int, history: list) -> np.ndarray:
+    """Janelas de `window` valores sobre histórico + novos (uma linha por valor novo)"""
+    if len(values) == 0:
+        return np.empty((0, window))
+    padded = np.concatenate([np.full(max(0, window - 1 - len(history)), np.nan),
+                             np.asarray(history[-(window - 1):] if window > 1 else [], dtype=float),
+                             values])
+    return sliding_window_view(padded, window)
+
+
+def _tail(history: list, values: np.ndarray, size: int) -> list:
+    """Últimos `size` valores de histórico + novos (buffer do estado)"""
+    if size <= 0:
+        return []
+    return [float(v) for v in [*history, *values.tolist()][-size:]]
+
+
+def _warmed(count_before: int, n: int, window: int) -> np.ndarray:
+    """Máscara das linhas cujo indicador já tem `window` observações"""
+    return count_before + np.arange(1, n + 1) >= window
+
+
+def _float(value) -> float | None:
+    return None if value is None or np.isnan(value) else float(value)
+
+
+# ===================================================================
+# Indicadores
+# ===================================================================
+
+class EMA:
+    inputs = ("close",)
+
+    def __init__(self, window: int):
+        self.window = window
+        self.name = f"EMA_{window}d"
+        self.columns = [self.name]
+
+    def compute(self, bars: dict, state: dict = None) -> tuple[dict, dict]:
+        close = bars["close"]
+        count = state["count"] if state else 0
+        if len(close) == 0:
+            return {self.name: close}, state
+        ema = ewm(close, 2.0 / (self.window + 1), state["value"] if state else None)
+        values = np.where(_warmed(count, len(close), self.window), ema, np.nan)
+        return {self.name: values}, {"count": count + len(close), "value": float(ema[-1])}
+
+
+class RSI:
+    inputs = ("close",)
+
+    def __init__(self, window: int = 14):
+        self.window = window
+        self.name = f"RSI_{window}d"
+        self.columns = [self.name]
+
+    def compute(self, bars: dict, state: dict = None) -> tuple[dict, dict]:
+        close = bars["close"]
+        if len(close) == 0:
+            return {self.name: close}, state
+        state = state or {"changes": 0, "prev_close": None, "avg_gain": None, "avg_loss": None}
+
+        # Variações a partir do último fechamento conhecido (a 1ª barra da série não tem)
+        if state["prev_close"] is None:
+            change = np.concatenate([[np.nan], np.diff(close)])
+        else:
+            change = np.diff(np.concatenate([[state["prev_close"]], close]))
+        first = 1 if state["prev_close"] is None else 0
+        gains, losses = np.maximum(change[first:], 0.0), np.maximum(-change[first:], 0.0)
+
+        alpha = 1.0 / self.window
+        avg_gain = ewm(gains, alpha, state["avg_gain"]) if len(gains) else gains
+        avg_loss = ewm(losses, alpha, state["avg_loss"]) if len(losses) else losses
+        with np.errstate(invalid='ignore', divide='ignore'):
+            rsi = np.where(avg_loss == 0, 100.0, 100.0 - 100.0 / (1.0 + avg_gain / avg_loss))
+        rsi = np.where(_warmed(state["changes"], len(rsi), self.window), rsi, np.nan)
+
+        values = np.concatenate([np.full(first, np.nan), rsi])
+        return {self.name: values}, {
+            "changes": state["changes"] + len(gains),
+            "prev_close": float(close[-1]),
+            "avg_gain": float(avg_gain[-1]) if len(gains) else state["avg_gain"],
+            "avg_loss": float(avg_loss[-1]) if len(losses) else state["avg_loss"],
+        }
+
+
+class Bollinger:
+    inputs = ("close",)
+
+    def __init__(self, window: int = 20, num_std: float = 2.0):
+        self.window = window
+        self.num_std = num_std
+        self.name = f"Bollinger_{window}d"
+        self.columns = [f"Bollinger_Media_{window}d", f"Bollinger_Superior_{window}d",
+                        f"Bollinger_Inferior_{window}d"]
+
+    def compute(self, bars: dict, state: dict = None) -> tuple[dict, dict]:
+        close = bars["close"]
+        history = state["closes"] if state else []
+        windows = _rolling(close, self.window, history)
+        with np.errstate(invalid='ignore'):
+            mean = windows.mean(axis=1)
+            band = self.num_std * windows.std(axis=1)
+        middle, upper, lower = self.columns
+        return {middle: mean, upper: mean + band, lower: mean - band}, \
+            {"closes": _tail(history, close, self.window - 1)}
+
+
+class ATR:
+    inputs = ("high", "low", "close")
+
+    def __init__(self, window: int = 14):
+        self.window = window
+        self.name = f"ATR_{window}d"
+        self.columns = [self.name]
+
+    def compute(self, bars: dict, state: dict = None) -> tuple[dict, dict]:
+        high, low, close = bars["high"], bars["low"], bars["close"]
+        if len(close) == 0:
+            return {self.name: close}, state
+        count = state["count"] if state else 0
+        previous = np.concatenate([[state["prev_close"] if state else np.nan], close[:-1]])
+        with np.errstate(invalid='ignore'):
+            # 1ª barra da série: só high - low (np.fmax ignora o fechamento anterior ausente)
+            true_range = np.fmax(high - low, np.fmax(np.abs(high - previous), np.abs(low - previous)))
+        atr = ewm(true_range, 1.0 / self.window, state["value"] if state else None)
+        values = np.where(_warmed(count, len(close), self.window), atr, np.nan)
+        return {self.name: values}, {"count": count + len(close), "prev_close": float(close[-1]),
+                                     "value": float(atr[-1])}
+
+
+class VWAP:
+    inputs = ("high", "low", "close", "volume")
+
+    def __init__(self, window: int = 20):
+        self.window = window
+        self.name = f"VWAP_{window}d"
+        self.columns = [self.name]
+
+    def compute(self, bars: dict, state: dict = None) -> tuple[dict, dict]:
+        typical = (bars["high"] + bars["low"] + bars["close"]) / 3.0
+        volume = bars["volume"]
+        state = state or {"price_volume": [], "volume": []}
+        price_volume = _rolling(typical * volume, self.window, state["price_volume"]).sum(axis=1)
+        total_volume = _rolling(volume, self.window, state["volume"]).sum(axis=1)
+        with np.errstate(invalid='ignore', divide='ignore'):
+            values = np.where(total_volume > 0, price_volume / total_volume, np.nan)
+        return {self.name: values}, {
+            "price_volume": _tail(state["price_volume"], typical * volume, self.window - 1),
+            "volume": _tail(state["volume"], volume, self.window - 1),
+        }
+
+
+class Volatility:
+    inputs = ("close",)
+
+    def __init__(self, window: int = 20):
+        self.window = window
+        self.name = f"Volatilidade_{window}d"
+        self.columns = [self.name]
+
+    def compute(self, bars: dict, state: dict = None) -> tuple[dict, dict]:
+        close = bars["close"]
+        if len(close) == 0:
+            return {self.name: close}, state
+        state = state or {"prev_close": None, "returns": []}
+        previous = np.concatenate([[np.nan if state["prev_close"] is None else state["prev_close"]], close[:-1]])
+        with np.errstate(invalid='ignore', divide='ignore'):
+            returns = np.log(close / previous)
+
+        # Sem fechamento anterior (início da série) não há retorno: fica fora das janelas
+        first = 1 if state["prev_close"] is None else 0
+        windows = _rolling(returns[first:], self.window, state["returns"])
+        with np.errstate(invalid='ignore'):
+            std = windows.std(axis=1, ddof=1) if self.window > 1 else np.full(len(windows), np.nan)
+        values = np.concatenate([np.full(first, np.nan), std * np.sqrt(TRADING_DAYS_PER_YEAR) * 100])
+        return {self.name: values}, {
+            "prev_close": float(close[-1]),
+            "returns": _tail(state["returns"], returns[first:], self.window - 1),
+        }
+
+
+DEFAULT_INDICATORS = [
+    EMA(9), EMA(21),
+    RSI(14),
+    Bollinger(20),
+    ATR(14),
+    VWAP(20),
+    Volatility(20), Volatility(60),
+]
+
+
+def indicator_columns(indicators: list = None) -> list[str]:
+    """Colunas geradas, na ordem"""
+    return [column for indicator in (indicators or DEFAULT_INDICATORS) for column in indicator.columns]
+
+
+# ===================================================================
+# Série e estado
+# ===================================================================
+
+def compute_indicators(bars: dict, state: dict = None, indicators: list = None) -> tuple[dict, dict]:
+    """
+    Calcula os indicadores de uma série de um ticker (ordenada por data).
+
+    Args:
+        bars: {"high", "low", "close", "volume"} -> ndarray float64
+        state: estado devolvido pela chamada anterior (None: início da série)
+
+    Barras com entrada nula não alteram o estado e ficam com indicadores nulos.
+
+    Returns:
+        ({coluna: ndarray}, novo estado)
+    """
+    indicators = indicators or DEFAULT_INDICATORS
+    n = len(bars["close"])
+    previous = (state or {}).get("indicators", {})
+    needed = {name for indicator in indicators for name in indicator.inputs}
+    valid = np.ones(n, dtype=bool)
+    for name in needed:
+        valid &= ~np.isnan(np.asarray(bars[name], dtype=float))
+    clean = {name: np.asarray(bars[name], dtype=float)[valid] for name in needed}
+    if not valid.any():
+        return {column: np.full(n, np.nan) for column in indicator_columns(indicators)}, \
+            state or {"version": INDICATOR_STATE_VERSION, "indicators": {}}
+
+    columns, states = {}, {}
+    for indicator in indicators:
+        values, states[indicator.name] = indicator.compute(clean, previous.get(indicator.name))
+        for column, series in values.items():
+            full = np.full(n, np.nan)
+            full[valid] = series
+            columns[column] = full
+    return columns, {"version": INDICATOR_STATE_VERSION, "indicators": states}
+
+
+def compute_indicators_split(bars: dict, split: int, state: dict = None,
+                             indicators: list = None) -> tuple[dict, dict | None, dict]:
+    """
+    compute_indicators em dois trechos, devolvendo também o estado após as `split`
+    primeiras barras (ponto de retomada intermediário, ex: fim do mês anterior).
+
+    Returns:
+        ({coluna: ndarray}, estado após `split` barras ou None se vazio, estado final)
+    """
+    head, checkpoint = compute_indicators({name: values[:split] for name, values in bars.items()},
+                                          state, indicators)
+    tail, final = compute_indicators({name: values[split:] for name, values in bars.items()},
+                                     checkpoint, indicators)
+    columns = {column: np.concatenate([head[column], tail[column]]) for column in head}
+    return columns, checkpoint if checkpoint["indicators"] else None, final
+
+
+def update_indicators(bar: dict, state: dict, indicators: list = None) -> tuple[dict, dict]:
+    """Um novo pregão ({"high", "low", "close", "volume"} -> float): O(1) por indicador"""
+    bars = {name: np.array([np.nan if value is None else value], dtype=float) for name, value in bar.items()}
+    columns, state = compute_indicators(bars, state, indicators)
+    return {column: _float(values[0]) for column, values in columns.items()}, state
+
+
+def dumps_state(state: dict) -> str:
+    return json.dumps(state, separators=(",", ":"), sort_keys=True)
+
+
+def loads_state(text: str, indicators: list = None) -> dict | None:
+    """
+    Estado serializado; None se for de outra versão ou de outro conjunto de
+    indicadores (a série precisa ser recalculada por inteiro)
+    """
+    state = json.loads(text)
+    names = {indicator.name for indicator in (indicators or DEFAULT_INDICATORS)}
+    if state.get("version") != INDICATOR_STATE_VERSION or set(state.get("indicators", {})) != names:
+        return None
+    return state
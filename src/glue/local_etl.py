@@ -0,0 +1,502 @@
+#!/usr/bin/env python3
+"""
+Motor local (sem Spark) das transformações do Glue ETL (glue_etl_job.py)
+
+Mesmas transformações R5 e mesmo layout de saída do job, com kernels Arrow/NumPy
+vetorizados sobre a série diária de cada ticker (cabe em memória):
+
+B) Close -> Preco_Fechamento, Volume -> Volume_Negociado
+C) Médias móveis de 5 linhas, Preco_Dia_Anterior, Variacao_Percentual_Diaria,
+   Dias_Desde_Inicio, indicadores técnicos (glue/indicators.py), year/month/day/Week
+A) Estado mensal mesclável (refined_agg/agg_mensal) e total por ticker (agg_total)
+
+Lê a saída de save_local_parquet (year=/month=/day=, vários tickers por arquivo;
+arquivos compactados também) e grava em <output>/refined/dataset=X/ticker=Y/...
+Os tickers são processados em paralelo num pool de processos; cada um grava só
+os próprios diretórios.
+
+Com --changed-dates, reescreve apenas as partições diárias afetadas: da primeira
+data alterada até o fim da série (EMA, RSI e ATR têm memória longa; no caso comum,
+pregões novos no fim, só as partições deles). As agregações do ticker são sempre
+regravadas (a série inteira já está em memória). O estado dos indicadores é
+gravado como no Glue (refined_agg/indicadores_estado), para os runs incrementais.
+
+Com --compare, confere a saída com o refined gerado pelo Spark (ex: copiado com
+`aws s3 sync s3://bucket/refined/dataset=petr4 spark_refined/`).
+
+Uso:
+    python src/glue/local_etl.py --root local_data/raw --output local_data --dataset petr4
+    python src/glue/local_etl.py --root local_data/raw --changed-dates 2025-01-02,2025-01-03
+    python src/glue/local_etl.py --root local_data/raw --compare spark_refined/
+"""
+
+import argparse
+import logging
+import os
+import sys
+import uuid
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from datetime import date
+from pathlib import Path
+
+import numpy as np
+import pyarrow as pa
+import pyarrow.compute as pc
+import pyarrow.dataset as ds
+import pyarrow.parquet as pq
+from numpy.lib.stride_tricks import sliding_window_view
+
+# Permitir execução direta do script (python src/glue/local_etl.py)
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from glue.etl_plan import (
+    AGG_MONTHLY_PREFIX,
+    AGG_TOTAL_PREFIX,
+    INDICATOR_STATE_PREFIX,
+    RAW_SOURCE_PRIORITY,
+    REFINED_LAYOUTS,
+    WINDOW_LOOKBACK_ROWS,
+    month_checkpoint_split,
+)
+from glue.indicators import compute_indicators_split, dumps_state, indicator_columns
+from ingestion.arrow_utils import partition_slices
+from ingestion.parquet_sink import PARTITION_FILENAME
+from ingestion.raw_schema import conform_raw
+
+logging.basicConfig(
+    level=logging.INFO,
+    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s'
+)
+logger = logging.getLogger(__name__)
+
+# Constantes das transformações espelhadas do glue_etl_job.py (o script do Glue só importa dentro do Glue)
+MOVING_AVERAGE_ROWS = WINDOW_LOOKBACK_ROWS + 1
+DIAS_DESDE_INICIO_ORIGIN = date(2025, 10, 20)
+
+
+# ===================================================================
+# Kernels vetorizados
+# ===================================================================
+
+def _values(table: pa.Table, name: str) -> np.ndarray:
+    """Coluna float64 como ndarray (nulos viram NaN)"""
+    return table[name].cast(pa.float64()).to_numpy()
+
+
+def _nullable(values: np.ndarray) -> pa.Array:
+    """ndarray float64 -> Arrow (NaN vira nulo, como o resultado nulo do Spark)"""
+    return pa.array(values, pa.float64(), from_pandas=True)
+
+
+def rolling_mean(values: np.ndarray, window: int) -> np.ndarray:
+    """Média dos não nulos nas últimas `window` linhas (avg() em rowsBetween(-(window-1), 0))"""
+    padded = np.concatenate([np.full(window - 1, np.nan), values])
+    windows = sliding_window_view(padded, window)
+    valid = ~np.isnan(windows)
+    counts = valid.sum(axis=1)
+    sums = np.where(valid, windows, 0.0).sum(axis=1)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        return np.where(counts > 0, sums / counts, np.nan)
+
+
+def lag(values: np.ndarray, periods: int = 1) -> np.ndarray:
+    """Valor `periods` linhas antes (NaN no início da série)"""
+    shifted = np.full(len(values), np.nan)
+    shifted[periods:] = values[:-periods]
+    return shifted
+
+
+def percent_change(current: np.ndarray, previous: np.ndarray) -> np.ndarray:
+    """(atual - anterior) / anterior * 100; nulo sem anterior ou com anterior zero (divisão no Spark)"""
+    with np.errstate(invalid='ignore', divide='ignore'):
+        change = (current - previous) / previous * 100
+    return np.where(np.isnan(previous) | (previous == 0), np.nan, change)
+
+
+def _segment_sum(values: np.ndarray, starts: np.ndarray) -> np.ndarray:
+    """Soma por segmento ignorando nulos; nula se o segmento só tem nulos (sum() do Spark)"""
+    valid = ~np.isnan(values)
+    sums = np.add.reduceat(np.where(valid, values, 0.0), starts)
+    counts = np.add.reduceat(valid.astype(np.int64), starts)
+    return np.where(counts > 0, sums, np.nan)
+
+
+def _sample_stddev(count: np.ndarray, total: np.ndarray, total_sq: np.ndarray) -> np.ndarray:
+    """Desvio padrão amostral a partir de (n, soma, soma dos quadrados); nulo com n < 2"""
+    with np.errstate(invalid='ignore', divide='ignore'):
+        variance = (total_sq - total * total / count) / (count - 1)
+    return np.where(count > 1, np.sqrt(np.maximum(variance, 0.0)), np.nan)
+
+
+# ===================================================================
+# Transformações (espelham as etapas 2-4 do glue_etl_job.py)
+# ===================================================================
+
+def transform_ticker(table: pa.Table) -> tuple[pa.Table, pa.Table]:
+    """
+    Série diária de um ticker (ordenada por Date, sem duplicatas) -> linhas do refined.
+
+    Mesmas colunas e tipos do df_with_periods do Spark (Date como "yyyy-MM-dd").
+
+    Returns:
+        (refined, estado dos indicadores na última data e no fim do mês anterior)
+    """
+    close = _values(table, "Close")
+    volume = _values(table, "Volume")
+    previous_close = lag(close)
+    dates = table["Date"].combine_chunks()
+    days = dates.cast(pa.int32()).to_numpy(zero_copy_only=False)
+    origin = (DIAS_DESDE_INICIO_ORIGIN - date(1970, 1, 1)).days
+    date_strings = dates.cast(pa.string())
+    split = month_checkpoint_split(date_strings.to_pylist())
+    indicators, checkpoint, indicator_state = compute_indicators_split(
+        {"high": _values(table, "High"), "low": _values(table, "Low"), "close": close, "volume": volume}, split)
+
+    refined = pa.table({
+        "ticker": table["ticker"],
+        "Date": date_strings,
+        "Open": table["Open"],
+        "High": table["High"],
+        "Low": table["Low"],
+        "Preco_Fechamento": table["Close"],
+        "Volume_Negociado": table["Volume"],
+        "Preco_Media_Movel_5d": _nullable(rolling_mean(close, MOVING_AVERAGE_ROWS)),
+        "Volume_Media_Movel_5d": _nullable(rolling_mean(volume, MOVING_AVERAGE_ROWS)),
+        "Preco_Dia_Anterior": _nullable(previous_close),
+        "Variacao_Percentual_Diaria": _nullable(percent_change(close, previous_close)),
+        "Dias_Desde_Inicio": pa.array(days - origin, pa.int32()),
+        **{column: _nullable(indicators[column]) for column in indicator_columns()},
+        "year": pc.cast(pc.year(dates), pa.string()),
+        "month": pc.cast(pc.month(dates), pa.string()),
+        "day": pc.cast(pc.day(dates), pa.string()),
+        "Week": pc.cast(pc.iso_week(dates), pa.int32()),
+    })
+    states = pa.table({
+        "Ultima_Data": date_strings.slice(len(date_strings) - 1, 1),
+        "Estado": [dumps_state(indicator_state)],
+        "Data_Fim_Mes_Anterior": pa.array([date_strings[split - 1].as_py() if checkpoint else None], pa.string()),
+        "Estado_Fim_Mes_Anterior": pa.array([dumps_state(checkpoint) if checkpoint else None], pa.string()),
+    })
+    return refined, states
+
+
+def monthly_state(refined: pa.Table) -> pa.Table:
+    """Estado mensal mesclável de um ticker (mesmas colunas do agg_mensal do Glue)"""
+    dates = pc.cast(refined["Date"], pa.date32())
+    month_keys = (pc.year(dates).to_numpy() * 12 + pc.month(dates).to_numpy()).astype(np.int64)
+    starts = np.flatnonzero(np.concatenate([[True], month_keys[1:] != month_keys[:-1]]))
+    ends = np.append(starts[1:], len(month_keys)) - 1
+
+    close = _values(refined, "Preco_Fechamento")
+    volume = _segment_sum(_values(refined, "Volume_Negociado"), starts)
+    count = np.diff(np.append(starts, len(month_keys))).astype(np.int64)
+    total = _segment_sum(close, starts)
+    total_sq = _segment_sum(close * close, starts)
+    starts_idx, ends_idx = pa.array(starts), pa.array(ends)
+    years, months = refined["year"].take(starts_idx), refined["month"].take(starts_idx)
+
+    return pa.table({
+        "ticker": refined["ticker"].take(starts_idx),
+        "year": years,
+        "month": months,
+        "Qtd_Dias_Negociacao": pa.array(count, pa.int64()),
+        "Soma_Preco_Fechamento": _nullable(total),
+        "Soma_Quadrados_Preco_Fechamento": _nullable(total_sq),
+        "Preco_Minimo_Mensal": _nullable(np.fmin.reduceat(_values(refined, "Low"), starts)),
+        "Preco_Maximo_Mensal": _nullable(np.fmax.reduceat(_values(refined, "High"), starts)),
+        "Volume_Total_Mensal": _nullable(volume),
+        "Primeira_Data": refined["Date"].take(starts_idx),
+        "Ultima_Data": refined["Date"].take(ends_idx),
+        "Preco_Primeiro_Fechamento": _nullable(close[starts]),
+        "Preco_Ultimo_Fechamento": _nullable(close[ends]),
+        "Preco_Medio_Mensal": _nullable(total / count),
+        "Volume_Medio_Mensal": _nullable(volume / count),
+        "Preco_Desvio_Padrao": _nullable(_sample_stddev(count, total, total_sq)),
+        "Periodo": pc.binary_join_element_wise(years, pc.utf8_lpad(months, 2, "0"), "-"),
+    })
+
+
+def total_from_monthly(monthly: pa.Table) -> pa.Table:
+    """Total de um ticker pela fusão dos estados mensais (mesmas colunas do agg_total do Glue)"""
+    count = pc.sum(monthly["Qtd_Dias_Negociacao"]).as_py()
+    total = pc.sum(monthly["Soma_Preco_Fechamento"]).as_py()
+    total_sq = pc.sum(monthly["Soma_Quadrados_Preco_Fechamento"]).as_py()
+    first_close = monthly["Preco_Primeiro_Fechamento"][0].as_py()
+    last_close = monthly["Preco_Ultimo_Fechamento"][-1].as_py()
+    stddev = _sample_stddev(np.array([count]), np.array([total if total is not None else np.nan]),
+                            np.array([total_sq if total_sq is not None else np.nan]))[0]
+    # Primeiro fechamento nulo ou zero: nulo (divisão no Spark)
+    variation = (last_close / first_close - 1) * 100 if first_close and last_close is not None else None
+
+    return pa.table({
+        "ticker": monthly["ticker"].slice(0, 1),
+        "Total_Dias_Analisados": pa.array([count], pa.int64()),
+        "Soma_Preco_Fechamento": pa.array([total], pa.float64()),
+        "Soma_Quadrados_Preco_Fechamento": pa.array([total_sq], pa.float64()),
+        "Volume_Total_Periodo": pa.array([pc.sum(monthly["Volume_Total_Mensal"]).as_py()], pa.float64()),
+        "Preco_Minimo_Periodo": pa.array([pc.min(monthly["Preco_Minimo_Mensal"]).as_py()], pa.float64()),
+        "Preco_Maximo_Periodo": pa.array([pc.max(monthly["Preco_Maximo_Mensal"]).as_py()], pa.float64()),
+        "Data_Inicio": monthly["Primeira_Data"].slice(0, 1),
+        "Data_Fim": monthly["Ultima_Data"].slice(len(monthly) - 1, 1),
+        "Preco_Primeiro_Fechamento": pa.array([first_close], pa.float64()),
+        "Preco_Ultimo_Fechamento": pa.array([last_close], pa.float64()),
+        "Preco_Medio_Periodo": pa.array([total / count if total is not None else None], pa.float64()),
+        "Preco_Desvio_Padrao_Periodo": _nullable(np.array([stddev])),
+        "Variacao_Percentual_Periodo": pa.array([variation], pa.float64()),
+    })
+
+
+def affected_rows(dates: np.ndarray, changed_dates: list[str], whole_months: bool = False) -> np.ndarray:
+    """
+    Máscara das linhas a regravar para as datas alteradas.
+
+    Da primeira linha em/após a data alterada mais antiga até o fim: além das
+    janelas de 5 linhas, os indicadores de memória longa (EMA, RSI, ATR) mudam em
+    todas as linhas seguintes.
+    """
+    mask = np.zeros(len(dates), dtype=bool)
+    if changed_dates:
+        mask[int(np.searchsorted(dates, np.datetime64(min(changed_dates), 'D'))):] = True
+    if whole_months and mask.any():
+        months = dates.astype('datetime64[M]')
+        mask |= np.isin(months, np.unique(months[mask]))
+    return mask
+
+
+# ===================================================================
+# Leitura e escrita
+# ===================================================================
+
+def _parquet_files(root: Path) -> list[Path]:
+    return sorted(
+        path for path in Path(root).rglob('*.parquet')
+        if not any(part.startswith(('.', '_')) for part in path.relative_to(root).parts)
+    )
+
+
+def read_raw(root: Path, dataset: str = None, tickers: list[str] = None, max_workers: int = 8) -> pa.Table:
+    """
+    Lê o raw local no contrato (ingestion.raw_schema), com ticker normalizado.
+
+    Linhas de outro dataset são descartadas (dataset nulo é aceito: produtores antigos).
+    """
+    files = _parquet_files(root)
+    if not files:
+        raise ValueError(f"Nenhum arquivo Parquet encontrado em {root}")
+
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        tables = list(executor.map(lambda path: conform_raw(pq.read_table(path)), files))
+    table = pa.concat_tables(tables)
+    table = table.set_column(table.schema.get_field_index("ticker"), "ticker",
+                             pc.utf8_lower(pc.utf8_trim_whitespace(table["ticker"])))
+
+    if dataset:
+        table = table.filter(pc.or_kleene(pc.equal(table["dataset"], dataset), pc.is_null(table["dataset"])))
+    if tickers:
+        table = table.filter(pc.is_in(table["ticker"], pa.array(tickers)))
+    logger.info(f"Raw: {len(files)} arquivos, {table.num_rows} linhas")
+    return table
+
+
+def split_by_ticker(table: pa.Table) -> dict[str, pa.Table]:
+    """
+    Uma tabela por ticker, ordenada por Date e sem (ticker, Date) repetidos.
+
+    Cada série é materializada com take (buffers próprios): só ela é serializada
+    ao ser enviada para o processo do pool.
+    """
+    # Mesma regra do Glue (RAW_SOURCE_PRIORITY): a melhor linha de cada (ticker, Date)
+    # fica por último; ordenação estável, então o empate final é o último arquivo lido
+    priority = pc.fill_null(pc.index_in(table["data_source"], value_set=pa.array(RAW_SOURCE_PRIORITY)),
+                            len(RAW_SOURCE_PRIORITY))
+    ranked = pa.table({"ticker": table["ticker"], "Date": table["Date"], "priority": priority,
+                       "extraction_timestamp": pc.fill_null(table["extraction_timestamp"], "")})
+    order = pc.sort_indices(ranked, [("ticker", "ascending"), ("Date", "ascending"), ("priority", "descending"),
+                                     ("extraction_timestamp", "ascending")])
+    tickers = table["ticker"].take(order).to_numpy(zero_copy_only=False)
+    dates = table["Date"].take(order).cast(pa.int32()).to_numpy(zero_copy_only=False)
+    order = order.to_numpy()
+
+    last = np.ones(len(order), dtype=bool)
+    last[:-1] = (tickers[1:] != tickers[:-1]) | (dates[1:] != dates[:-1])
+    order, tickers = order[last], tickers[last]
+
+    bounds = np.flatnonzero(np.concatenate([[True], tickers[1:] != tickers[:-1], [True]]))
+    return {
+        tickers[start]: table.take(pa.array(order[start:end]))
+        for start, end in zip(bounds[:-1], bounds[1:])
+    }
+
+
+def _write_partition(directory: Path, table: pa.Table) -> None:
+    """Substitui o conteúdo da partição (overwrite dinâmico): grava e troca por rename"""
+    directory.mkdir(parents=True, exist_ok=True)
+    tmp_path = directory / f".{PARTITION_FILENAME}.{uuid.uuid4().hex}.tmp"
+    pq.write_table(table, tmp_path, compression='snappy')
+    for old in directory.glob('*.parquet'):
+        if old.name != PARTITION_FILENAME:
+            old.unlink()
+    os.replace(tmp_path, directory / PARTITION_FILENAME)
+
+
+def process_ticker(series: pa.Table, output: str, dataset: str, layout: str = "day",
+                   changed_dates: list[str] = None) -> dict:
+    """Transforma e grava um ticker (refined + agregações); roda num processo do pool"""
+    output = Path(output)
+    ticker = series["ticker"][0].as_py()
+    refined, indicator_states = transform_ticker(series)
+
+    rows = refined
+    if changed_dates:
+        dates = series["Date"].to_numpy(zero_copy_only=False).astype('datetime64[D]')
+        rows = refined.filter(pa.array(affected_rows(dates, changed_dates, whole_months=layout == "month")))
+
+    # Layout "month": a coluna day continua nos dados, só deixa de ser partição
+    partition_cols = REFINED_LAYOUTS[layout]
+    if layout != "day":
+        rows = rows.set_column(rows.schema.get_field_index("day"), "day", pc.cast(rows["day"], pa.int32()))
+    keys = [f"_{col}" for col in partition_cols]
+    for key, col in zip(keys, partition_cols):
+        rows = rows.append_column(key, pc.cast(rows[col], pa.int32()))
+
+    ticker_dir = output / "refined" / f"dataset={dataset}" / f"ticker={ticker}"
+    partitions = 0
+    for values, part in partition_slices(rows, keys):
+        directory = ticker_dir.joinpath(*(f"{col}={value}" for col, value in zip(partition_cols, values)))
+        dropped = [col for col in ("ticker", *partition_cols) if col in part.column_names]
+        _write_partition(directory, part.drop_columns([*dropped, *keys]))
+        partitions += 1
+
+    monthly = monthly_state(refined)
+    total = total_from_monthly(monthly)
+    _write_partition(output / AGG_MONTHLY_PREFIX / f"dataset={dataset}" / f"ticker={ticker}",
+                     monthly.drop_columns(["ticker"]))
+    _write_partition(output / AGG_TOTAL_PREFIX / f"dataset={dataset}" / f"ticker={ticker}",
+                     total.drop_columns(["ticker"]))
+    _write_partition(output / INDICATOR_STATE_PREFIX / f"dataset={dataset}" / f"ticker={ticker}",
+                     indicator_states)
+
+    return {"ticker": ticker, "rows": rows.num_rows, "partitions": partitions, "months": monthly.num_rows}
+
+
+def run_local_etl(root: Path, output: Path, dataset: str, tickers: list[str] = None, layout: str = "day",
+                  changed_dates: list[str] = None, workers: int = None) -> dict:
+    """Lê o raw local e processa os tickers em paralelo (workers=1: no próprio processo)"""
+    if layout not in REFINED_LAYOUTS:
+        raise ValueError(f"layout inválido: {layout} (use {', '.join(REFINED_LAYOUTS)})")
+
+    series = split_by_ticker(read_raw(root, dataset=dataset, tickers=tickers))
+    if not series:
+        raise ValueError(f"Nenhum registro encontrado em {root}")
+
+    workers = min(workers or os.cpu_count() or 1, len(series))
+    arguments = (str(output), dataset, layout, changed_dates)
+    if workers == 1:
+        results = [process_ticker(table, *arguments) for table in series.values()]
+    else:
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            futures = [executor.submit(process_ticker, table, *arguments) for table in series.values()]
+            results = [future.result() for future in futures]
+
+    totals = {"tickers": len(results), "rows": 0, "partitions": 0, "months": 0}
+    for result in results:
+        for key in ("rows", "partitions", "months"):
+            totals[key] += result[key]
+    return totals
+
+
+# ===================================================================
+# Conferência com a saída do Spark
+# ===================================================================
+
+def _read_refined(path: Path) -> pa.Table:
+    # Colunas de partição (ticker=, year=, ...) voltam como colunas, inferidas igual dos dois lados
+    return ds.dataset(path, format="parquet", partitioning="hive").to_table()
+
+
+def compare_refined(expected: Path, actual: Path, rtol: float = 1e-9, atol: float = 1e-9) -> list[str]:
+    """
+    Diferenças entre dois refined (ex: Spark x local) por (ticker, Date).
+
+    Colunas numéricas comparadas com tolerância; demais, por igualdade.
+
+    Returns:
+        lista de problemas (vazia = equivalentes)
+    """
+    left, right = _read_refined(expected), _read_refined(actual)
+    problems = []
+    missing = set(left.column_names) ^ set(right.column_names)
+    if missing:
+        problems.append(f"colunas só de um lado: {sorted(missing)}")
+
+    keys = ["ticker", "Date"]
+    for table, name in ((left, "esperado"), (right, "local")):
+        table_keys = set(zip(*(table[k].cast(pa.string()).to_pylist() for k in keys)))
+        if len(table_keys) != table.num_rows:
+            problems.append(f"{name}: (ticker, Date) repetidos")
+
+    left = left.sort_by([(k, "ascending") for k in keys])
+    right = right.sort_by([(k, "ascending") for k in keys])
+    left_keys = list(zip(*(left[k].cast(pa.string()).to_pylist() for k in keys)))
+    right_keys = list(zip(*(right[k].cast(pa.string()).to_pylist() for k in keys)))
+    if left_keys != right_keys:
+        only_left = sorted(set(left_keys) - set(right_keys))
+        only_right = sorted(set(right_keys) - set(left_keys))
+        problems.append(f"linhas só no esperado: {len(only_left)} {only_left[:5]}; "
+                        f"só no local: {len(only_right)} {only_right[:5]}")
+        return problems
+
+    for column in sorted(set(left.column_names) & set(right.column_names)):
+        expected_col, actual_col = left[column], right[column]
+        if pa.types.is_floating(expected_col.type) or pa.types.is_floating(actual_col.type):
+            a = expected_col.cast(pa.float64()).to_numpy()
+            b = actual_col.cast(pa.float64()).to_numpy()
+            bad = ~np.isclose(a, b, rtol=rtol, atol=atol, equal_nan=True)
+        else:
+            bad = np.array(expected_col.cast(pa.string()).to_pylist(), dtype=object) \
+                != np.array(actual_col.cast(pa.string()).to_pylist(), dtype=object)
+        if bad.any():
+            first = int(np.flatnonzero(bad)[0])
+            problems.append(f"{column}: {int(bad.sum())} diferenças (ex: {left_keys[first]}: "
+                            f"{expected_col[first].as_py()} x {actual_col[first].as_py()})")
+    return problems
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Transformações do Glue ETL em Arrow/NumPy (sem Spark)')
+    parser.add_argument('--root', default='local_data/raw', help='Raiz do raw local (saída de save_local_parquet)')
+    parser.add_argument('--output', default='local_data', help='Destino de refined/ e refined_agg/')
+    parser.add_argument('--dataset', default='petr4')
+    parser.add_argument('--tickers', help='Lista separada por vírgula (padrão: todos os do raw)')
+    parser.add_argument('--layout', choices=list(REFINED_LAYOUTS), default='day',
+                        help='Particionamento do refined (como --REFINED_LAYOUT no Glue)')
+    parser.add_argument('--changed-dates', help='Datas alteradas (yyyy-mm-dd, separadas por vírgula)')
+    parser.add_argument('--workers', type=int, help='Processos do pool (padrão: núcleos da máquina)')
+    parser.add_argument('--compare', help='Refined do Spark para conferência (diretório do dataset)')
+    parser.add_argument('--rtol', type=float, default=1e-9, help='Tolerância relativa na conferência')
+
+    args = parser.parse_args()
+
+    tickers = [t.strip().lower() for t in args.tickers.split(',') if t.strip()] if args.tickers else None
+    changed_dates = [d.strip() for d in args.changed_dates.split(',') if d.strip()] if args.changed_dates else None
+    dataset = args.dataset.lower()
+
+    totals = run_local_etl(Path(args.root), Path(args.output), dataset, tickers=tickers, layout=args.layout,
+                           changed_dates=changed_dates, workers=args.workers)
+    logger.info(
+        f"✅ Refined local: {totals['tickers']} tickers, {totals['rows']} linhas em "
+        f"{totals['partitions']} partições, {totals['months']} meses agregados"
+    )
+
+    if args.compare:
+        problems = compare_refined(Path(args.compare), Path(args.output) / "refined" / f"dataset={dataset}",
+                                   rtol=args.rtol)
+        for problem in problems:
+            logger.error(f"❌ {problem}")
+        if problems:
+            sys.exit(1)
+        logger.info("✅ Saída local equivalente ao refined do Spark")
+
+
+if __name__ == '__main__':
+    main()
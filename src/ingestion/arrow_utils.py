@@ -0,0 +1,56 @@
+#!/usr/bin/env python3
+"""
+Utilitários Arrow compartilhados pelos escritores de Parquet da ingestão
+"""
+
+import numpy as np
+import pyarrow as pa
+import pyarrow.compute as pc
+
+
+def to_arrow(data) -> pa.Table:
+    """Aceita pa.Table ou pd.DataFrame (sem índice) e devolve pa.Table"""
+    if isinstance(data, pa.Table):
+        return data
+    return pa.Table.from_pandas(data, preserve_index=False)
+
+
+def partition_slices(table: pa.Table, keys: list[str]):
+    """
+    Itera (valores_da_chave, fatia) para cada combinação de `keys`.
+
+    A tabela é ordenada uma única vez pelas chaves (pulado se já estiver em ordem)
+    e cada partição é uma fatia zero-copy da tabela ordenada.
+    """
+    if table.num_rows == 0:
+        return
+
+    if not _is_sorted(table, keys):
+        table = table.sort_by([(key, 'ascending') for key in keys])
+
+    changed = np.zeros(table.num_rows - 1, dtype=bool)
+    for key in keys:
+        column = table[key].combine_chunks()
+        changed |= pc.not_equal(column[1:], column[:-1]).to_numpy(zero_copy_only=False)
+
+    bounds = [0, *(np.flatnonzero(changed) + 1).tolist(), table.num_rows]
+    for start, end in zip(bounds[:-1], bounds[1:]):
+        values = tuple(table[key][start].as_py() for key in keys)
+        yield values, table.slice(start, end - start)
+
+
+def _is_sorted(table: pa.Table, keys: list[str]) -> bool:
+    """Ordenação lexicográfica por `keys` já satisfeita (caso comum: um ticker, datas crescentes)"""
+    if table.num_rows < 2:
+        return True
+    tied = np.ones(table.num_rows - 1, dtype=bool)
+    for key in keys:
+        column = table[key].combine_chunks()
+        previous, current = column[:-1], column[1:]
+        if pc.any(pc.and_(pa.array(tied), pc.less(current, previous))).as_py():
+            return False
+        tied &= pc.equal(current, previous).to_numpy(zero_copy_only=False)
+        if not tied.any():
+            return True
+    return True
+
@@ -0,0 +1,268 @@
+#!/usr/bin/env python3
+"""
+Backfill histórico (multi-ano) retomável para um universo de tickers
+
+- Divide (ticker × período) em blocos de --chunk-days e executa em paralelo
+- Manifesto JSON de checkpoint: blocos concluídos são pulados ao reexecutar
+  (uma queda retoma de onde parou; blocos com erro são tentados de novo)
+- Cada bloco vai direto para o destino: PartitionedParquetSink (local) ou
+  upload paralelo (S3); nada do histórico completo fica em memória
+- Local: o bloco só é marcado como concluído depois que o sink grava as
+  partições em disco (checkpoint a cada --checkpoint-every blocos)
+
+Blocos anteriores ao range máximo da BRAPI ('1y') usam direto o Yahoo
+(period1/period2), que aceita qualquer intervalo.
+
+Uso:
+    python src/ingestion/backfill.py --tickers-file universo.txt --start-date 2010-01-01
+"""
+
+import argparse
+import json
+import logging
+import sys
+import threading
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from datetime import date, datetime, timedelta
+from pathlib import Path
+
+# Permitir execução direta do script (python src/ingestion/backfill.py)
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from ingestion.extract_real_b3_data import (RealB3DataExtractor, build_shared_session, log_run_stats,
+                                            parse_tickers)
+from ingestion.http_cache import HTTPResponseCache
+from ingestion.parquet_sink import PartitionedParquetSink
+from ingestion.rate_limit import parse_rate_limit_spec
+from ingestion.watermark import LocalWatermarkStore
+
+logging.basicConfig(
+    level=logging.INFO,
+    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s'
+)
+logger = logging.getLogger(__name__)
+
+MANIFEST_FILENAME = "_backfill_manifest.json"
+
+
+def plan_chunks(tickers: list[str], start_date: str, end_date: str, chunk_days: int = 365) -> list[dict]:
+    """Blocos (ticker, início, fim) com fim inclusivo, cobrindo o período sem sobreposição"""
+    start = date.fromisoformat(start_date)
+    end = date.fromisoformat(end_date)
+    chunks = []
+    for ticker in tickers:
+        chunk_start = start
+        while chunk_start <= end:
+            chunk_end = min(end, chunk_start + timedelta(days=chunk_days - 1))
+            chunks.append({
+                'id': f"{ticker}:{chunk_start.isoformat()}:{chunk_end.isoformat()}",
+                'ticker': ticker,
+                'start': chunk_start.isoformat(),
+                'end': chunk_end.isoformat(),
+            })
+            chunk_start = chunk_end + timedelta(days=1)
+    return chunks
+
+
+class BackfillManifest:
+    """Checkpoint em JSON (escrita atômica) com o estado de cada bloco"""
+
+    def __init__(self, path: Path):
+        self.path = Path(path)
+        self._lock = threading.Lock()
+        self.chunks: dict[str, dict] = {}
+        if self.path.exists():
+            self.chunks = json.loads(self.path.read_text(encoding='utf-8')).get('chunks', {})
+
+    def is_done(self, chunk_id: str) -> bool:
+        return self.chunks.get(chunk_id, {}).get('status') == 'done'
+
+    def mark(self, chunk_id: str, status: str, **details) -> None:
+        with self._lock:
+            self.chunks[chunk_id] = {'status': status, 'updated_at': datetime.now().isoformat(), **details}
+            self._save()
+
+    def mark_done_many(self, results: list[tuple[str, dict]]) -> None:
+        with self._lock:
+            now = datetime.now().isoformat()
+            for chunk_id, details in results:
+                self.chunks[chunk_id] = {'status': 'done', 'updated_at': now, **details}
+            self._save()
+
+    def _save(self) -> None:
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        tmp_path = self.path.with_suffix('.tmp')
+        tmp_path.write_text(json.dumps({'chunks': self.chunks}, indent=2, sort_keys=True), encoding='utf-8')
+        tmp_path.replace(self.path)
+
+
+def run_backfill(tickers: list[str], start_date: str, end_date: str, manifest: BackfillManifest,
+                 output_dir: Path = None, s3_bucket: str = None, s3_prefix: str = "raw",
+                 dataset_name: str = None, chunk_days: int = 365, max_workers: int = 8,
+                 checkpoint_every: int = 20, session=None, cache: HTTPResponseCache = None,
+                 rate_limiters: dict = None, breakers: dict = None,
+                 upload_workers: int = 16) -> dict:
+    """
+    Executa os blocos pendentes do manifesto.
+
+    Returns:
+        Dict com contagens done/skipped/failed/empty e total de linhas gravadas
+    """
+    if session is None:
+        session = build_shared_session(pool_size=max_workers)
+
+    chunks = plan_chunks(tickers, start_date, end_date, chunk_days)
+    pending = [chunk for chunk in chunks if not manifest.is_done(chunk['id'])]
+    logger.info(f"Backfill: {len(chunks)} blocos, {len(chunks) - len(pending)} já concluídos, "
+                f"{len(pending)} pendentes")
+
+    stats = {'done': 0, 'skipped': len(chunks) - len(pending), 'failed': 0, 'empty': 0, 'rows': 0}
+    sink = PartitionedParquetSink(output_dir) if s3_bucket is None else None
+    watermarks = LocalWatermarkStore(output_dir) if s3_bucket is None else None
+    # Blocos já gravados no sink mas ainda não persistidos (aguardando checkpoint)
+    uncommitted: list[tuple[str, dict]] = []
+
+    def _run_chunk(chunk: dict) -> dict:
+        extractor = RealB3DataExtractor(
+            ticker=chunk['ticker'],
+            dataset_name=dataset_name or chunk['ticker'].lower(),
+            session=session,
+            cache=cache,
+            breakers=breakers,
+            rate_limiters=rate_limiters
+        )
+        table = extractor.extract_table(start_date=chunk['start'], end_date=chunk['end'])
+        if table.num_rows == 0:
+            return {'rows': 0}
+
+        if sink is not None:
+            extractor.save_local_parquet(table, output_dir, sink=sink)
+        else:
+            extractor.upload_to_s3(table, bucket=s3_bucket, prefix=s3_prefix, max_workers=upload_workers)
+        return {
+            'rows': table.num_rows,
+            'dataset': extractor.dataset_name,
+            'ticker': extractor.ticker_normalized,
+            'last_date': table['date'][-1].as_py().isoformat(),
+        }
+
+    def _checkpoint():
+        if not uncommitted:
+            return
+        sink.flush()
+        for _, details in uncommitted:
+            if details.get('last_date'):
+                watermarks.update(details['dataset'], details['ticker'],
+                                  date.fromisoformat(details['last_date']))
+        manifest.mark_done_many(uncommitted)
+        logger.info(f"Checkpoint: {len(uncommitted)} blocos persistidos")
+        uncommitted.clear()
+
+    try:
+        with ThreadPoolExecutor(max_workers=max_workers) as executor:
+            futures = {executor.submit(_run_chunk, chunk): chunk for chunk in pending}
+            for future in as_completed(futures):
+                chunk = futures[future]
+                try:
+                    details = future.result()
+                except Exception as e:
+                    logger.error(f"❌ Bloco {chunk['id']} falhou: {e}")
+                    manifest.mark(chunk['id'], 'failed', error=str(e))
+                    stats['failed'] += 1
+                    continue
+
+                if details['rows'] == 0:
+                    # Sem pregões (ex: antes do IPO) ou todas as fontes falharam: não dá
+                    # para distinguir, então o bloco é tentado de novo na próxima execução
+                    manifest.mark(chunk['id'], 'empty')
+                    stats['empty'] += 1
+                    continue
+
+                stats['done'] += 1
+                stats['rows'] += details['rows']
+                if sink is None:
+                    manifest.mark(chunk['id'], 'done', **details)
+                else:
+                    uncommitted.append((chunk['id'], details))
+                    if len(uncommitted) >= checkpoint_every:
+                        _checkpoint()
+
+                finished = stats['done'] + stats['empty'] + stats['failed']
+                logger.info(f"Progresso: {finished}/{len(pending)} blocos")
+    finally:
+        # Queda no meio: o que já foi gravado no sink é persistido e registrado
+        if sink is not None:
+            _checkpoint()
+            sink.close()
+
+    logger.info(f"✅ Backfill: {stats}")
+    return stats
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Backfill histórico retomável (ticker × período)')
+    parser.add_argument('--tickers', help='Lista de tickers separados por vírgula')
+    parser.add_argument('--tickers-file', help='Arquivo com um ticker por linha')
+    parser.add_argument('--start-date', required=True, help='YYYY-MM-DD')
+    parser.add_argument('--end-date', help='YYYY-MM-DD (padrão: hoje)')
+    parser.add_argument('--chunk-days', type=int, default=365, help='Dias por bloco')
+    parser.add_argument('--max-workers', type=int, default=8, help='Blocos em paralelo')
+    parser.add_argument('--checkpoint-every', type=int, default=20,
+                        help='Blocos entre checkpoints (gravação em disco + manifesto)')
+    parser.add_argument('--manifest', help=f'Manifesto de checkpoint (padrão: <output-dir>/{MANIFEST_FILENAME})')
+    parser.add_argument('--dataset', help='Dataset (padrão: o próprio ticker)')
+    parser.add_argument('--cache-dir', help='Diretório do cache HTTP em disco (desativado se omitido)')
+    parser.add_argument('--cache-max-mb', type=int, default=256, help='Tamanho máximo do cache HTTP')
+    parser.add_argument('--rate-limit', action='append', default=[],
+                        help="Orçamento por fonte, ex: yahoo:rps=2,burst=5 (repetível)")
+    parser.add_argument('--rate-limit-state',
+                        help='Arquivo JSON de estado do rate limit compartilhado entre execuções')
+    parser.add_argument('--output-dir', default='local_data/raw')
+    parser.add_argument('--s3-bucket')
+    parser.add_argument('--s3-prefix', default='raw')
+    parser.add_argument('--upload-workers', type=int, default=16, help='Uploads S3 simultâneos')
+
+    args = parser.parse_args()
+
+    tickers = parse_tickers(args.tickers, args.tickers_file)
+    if not tickers:
+        logger.error("Nenhum ticker informado em --tickers/--tickers-file")
+        sys.exit(1)
+
+    output_dir = Path(args.output_dir)
+    manifest = BackfillManifest(Path(args.manifest) if args.manifest else output_dir / MANIFEST_FILENAME)
+
+    rate_limiters = {}
+    for spec in args.rate_limit:
+        limiter = parse_rate_limit_spec(spec, state_path=args.rate_limit_state)
+        rate_limiters[limiter.name] = limiter
+
+    cache = None
+    if args.cache_dir:
+        cache = HTTPResponseCache(Path(args.cache_dir), max_bytes=args.cache_max_mb * 1024 * 1024)
+
+    stats = run_backfill(
+        tickers,
+        start_date=args.start_date,
+        end_date=args.end_date or date.today().isoformat(),
+        manifest=manifest,
+        output_dir=output_dir,
+        s3_bucket=args.s3_bucket,
+        s3_prefix=args.s3_prefix,
+        dataset_name=args.dataset,
+        chunk_days=args.chunk_days,
+        max_workers=args.max_workers,
+        checkpoint_every=args.checkpoint_every,
+        cache=cache,
+        rate_limiters=rate_limiters,
+        upload_workers=args.upload_workers,
+    )
+    log_run_stats(cache, rate_limiters)
+
+    if stats['failed']:
+        logger.error(f"{stats['failed']} blocos falharam; reexecute o mesmo comando para retomar")
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,393 @@
+#!/usr/bin/env python3
+"""
+Compactação de partições pequenas em raw/
+
+Lambda, extrator e CSVProcessor gravam um arquivo por dia (year=/month=/day=),
+com poucas linhas cada. Este comando reescreve os dias de períodos já encerrados
+em arquivos por mês (ou por ano) de tamanho-alvo:
+
+- Poda de partição preservada: o diretório year=/month= continua no caminho e as
+  colunas dos níveis abaixo (day, e month no nível ano) passam a ir dentro do
+  arquivo, ordenadas, com estatísticas min/max por row group
+- Troca "escreve o novo, depois remove o antigo":
+  local: escreve em diretório oculto ao lado, troca por rename e apaga o antigo;
+  S3: grava os novos objetos, confere as contagens e só então apaga os antigos
+- Apenas períodos encerrados (mês/ano terminado há pelo menos --min-age-days)
+- Arquivos gerados começam com `compacted-` (o trigger do Glue os ignora)
+- Dia regravado depois da compactação (ex: Lambda rebuscando 30 dias, correções):
+  o arquivo do dia substitui as linhas daquele dia no compactado na próxima execução
+
+refined/ não é aceito: o catálogo do Athena (docs/athena_queries.sql) particiona por
+year/month/day e arquivos fora de day= ficariam invisíveis; o Glue regrava dias
+de um mês compactado ao lado do compactado, duplicando (ticker, Date). Para
+arquivos maiores em refined/ use o layout "month" do Glue (--REFINED_LAYOUT).
+
+Uso:
+    python src/ingestion/compact_partitions.py --root local_data/raw --level month
+    python src/ingestion/compact_partitions.py --root s3://bucket/raw/dataset=petr4 --level year
+"""
+
+import argparse
+import calendar
+import logging
+import math
+import os
+import shutil
+import sys
+import uuid
+from datetime import date, datetime, timedelta
+from io import BytesIO
+from pathlib import Path
+
+import boto3
+import numpy as np
+import pyarrow as pa
+import pyarrow.compute as pc
+import pyarrow.parquet as pq
+
+# Permitir execução direta do script (python src/ingestion/compact_partitions.py)
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from ingestion.watermark import _partition_value
+
+logging.basicConfig(
+    level=logging.INFO,
+    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s'
+)
+logger = logging.getLogger(__name__)
+
+COMPACTED_PREFIX = "compacted-"
+PARTITION_LEVELS = ('year', 'month', 'day')
+
+# Chaves de ordenação dentro do arquivo compactado (além das partições internas)
+SORT_COLUMNS = ('ticker', 'Date')
+
+# Tabelas geridas pelo Glue (refined/, refined_agg/): fora do escopo da compactação
+GLUE_OUTPUT_PREFIX = "refined"
+
+
+def _partition_parts(relative_path: str) -> list[tuple[str, int]]:
+    """[('year', 2024), ('month', 3), ...] a partir dos diretórios do caminho"""
+    parts = []
+    for name in relative_path.split('/')[:-1]:
+        value = _partition_value(name)
+        if value is not None:
+            parts.append((name.split('=', 1)[0], value))
+    return parts
+
+
+def _partition_key(table: pa.Table, depth: int):
+    """Chave numérica (year, month, day) até `depth` níveis, por linha"""
+    key = np.zeros(table.num_rows, dtype=np.int64)
+    for name in PARTITION_LEVELS[:depth]:
+        key = key * 100 + pc.cast(table[name], pa.int64()).to_numpy(zero_copy_only=False)
+    return key
+
+
+def check_raw_root(root: str) -> None:
+    """
+    Raises:
+        ValueError: raiz dentro das saídas do Glue (refined/, refined_agg/)
+    """
+    path = root[len('s3://'):].split('/', 1)[-1] if root.startswith('s3://') else root
+    if any(part.startswith(GLUE_OUTPUT_PREFIX) for part in Path(path).parts):
+        raise ValueError(f"Compactação só vale para raw/ (recebido {root}); "
+                         "em refined/ use --REFINED_LAYOUT=month no Glue")
+
+
+def period_closed(values: dict, level: str, today: date, min_age_days: int) -> bool:
+    """True se o mês/ano da partição terminou há pelo menos `min_age_days` dias"""
+    year = values['year']
+    if level == 'year':
+        last_day = date(year, 12, 31)
+    else:
+        month = values['month']
+        last_day = date(year, month, calendar.monthrange(year, month)[1])
+    return last_day + timedelta(days=min_age_days) < today
+
+
+class LocalPartitionStorage:
+    """Partições em disco (saída de save_local_parquet / save_parquet)"""
+
+    def __init__(self, root: str):
+        self.root = Path(root)
+
+    def describe(self, group: str) -> str:
+        return str(self.root / group)
+
+    def list_parquet(self) -> list[tuple[str, int]]:
+        files = []
+        for path in self.root.rglob("*.parquet"):
+            relative = path.relative_to(self.root).as_posix()
+            if any(part.startswith(('.', '_')) for part in relative.split('/')):
+                continue
+            files.append((relative, path.stat().st_size))
+        return sorted(files)
+
+    def read(self, relative_path: str) -> pa.Table:
+        return pq.read_table(self.root / relative_path, partitioning=None)
+
+    def replace(self, group: str, outputs: list[tuple[str, bytes]], old_files: list[str],
+                run_id: str) -> None:
+        """Grava em diretório oculto ao lado do grupo e troca os dois por rename"""
+        group_dir = self.root / group
+        staging = group_dir.with_name(f".{group_dir.name}.compacting-{run_id}")
+        trash = group_dir.with_name(f".{group_dir.name}.old-{run_id}")
+
+        staging.mkdir(parents=True)
+        for name, body in outputs:
+            (staging / name).write_bytes(body)
+
+        os.replace(group_dir, trash)
+        os.replace(staging, group_dir)
+        shutil.rmtree(trash)
+
+
+class S3PartitionStorage:
+    """Partições no S3 (raw/ do Lambda e do extrator, refined/ do Glue)"""
+
+    def __init__(self, bucket: str, prefix: str, s3_client=None):
+        self.bucket = bucket
+        self.prefix = prefix.strip('/')
+        self.s3_client = s3_client or boto3.client('s3')
+
+    def _key(self, relative_path: str) -> str:
+        return f"{self.prefix}/{relative_path}" if self.prefix else relative_path
+
+    def describe(self, group: str) -> str:
+        return f"s3://{self.bucket}/{self._key(group)}"
+
+    def list_parquet(self) -> list[tuple[str, int]]:
+        paginator = self.s3_client.get_paginator('list_objects_v2')
+        base = f"{self.prefix}/" if self.prefix else ""
+        files = []
+        for page in paginator.paginate(Bucket=self.bucket, Prefix=base):
+            for obj in page.get('Contents', []):
+                key = obj['Key']
+                if key.endswith('.parquet'):
+                    files.append((key[len(base):], obj['Size']))
+        return sorted(files)
+
+    def read(self, relative_path: str) -> pa.Table:
+        response = self.s3_client.get_object(Bucket=self.bucket, Key=self._key(relative_path))
+        return pq.read_table(BytesIO(response['Body'].read()), partitioning=None)
+
+    def replace(self, group: str, outputs: list[tuple[str, bytes]], old_files: list[str],
+                run_id: str) -> None:
+        """
+        Grava os novos objetos e só então apaga os antigos. Entre as duas etapas
+        leitores podem ver as linhas duplicadas (nunca ausentes).
+        """
+        for name, body in outputs:
+            self.s3_client.put_object(
+                Bucket=self.bucket,
+                Key=self._key(f"{group}/{name}"),
+                Body=body,
+                ContentType='application/x-parquet'
+            )
+
+        keys = [{'Key': self._key(path)} for path in old_files]
+        for start in range(0, len(keys), 1000):
+            response = self.s3_client.delete_objects(
+                Bucket=self.bucket,
+                Delete={'Objects': keys[start:start + 1000], 'Quiet': True}
+            )
+            errors = response.get('Errors', [])
+            if errors:
+                raise RuntimeError(
+                    f"Falha ao remover {len(errors)} objetos antigos de {self.describe(group)} "
+                    f"(ex: {errors[0].get('Key')}); dados novos já gravados"
+                )
+
+
+class PartitionCompactor:
+    """Reescreve partições diárias de períodos encerrados em arquivos por mês ou ano"""
+
+    def __init__(self, storage, level: str = 'month', target_bytes: int = 128 * 1024 * 1024,
+                 min_age_days: int = 3, compression: str = 'snappy', dry_run: bool = False,
+                 today: date = None):
+        if level not in ('month', 'year'):
+            raise ValueError("level deve ser 'month' ou 'year'")
+        self.storage = storage
+        self.level = level
+        self.target_bytes = target_bytes
+        self.min_age_days = min_age_days
+        self.compression = compression
+        self.dry_run = dry_run
+        self.today = today or date.today()
+        self.depth = PARTITION_LEVELS.index(level) + 1
+
+    def plan(self) -> dict[str, list[tuple[str, int]]]:
+        """Agrupa os arquivos pelo diretório do nível de compactação (só períodos encerrados)"""
+        groups: dict[str, list[tuple[str, int]]] = {}
+        for relative_path, size in self.storage.list_parquet():
+            parts = _partition_parts(relative_path)
+            names = tuple(name for name, _ in parts)
+            if names != PARTITION_LEVELS[:len(names)] or len(names) < self.depth:
+                # Arquivo acima do nível (já mais grosso) ou fora do layout year=/month=/day=
+                continue
+            if not period_closed(dict(parts), self.level, self.today, self.min_age_days):
+                continue
+
+            directories = relative_path.split('/')[:-1]
+            level_index = [i for i, name in enumerate(directories)
+                           if _partition_value(name) is not None][self.depth - 1]
+            group = '/'.join(directories[:level_index + 1])
+            groups.setdefault(group, []).append((relative_path, size))
+
+        return {group: files for group, files in groups.items() if self._needs_compaction(group, files)}
+
+    def _needs_compaction(self, group: str, files: list[tuple[str, int]]) -> bool:
+        nested = any(path.count('/') > group.count('/') + 1 for path, _ in files)
+        if nested:
+            return True
+        total = sum(size for _, size in files)
+        return len(files) > max(1, math.ceil(total / self.target_bytes))
+
+    def _read_group(self, group: str, files: list[tuple[str, int]]) -> pa.Table:
+        """
+        Lê os arquivos do grupo, repondo as colunas de partição que só existiam no caminho.
+
+        Arquivo num nível mais fundo que outro do grupo (ex: day=D ao lado de um
+        compactado do mês) foi gravado depois da compactação: as linhas dele
+        substituem as do período correspondente nos arquivos mais rasos.
+        """
+        tables = []
+        in_file = set()
+        for relative_path, _ in files:
+            table = self.storage.read(relative_path)
+            parts = _partition_parts(relative_path)
+            for name, value in parts:
+                if name in table.column_names:
+                    in_file.add(name)
+                else:
+                    table = table.append_column(name, pa.array([value] * table.num_rows, pa.int64()))
+            tables.append((len(parts), table))
+
+        newer = {}
+        for depth, table in tables:
+            if table.num_rows:
+                newer.setdefault(depth, set()).update(np.unique(_partition_key(table, depth)).tolist())
+        kept = []
+        for depth, table in tables:
+            stale = np.zeros(table.num_rows, dtype=bool)
+            for deeper, keys in newer.items():
+                if deeper > depth:
+                    stale |= np.isin(_partition_key(table, deeper), list(keys))
+            kept.append(table.filter(pa.array(~stale)))
+
+        table = pa.concat_tables(kept, promote_options='permissive')
+
+        # Níveis até o do grupo ficam no caminho; só os mantém no arquivo se já estavam lá
+        redundant = [name for name in PARTITION_LEVELS[:self.depth] if name not in in_file]
+        table = table.drop_columns([name for name in redundant if name in table.column_names])
+
+        sort_keys = [name for name in (*PARTITION_LEVELS[self.depth:], *SORT_COLUMNS)
+                     if name in table.column_names]
+        return table.sort_by([(name, 'ascending') for name in sort_keys])
+
+    def _serialize(self, table: pa.Table) -> list[bytes]:
+        """Divide a tabela em arquivos de aproximadamente `target_bytes`"""
+        def _write(part: pa.Table) -> bytes:
+            sink = pa.BufferOutputStream()
+            pq.write_table(part, sink, compression=self.compression)
+            return sink.getvalue().to_pybytes()
+
+        whole = _write(table)
+        n_files = max(1, math.ceil(len(whole) / self.target_bytes))
+        if n_files == 1:
+            return [whole]
+
+        rows_per_file = math.ceil(table.num_rows / n_files)
+        return [_write(table.slice(start, rows_per_file))
+                for start in range(0, table.num_rows, rows_per_file)]
+
+    def compact_group(self, group: str, files: list[tuple[str, int]], run_id: str) -> dict:
+        table = self._read_group(group, files)
+        bodies = self._serialize(table)
+
+        written_rows = sum(pq.read_metadata(BytesIO(body)).num_rows for body in bodies)
+        if written_rows != table.num_rows:
+            raise RuntimeError(f"Contagem divergente em {group}: {written_rows} != {table.num_rows}")
+
+        outputs = [(f"{COMPACTED_PREFIX}{run_id}-{i:05d}.parquet", body)
+                   for i, body in enumerate(bodies)]
+        if not self.dry_run:
+            self.storage.replace(group, outputs, [path for path, _ in files], run_id)
+
+        return {
+            'files_in': len(files),
+            'files_out': len(outputs),
+            'bytes_in': sum(size for _, size in files),
+            'bytes_out': sum(len(body) for body in bodies),
+            'rows': table.num_rows,
+        }
+
+    def run(self) -> dict:
+        run_id = f"{datetime.now():%Y%m%d%H%M%S}-{uuid.uuid4().hex[:8]}"
+        totals = {'groups': 0, 'failed': 0, 'files_in': 0, 'files_out': 0,
+                  'bytes_in': 0, 'bytes_out': 0, 'rows': 0}
+
+        for group, files in sorted(self.plan().items()):
+            try:
+                result = self.compact_group(group, files, run_id)
+            except (pa.ArrowInvalid, pa.ArrowTypeError) as e:
+                logger.error(f"❌ Schemas incompatíveis em {self.storage.describe(group)}: {e}")
+                totals['failed'] += 1
+                continue
+
+            prefix = "[dry-run] " if self.dry_run else ""
+            logger.info(
+                f"{prefix}{self.storage.describe(group)}: {result['files_in']} → {result['files_out']} "
+                f"arquivos, {result['rows']} linhas, "
+                f"{result['bytes_in'] / 1024:.1f} KB → {result['bytes_out'] / 1024:.1f} KB"
+            )
+            totals['groups'] += 1
+            for key in ('files_in', 'files_out', 'bytes_in', 'bytes_out', 'rows'):
+                totals[key] += result[key]
+
+        return totals
+
+
+def storage_for(root: str, s3_client=None):
+    """s3://bucket/prefix → S3PartitionStorage; caminho local → LocalPartitionStorage"""
+    check_raw_root(root)
+    if root.startswith('s3://'):
+        bucket, _, prefix = root[len('s3://'):].partition('/')
+        return S3PartitionStorage(bucket, prefix, s3_client=s3_client)
+    return LocalPartitionStorage(root)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Compacta partições diárias pequenas do raw/')
+    parser.add_argument('--root', required=True,
+                        help='Raiz local ou s3://bucket/prefixo (ex: s3://bucket/raw/dataset=petr4)')
+    parser.add_argument('--level', choices=['month', 'year'], default='month',
+                        help='Granularidade dos arquivos compactados')
+    parser.add_argument('--target-mb', type=int, default=128, help='Tamanho-alvo por arquivo')
+    parser.add_argument('--min-age-days', type=int, default=3,
+                        help='Dias após o fim do mês/ano antes de compactá-lo')
+    parser.add_argument('--dry-run', action='store_true', help='Só mostra o que seria compactado')
+
+    args = parser.parse_args()
+
+    compactor = PartitionCompactor(
+        storage_for(args.root),
+        level=args.level,
+        target_bytes=args.target_mb * 1024 * 1024,
+        min_age_days=args.min_age_days,
+        dry_run=args.dry_run,
+    )
+    totals = compactor.run()
+
+    logger.info(
+        f"✅ Compactação concluída: {totals['groups']} partições, "
+        f"{totals['files_in']} → {totals['files_out']} arquivos"
+        + (f", {totals['failed']} com erro" if totals['failed'] else "")
+    )
+    if totals['failed']:
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
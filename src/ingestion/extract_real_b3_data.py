@@ -9,47 +9,261 @@ import argparse
 from datetime import datetime, timedelta
 from pathlib import Path
 import sys
-import time
+import threading
+from concurrent.futures import ThreadPoolExecutor, as_completed
 
 import pandas as pd
 import requests
-from tenacity import retry, stop_after_attempt, wait_exponential
+from requests.adapters import HTTPAdapter
+from tenacity import (retry, retry_if_exception, retry_if_not_exception_type, stop_after_attempt,
+                      stop_when_event_set, wait_exponential)
 import pyarrow as pa
-import pyarrow.parquet as pq
-import boto3
+import pyarrow.compute as pc
 from botocore.exceptions import ClientError
 
+# Permitir execução direta do script (python src/ingestion/extract_real_b3_data.py)
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from ingestion.arrow_utils import partition_slices, to_arrow
+from ingestion.http_cache import DEFAULT_TODAY_TTL, HTTPResponseCache, ttl_for_period
+from ingestion.parquet_sink import PartitionedParquetSink
+from ingestion.raw_schema import conform_raw
+from ingestion.rate_limit import RateLimitExceeded, TokenBucketRateLimiter, parse_rate_limit_spec
+from ingestion.resilience import CircuitBreaker, CircuitOpenError, build_breakers, hedged_call
+from ingestion.s3_uploader import ParallelS3Uploader
+from ingestion.watermark import LocalWatermarkStore, S3WatermarkStore, next_start_date
+
 logging.basicConfig(
     level=logging.INFO,
     format='%(asctime)s - %(name)s - %(levelname)s - %(message)s'
 )
 logger = logging.getLogger(__name__)
 
+BRAPI_QUOTE_URL = "https://brapi.dev/api/quote/{symbols}"
+
+# Campos de `historicalDataPrice` usados (decodificados já tipados)
+BRAPI_PAYLOAD_SCHEMA = pa.schema([
+    ('date', pa.int64()),
+    ('open', pa.float64()),
+    ('high', pa.float64()),
+    ('low', pa.float64()),
+    ('close', pa.float64()),
+    ('volume', pa.int64()),
+])
+
+EMPTY_TABLE = pa.table({})
+
+# Circuit breakers por fonte, compartilhados por todos os tickers do processo
+SOURCE_BREAKERS = build_breakers(['brapi', 'yahoo'])
+
+DEFAULT_HEADERS = {
+    'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36',
+    'Accept': 'application/json'
+}
+
+
+def build_shared_session(pool_size: int = 10) -> requests.Session:
+    """
+    Cria uma Session com pool de conexões dimensionado para uso concorrente.
+    
+    Uma única Session é compartilhada por todos os extratores de um lote,
+    reaproveitando conexões TCP/TLS com brapi.dev e Yahoo.
+    """
+    session = requests.Session()
+    adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size)
+    session.mount('https://', adapter)
+    session.mount('http://', adapter)
+    session.headers.update(DEFAULT_HEADERS)
+    return session
+
+
+def brapi_range_for(start_date: str, end_date: str) -> str:
+    """
+    Menor `range` da BRAPI que cobre o período solicitado.
+    O range da BRAPI é contado a partir de hoje, então o período vai de
+    start_date até hoje (ou end_date, se futuro).
+    """
+    until = max(pd.Timestamp(end_date), pd.Timestamp(datetime.now().date()))
+    days_diff = (until - pd.Timestamp(start_date)).days
+    if days_diff <= 5:
+        return '5d'
+    elif days_diff <= 30:
+        return '1mo'
+    elif days_diff <= 90:
+        return '3mo'
+    elif days_diff <= 180:
+        return '6mo'
+    return '1y'
+
+
+def brapi_covers(start_date: str) -> bool:
+    """True se o maior range usado da BRAPI ('1y', contado de hoje) alcança start_date"""
+    return pd.Timestamp(start_date) >= pd.Timestamp(datetime.now().date()) - pd.Timedelta(days=365)
+
+
+def cached_get_json(session: requests.Session, url: str, params: dict, cache: HTTPResponseCache = None,
+                    ttl: float | None = DEFAULT_TODAY_TTL, headers: dict = None,
+                    limiter: TokenBucketRateLimiter = None):
+    """
+    GET JSON passando pelo cache em disco (se configurado); só respostas 2xx são gravadas.
+    Hits do cache não consomem orçamento do rate limiter.
+    """
+    if cache is not None:
+        cached = cache.get(url, params)
+        if cached is not None:
+            logger.info(f"Cache hit: {url}")
+            return cached
+    
+    if limiter is not None:
+        limiter.acquire()
+    
+    response = session.get(url, params=params, headers=headers, timeout=30)
+    response.raise_for_status()
+    data = response.json()
+    
+    if cache is not None:
+        cache.set(url, params, data, ttl)
+    return data
+
+
+def _is_client_error(exc: BaseException) -> bool:
+    """HTTP 4xx não melhora com retry (ex: símbolo inválido dentro do lote)"""
+    response = getattr(exc, 'response', None)
+    return response is not None and 400 <= response.status_code < 500 and response.status_code != 429
+
+
+@retry(stop=stop_after_attempt(3), wait=wait_exponential(multiplier=1, min=2, max=10),
+       retry=retry_if_exception(lambda e: not _is_client_error(e) and not isinstance(e, RateLimitExceeded)),
+       reraise=True)
+def _request_brapi_batch(session: requests.Session, symbols: list[str], range_period: str,
+                         cache: HTTPResponseCache = None, limiter: TokenBucketRateLimiter = None) -> list[dict]:
+    url = BRAPI_QUOTE_URL.format(symbols=','.join(symbols))
+    params = {
+        'range': range_period,
+        'interval': '1d',
+        'fundamental': 'false'
+    }
+    
+    logger.info(f"Requisição: {url} (range={range_period}, {len(symbols)} símbolos)")
+    
+    data = cached_get_json(session, url, params, cache=cache, ttl=DEFAULT_TODAY_TTL, limiter=limiter)
+    return data.get('results') or []
+
+
+def fetch_brapi_batch(tickers: list[str], range_period: str, session: requests.Session,
+                      batch_size: int = 10, max_workers: int = 1,
+                      cache: HTTPResponseCache = None,
+                      limiter: TokenBucketRateLimiter = None) -> dict[str, pa.Table]:
+    """
+    Busca vários tickers na BRAPI com uma requisição por lote (símbolos separados por vírgula).
+    
+    `results` é separado de volta em uma tabela Arrow por ticker. Falhas parciais:
+    - símbolo ausente ou sem `historicalDataPrice` no lote: fica fora do retorno
+    - erro HTTP do lote inteiro: o lote é dividido ao meio e reenviado, isolando
+      o símbolo problemático sem perder os demais
+    
+    Returns:
+        Dict ticker -> pa.Table (mesmo formato de `_fetch_brapi_dev`)
+    """
+    frames: dict[str, pa.Table] = {}
+    
+    def _fetch(symbols: list[str]):
+        try:
+            results = _request_brapi_batch(session, symbols, range_period, cache=cache, limiter=limiter)
+        except RateLimitExceeded as e:
+            logger.warning(f"❌ BRAPI.DEV: {e}")
+            return
+        except Exception as e:
+            if len(symbols) == 1:
+                logger.warning(f"❌ BRAPI.DEV falhou para {symbols[0]}: {e}")
+                return
+            middle = len(symbols) // 2
+            logger.warning(f"Lote de {len(symbols)} símbolos falhou ({e}); dividindo")
+            _fetch(symbols[:middle])
+            _fetch(symbols[middle:])
+            return
+        
+        for stock_data in results:
+            symbol = str(stock_data.get('symbol', '')).replace(".SA", "").upper()
+            if symbol not in symbols:
+                continue
+            try:
+                frames[symbol] = RealB3DataExtractor._parse_brapi_result(stock_data)
+            except ValueError as e:
+                logger.warning(f"❌ BRAPI.DEV sem histórico para {symbol}: {e}")
+    
+    batches = [tickers[i:i + batch_size] for i in range(0, len(tickers), batch_size)]
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        list(executor.map(_fetch, batches))
+    
+    missing = [t for t in tickers if t not in frames]
+    logger.info(f"✅ BRAPI.DEV (lote): {len(frames)}/{len(tickers)} tickers obtidos")
+    if missing:
+        logger.warning(f"Sem dados no lote BRAPI: {', '.join(missing)}")
+    
+    return frames
+
 
 class RealB3DataExtractor:
     """Extrator de dados REAIS da B3 usando APIs gratuitas brasileiras"""
     
-    def __init__(self, ticker: str = "PETR4", dataset_name: str = "petr4"):
+    def __init__(self, ticker: str = "PETR4", dataset_name: str = "petr4",
+                 session: requests.Session = None, cache: HTTPResponseCache = None,
+                 hedge_after: float = None, breakers: dict[str, CircuitBreaker] = None,
+                 rate_limiters: dict[str, TokenBucketRateLimiter] = None):
         # Normalizar ticker (remover .SA se tiver)
         self.ticker = ticker.replace(".SA", "").upper()
         self.dataset_name = dataset_name
         self.ticker_normalized = self.ticker.lower()
         
-        self.session = requests.Session()
-        self.session.headers.update({
-            'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36',
-            'Accept': 'application/json'
+        if session is None:
+            session = requests.Session()
+            session.headers.update(DEFAULT_HEADERS)
+        self.session = session
+        self.cache = cache
+        
+        # hedge_after=None: fontes em sequência; senão, Yahoo dispara após N segundos
+        self.hedge_after = hedge_after
+        # Breakers compartilhados entre extratores do mesmo processo (ver SOURCE_BREAKERS)
+        self.breakers = SOURCE_BREAKERS if breakers is None else breakers
+        # Rate limiters por fonte ('brapi', 'yahoo'), compartilhados entre threads
+        self.rate_limiters = rate_limiters or {}
+    
+    @staticmethod
+    def _parse_brapi_result(stock_data: dict) -> pa.Table:
+        """Decodifica um item de `results` da BRAPI direto em colunas Arrow tipadas"""
+        if 'historicalDataPrice' not in stock_data:
+            raise ValueError("Dados históricos não disponíveis")
+        
+        historical = stock_data['historicalDataPrice']
+        
+        if not historical:
+            raise ValueError("Lista de dados históricos vazia")
+        
+        # Decodificação tipada (campos extras do payload são ignorados)
+        raw = pa.Table.from_pylist(historical, schema=BRAPI_PAYLOAD_SCHEMA)
+        
+        return pa.table({
+            'Date': raw['date'].cast(pa.timestamp('s')),
+            'Open': raw['open'],
+            'High': raw['high'],
+            'Low': raw['low'],
+            'Close': raw['close'],
+            'Volume': raw['volume'],
+            # Adj Close igual Close para simplificar
+            'Adj Close': raw['close'],
         })
     
-    @retry(stop=stop_after_attempt(3), wait=wait_exponential(multiplier=1, min=2, max=10))
-    def _fetch_brapi_dev(self, range_period: str = "3mo") -> pd.DataFrame:
+    @retry(stop=stop_after_attempt(3), wait=wait_exponential(multiplier=1, min=2, max=10),
+           retry=retry_if_not_exception_type(RateLimitExceeded))
+    def _fetch_brapi_dev(self, range_period: str = "3mo") -> pa.Table:
         """
         API BRAPI.DEV - API gratuita brasileira para dados da B3
         Documentação: https://brapi.dev/docs
         """
         logger.info("🇧🇷 Estratégia 1: BRAPI.DEV (API Brasileira Gratuita)")
         
-        url = f"https://brapi.dev/api/quote/{self.ticker}"
+        url = BRAPI_QUOTE_URL.format(symbols=self.ticker)
         params = {
             'range': range_period,  # 1d, 5d, 1mo, 3mo, 6mo, 1y, 2y, 5y, 10y, ytd, max
             'interval': '1d',
@@ -58,49 +272,21 @@ class RealB3DataExtractor:
         
         logger.info(f"Requisição: {url} (range={range_period})")
         
-        response = self.session.get(url, params=params, timeout=30)
-        response.raise_for_status()
-        
-        data = response.json()
+        # Range da BRAPI sempre inclui o dia corrente → TTL curto
+        data = cached_get_json(self.session, url, params, cache=self.cache, ttl=DEFAULT_TODAY_TTL,
+                               limiter=self.rate_limiters.get('brapi'))
         
         if 'results' not in data or not data['results']:
             raise ValueError("Resposta vazia da API")
         
-        stock_data = data['results'][0]
-        
-        if 'historicalDataPrice' not in stock_data:
-            raise ValueError("Dados históricos não disponíveis")
-        
-        historical = stock_data['historicalDataPrice']
-        
-        if not historical:
-            raise ValueError("Lista de dados históricos vazia")
-        
-        # Converter para DataFrame
-        df = pd.DataFrame(historical)
-        
-        # Renomear colunas para padrão
-        df = df.rename(columns={
-            'date': 'Date',
-            'open': 'Open',
-            'high': 'High',
-            'low': 'Low',
-            'close': 'Close',
-            'volume': 'Volume'
-        })
+        table = self._parse_brapi_result(data['results'][0])
         
-        # Converter timestamp para datetime
-        df['Date'] = pd.to_datetime(df['Date'], unit='s')
+        logger.info(f"✅ BRAPI.DEV: {table.num_rows} registros obtidos")
         
-        # Adicionar Adj Close (igual Close para simplificar)
-        df['Adj Close'] = df['Close']
-        
-        logger.info(f"✅ BRAPI.DEV: {len(df)} registros obtidos")
-        
-        return df
+        return table
     
     @retry(stop=stop_after_attempt(3), wait=wait_exponential(multiplier=1, min=2, max=10))
-    def _fetch_hgbrasil_finance(self) -> pd.DataFrame:
+    def _fetch_hgbrasil_finance(self) -> pa.Table:
         """
         API HG Brasil Finance - Dados financeiros brasileiros
         Documentação: https://hgbrasil.com/status/finance
@@ -129,8 +315,9 @@ class RealB3DataExtractor:
         # Precisaríamos de chamadas múltiplas ou upgrade para versão paga
         raise ValueError("API HG Brasil não retorna histórico na versão gratuita")
     
-    @retry(stop=stop_after_attempt(3), wait=wait_exponential(multiplier=1, min=2, max=10))
-    def _fetch_yahoo_query_api(self, start_date: str, end_date: str) -> pd.DataFrame:
+    @retry(stop=stop_after_attempt(3), wait=wait_exponential(multiplier=1, min=2, max=10),
+           retry=retry_if_not_exception_type(RateLimitExceeded))
+    def _fetch_yahoo_query_api(self, start_date: str, end_date: str) -> pa.Table:
         """
         Yahoo Finance Query API v8 (alternativa)
         """
@@ -139,7 +326,8 @@ class RealB3DataExtractor:
         ticker_yf = f"{self.ticker}.SA"
         
         start_ts = int(pd.Timestamp(start_date).timestamp())
-        end_ts = int(pd.Timestamp(end_date).timestamp())
+        # period2 é exclusivo: meia-noite do dia seguinte inclui a barra de end_date
+        end_ts = int((pd.Timestamp(end_date) + pd.Timedelta(days=1)).timestamp())
         
         url = f"https://query2.finance.yahoo.com/v8/finance/chart/{ticker_yf}"
         params = {
@@ -157,86 +345,93 @@ class RealB3DataExtractor:
         
         logger.info(f"Requisição: {url}")
         
-        response = self.session.get(url, params=params, headers=headers, timeout=30)
-        response.raise_for_status()
-        
-        data = response.json()
+        # Período só com pregões encerrados nunca expira; se inclui hoje, TTL curto
+        data = cached_get_json(self.session, url, params, cache=self.cache,
+                               ttl=ttl_for_period(end_ts - 1), headers=headers,
+                               limiter=self.rate_limiters.get('yahoo'))
         
         if 'chart' not in data or 'result' not in data['chart']:
             raise ValueError("Formato de resposta inválido")
         
         result = data['chart']['result'][0]
         
-        timestamps = result['timestamp']
-        quotes = result['indicators']['quote'][0]
+        indicators = result['indicators']
+        quotes = indicators['quote'][0]
+        close = pa.array(quotes['close'], pa.float64())
         
-        df = pd.DataFrame({
-            'Date': pd.to_datetime(timestamps, unit='s'),
-            'Open': quotes['open'],
-            'High': quotes['high'],
-            'Low': quotes['low'],
-            'Close': quotes['close'],
-            'Volume': quotes['volume']
+        if 'adjclose' in indicators:
+            adj_close = pa.array(indicators['adjclose'][0]['adjclose'], pa.float64())
+        else:
+            adj_close = close
+        
+        table = pa.table({
+            'Date': pa.array(result['timestamp'], pa.int64()).cast(pa.timestamp('s')),
+            'Open': pa.array(quotes['open'], pa.float64()),
+            'High': pa.array(quotes['high'], pa.float64()),
+            'Low': pa.array(quotes['low'], pa.float64()),
+            'Close': close,
+            'Volume': pa.array(quotes['volume'], pa.int64()),
+            'Adj Close': adj_close,
         })
         
-        # Remover NaN
-        df = df.dropna()
-        
-        # Adicionar Adj Close
-        if 'adjclose' in result['indicators']:
-            df['Adj Close'] = result['indicators']['adjclose'][0]['adjclose']
-        else:
-            df['Adj Close'] = df['Close']
+        # Remover pregões sem cotação (nulos em qualquer coluna OHLCV)
+        table = table.drop_null()
         
-        logger.info(f"✅ Yahoo Query API: {len(df)} registros obtidos")
+        logger.info(f"✅ Yahoo Query API: {table.num_rows} registros obtidos")
         
-        return df
+        return table
     
     def extract_data(self, start_date: str, end_date: str) -> pd.DataFrame:
         """
-        Extrai dados reais com múltiplas estratégias de fallback
+        Extrai dados reais com múltiplas estratégias de fallback (como DataFrame)
+        """
+        return self.extract_table(start_date=start_date, end_date=end_date).to_pandas()
+    
+    def extract_table(self, start_date: str, end_date: str) -> pa.Table:
+        """
+        Extrai dados reais com múltiplas estratégias de fallback.
+        
+        O payload JSON é decodificado direto em colunas Arrow e segue colunar
+        até o Parquet (sem DataFrame intermediário).
         """
         logger.info(f"Extraindo dados REAIS de {self.ticker} ({start_date} até {end_date})")
         
-        df = pd.DataFrame()
+        table = EMPTY_TABLE
         
         # Calcular range para BRAPI
-        days_diff = (pd.Timestamp(end_date) - pd.Timestamp(start_date)).days
-        if days_diff <= 5:
-            range_period = '5d'
-        elif days_diff <= 30:
-            range_period = '1mo'
-        elif days_diff <= 90:
-            range_period = '3mo'
-        elif days_diff <= 180:
-            range_period = '6mo'
-        else:
-            range_period = '1y'
+        range_period = brapi_range_for(start_date, end_date)
         
         strategies = [
-            ("BRAPI.DEV (API BR Gratuita)", lambda: self._fetch_brapi_dev(range_period)),
-            ("Yahoo Query API v8", lambda: self._fetch_yahoo_query_api(start_date, end_date)),
+            ("BRAPI.DEV (API BR Gratuita)", 'brapi',
+             lambda cancel: self._call_with_retry('_fetch_brapi_dev', cancel, range_period)),
+            ("Yahoo Query API v8", 'yahoo',
+             lambda cancel: self._call_with_retry('_fetch_yahoo_query_api', cancel, start_date, end_date)),
         ]
+        # Períodos anteriores ao range máximo da BRAPI (backfill histórico): só o Yahoo cobre
+        if not brapi_covers(start_date):
+            strategies = strategies[1:]
         
-        for strategy_name, strategy_func in strategies:
-            try:
-                logger.info(f"\n{'='*70}")
-                logger.info(f"Tentando: {strategy_name}")
-                logger.info(f"{'='*70}")
-                
-                df = strategy_func()
-                
-                if not df.empty:
-                    logger.info(f"✅ SUCESSO com {strategy_name}")
-                    logger.info(f"   {len(df)} registros extraídos")
-                    break
+        if self.hedge_after is not None and len(strategies) > 1:
+            table = self._extract_hedged(strategies)
+        else:
+            for strategy_name, source, strategy_func in strategies:
+                try:
+                    logger.info(f"\n{'='*70}")
+                    logger.info(f"Tentando: {strategy_name}")
+                    logger.info(f"{'='*70}")
                     
-            except Exception as e:
-                logger.warning(f"❌ {strategy_name} falhou: {str(e)}")
-                time.sleep(2)  # Delay entre tentativas
-                continue
-        
-        if df.empty:
+                    table = self._run_source(source, strategy_func)
+                    
+                    if table.num_rows > 0:
+                        logger.info(f"✅ SUCESSO com {strategy_name}")
+                        logger.info(f"   {table.num_rows} registros extraídos")
+                        break
+                        
+                except Exception as e:
+                    logger.warning(f"❌ {strategy_name} falhou: {str(e)}")
+                    continue
+        
+        if table.num_rows == 0:
             logger.error("\n" + "="*70)
             logger.error("❌ TODAS AS ESTRATÉGIAS DE EXTRAÇÃO FALHARAM")
             logger.error("="*70)
@@ -246,92 +441,340 @@ class RealB3DataExtractor:
             logger.error("3. Use VPN se estiver com bloqueio regional")
             logger.error("4. Considere APIs pagas: Alpha Vantage, IEX Cloud, Polygon.io")
             logger.error(f"5. Baixe CSV manualmente: https://br.investing.com/equities/petrobras-pn-historical-data")
-            return df
+            return table
         
-        # Filtrar por período solicitado
-        df = df[
-            (df['Date'] >= pd.Timestamp(start_date)) & 
-            (df['Date'] <= pd.Timestamp(end_date))
-        ]
+        return self._finalize(table, start_date, end_date)
+    
+    def _call_with_retry(self, method_name: str, cancel: threading.Event, *args) -> pa.Table:
+        """
+        Chama uma estratégia decorada com @retry; com `cancel`, os retries e as
+        esperas do backoff são interrompidos assim que o evento é sinalizado.
+        """
+        method = getattr(type(self), method_name)
+        if cancel is None:
+            return method(self, *args)
+        return method.retry_with(
+            stop=stop_after_attempt(3) | stop_when_event_set(cancel),
+            sleep=cancel.wait
+        )(self, *args)
+    
+    def _run_source(self, source: str, func, cancel: threading.Event = None) -> pa.Table:
+        """Executa a estratégia respeitando o circuit breaker da fonte"""
+        breaker = self.breakers.get(source)
+        if breaker is not None and not breaker.allow():
+            raise CircuitOpenError(f"fonte {source} em resfriamento (circuit breaker aberto)")
+        
+        try:
+            table = func(cancel)
+        except Exception:
+            # Cancelamento pelo hedge não conta como falha da fonte, mas libera a
+            # chamada de teste do half-open (senão a fonte ficaria bloqueada)
+            if breaker is not None:
+                if cancel is not None and cancel.is_set():
+                    breaker.abort_trial()
+                else:
+                    breaker.record_failure()
+            raise
+        
+        if breaker is not None:
+            breaker.record_success()
+        return table
+    
+    def _extract_hedged(self, strategies: list) -> pa.Table:
+        """Primária e secundária em corrida: a secundária parte após `hedge_after` segundos"""
+        (primary_name, primary_source, primary_func), (secondary_name, secondary_source, secondary_func) = strategies
+        names = [primary_name, secondary_name]
+        
+        try:
+            winner, table = hedged_call(
+                lambda cancel: self._run_source(primary_source, primary_func, cancel),
+                lambda cancel: self._run_source(secondary_source, secondary_func, cancel),
+                hedge_after=self.hedge_after,
+                is_valid=lambda t: t.num_rows > 0
+            )
+        except Exception as e:
+            logger.warning(f"❌ Hedge {' / '.join(names)} falhou: {e}")
+            return EMPTY_TABLE
+        
+        logger.info(f"✅ SUCESSO com {names[winner]} (hedge)")
+        logger.info(f"   {table.num_rows} registros extraídos")
+        return table
+    
+    def extract_incremental(self, start_date: str, end_date: str, watermarks) -> pa.Table:
+        """
+        Extrai apenas as datas a partir do watermark de (dataset, ticker)
+        (o dia do watermark é rebuscado: pode ter sido gravado com o pregão em formação).
+        
+        Args:
+            watermarks: LocalWatermarkStore ou S3WatermarkStore
+        
+        Returns:
+            Tabela só com as datas que faltam (vazia se já estiver em dia)
+        """
+        last = watermarks.last_date(self.dataset_name, self.ticker_normalized)
+        effective_start = next_start_date(start_date, last)
+        
+        if effective_start > end_date:
+            logger.info(f"✅ {self.ticker} já atualizado até {last}; nada a extrair")
+            return EMPTY_TABLE
+        
+        if last is not None:
+            logger.info(f"Watermark de {self.ticker}: {last} → extraindo a partir de {effective_start}")
+        
+        return self.extract_table(start_date=effective_start, end_date=end_date)
+    
+    def _finalize(self, table: pa.Table, start_date: str, end_date: str) -> pa.Table:
+        """
+        Filtra o período e adiciona metadados e colunas de particionamento.
+        Filtro e partições são calculados uma única vez com kernels vetorizados.
+        """
+        # Filtrar por período solicitado (end_date inclusivo: barras têm horário)
+        dates = table['Date']
+        start = pa.scalar(pd.Timestamp(start_date).to_pydatetime(), dates.type)
+        end = pa.scalar((pd.Timestamp(end_date) + pd.Timedelta(days=1)).to_pydatetime(), dates.type)
+        table = table.filter(pc.and_(pc.greater_equal(dates, start), pc.less(dates, end)))
+        
+        # Ordenar por data (APIs já retornam em ordem; só reordena se preciso)
+        dates = table['Date']
+        if table.num_rows > 1 and not pc.all(pc.greater_equal(dates[1:], dates[:-1])).as_py():
+            table = table.sort_by('Date')
+            dates = table['Date']
         
-        # Ordenar por data
-        df = df.sort_values('Date').reset_index(drop=True)
+        n_rows = table.num_rows
+        day_dates = pc.cast(dates, pa.date32())
         
         # Adicionar metadados
-        df['ticker'] = self.ticker_normalized
-        df['dataset'] = self.dataset_name
-        df['extraction_timestamp'] = datetime.now().isoformat()
-        df['data_source'] = 'real_api_extraction'
+        table = table.append_column('ticker', pa.repeat(self.ticker_normalized, n_rows))
+        table = table.append_column('dataset', pa.repeat(self.dataset_name, n_rows))
+        table = table.append_column('extraction_timestamp', pa.repeat(datetime.now().isoformat(), n_rows))
+        table = table.append_column('data_source', pa.repeat('real_api_extraction', n_rows))
         
         # Colunas de particionamento
-        df['date'] = pd.to_datetime(df['Date']).dt.date
-        df['year'] = pd.to_datetime(df['Date']).dt.year
-        df['month'] = pd.to_datetime(df['Date']).dt.month
-        df['day'] = pd.to_datetime(df['Date']).dt.day
+        table = table.append_column('date', day_dates)
+        table = table.append_column('year', pc.year(day_dates))
+        table = table.append_column('month', pc.month(day_dates))
+        table = table.append_column('day', pc.day(day_dates))
         
         logger.info(f"\n{'='*70}")
         logger.info(f"✅ EXTRAÇÃO CONCLUÍDA COM SUCESSO")
         logger.info(f"{'='*70}")
-        logger.info(f"Total de registros: {len(df)}")
-        logger.info(f"Período: {df['date'].min()} até {df['date'].max()}")
+        logger.info(f"Total de registros: {n_rows}")
+        if n_rows:
+            logger.info(f"Período: {day_dates[0]} até {day_dates[-1]}")
         logger.info(f"Fonte: Dados REAIS da B3")
         
-        return df
+        return table
     
-    def save_local_parquet(self, df: pd.DataFrame, output_path: Path):
-        """Salva em Parquet particionado"""
+    def save_local_parquet(self, df, output_path: Path, sink: PartitionedParquetSink = None):
+        """
+        Salva em Parquet particionado (aceita pa.Table ou DataFrame).
+        Reexecuções deduplicam por (ticker, Date) contra o que já está em disco.
+        Com `sink`, apenas acrescenta ao sink aberto pelo chamador (streaming).
+        Os arquivos seguem o contrato do raw (ingestion.raw_schema).
+        """
         output_path = Path(output_path)
-        output_path.mkdir(parents=True, exist_ok=True)
         
-        table = pa.Table.from_pandas(df)
+        if sink is not None:
+            sink.write(conform_raw(to_arrow(df), keep=tuple(sink.partition_cols)))
+            return output_path
         
-        pq.write_to_dataset(
-            table,
-            root_path=str(output_path),
-            partition_cols=['year', 'month', 'day'],
-            existing_data_behavior='overwrite_or_ignore'
-        )
+        with PartitionedParquetSink(output_path) as own_sink:
+            own_sink.write(conform_raw(to_arrow(df), keep=tuple(own_sink.partition_cols)))
         
         logger.info(f"✅ Parquet salvo: {output_path}")
         return output_path
     
-    def upload_to_s3(self, df: pd.DataFrame, bucket: str, prefix: str = "raw"):
-        """Upload para S3"""
+    def upload_to_s3(self, df, bucket: str, prefix: str = "raw", max_workers: int = 16,
+                     skip_unchanged: bool = True):
+        """
+        Upload para S3 (dataset/ticker lidos das colunas, aceita lotes multi-ticker).
+        Partições enviadas em paralelo; as que não mudaram desde o último upload são puladas.
+        """
         logger.info(f"Upload para s3://{bucket}/{prefix}")
         
-        s3_client = boto3.client('s3')
+        table = to_arrow(df)
         
-        for date, group in df.groupby(['year', 'month', 'day']):
-            year, month, day = date
-            
-            s3_key = (
-                f"{prefix}/dataset={self.dataset_name}/ticker={self.ticker_normalized}/"
-                f"year={year}/month={month:02d}/day={day:02d}/data.parquet"
-            )
-            
-            table = pa.Table.from_pandas(group)
-            buffer = pa.BufferOutputStream()
-            pq.write_table(table, buffer)
-            
-            s3_client.put_object(
-                Bucket=bucket,
-                Key=s3_key,
-                Body=buffer.getvalue().to_pybytes()
-            )
+        def _partitions():
+            for keys, group in partition_slices(table, ['dataset', 'ticker', 'year', 'month', 'day']):
+                dataset, ticker, year, month, day = keys
+                
+                s3_key = (
+                    f"{prefix}/dataset={dataset}/ticker={ticker}/"
+                    f"year={year}/month={month:02d}/day={day:02d}/data.parquet"
+                )
+                yield s3_key, conform_raw(group)
+        
+        uploader = ParallelS3Uploader(bucket, max_workers=max_workers, skip_unchanged=skip_unchanged)
+        result = uploader.upload(_partitions())
         
         logger.info(f"✅ Upload S3 completo")
+        return result
+
+
+def parse_tickers(tickers_arg: str = None, tickers_file: str = None) -> list[str]:
+    """
+    Monta a lista de tickers a partir de --tickers (separados por vírgula)
+    e/ou --tickers-file (um por linha, aceita vírgulas e comentários com #).
+    Remove duplicados preservando a ordem.
+    """
+    raw: list[str] = []
+    if tickers_arg:
+        raw.extend(tickers_arg.split(','))
+    if tickers_file:
+        for line in Path(tickers_file).read_text(encoding='utf-8').splitlines():
+            line = line.split('#', 1)[0]
+            raw.extend(line.split(','))
+    
+    tickers: list[str] = []
+    for item in raw:
+        ticker = item.strip().replace(".SA", "").upper()
+        if ticker and ticker not in tickers:
+            tickers.append(ticker)
+    return tickers
+
+
+def extract_many(tickers: list[str], start_date: str, end_date: str,
+                 dataset_name: str = None, max_workers: int = 8,
+                 session: requests.Session = None, batch_size: int = 1,
+                 watermarks=None, cache: HTTPResponseCache = None,
+                 hedge_after: float = None,
+                 rate_limiters: dict[str, TokenBucketRateLimiter] = None) -> dict[str, pa.Table]:
+    """
+    Extrai vários tickers em paralelo com concorrência limitada (max_workers),
+    compartilhando uma única Session com pool de conexões.
+    
+    Args:
+        dataset_name: dataset comum a todos; se None usa o próprio ticker (ex: petr4)
+        batch_size: se > 1, busca a BRAPI em lotes de N símbolos por requisição;
+            tickers que falharem no lote ou com início fora do range da BRAPI
+            seguem pela cadeia normal de fallback
+        watermarks: se informado, cada ticker busca apenas as datas a partir do seu watermark
+        cache: cache HTTP em disco compartilhado por todos os extratores
+        hedge_after: limiar (s) para disparar a fonte secundária em paralelo
+        rate_limiters: orçamento por fonte compartilhado por todos os workers
+    
+    Returns:
+        Dict ticker -> pa.Table (apenas tickers com dados)
+    """
+    if session is None:
+        session = build_shared_session(pool_size=max_workers)
+    
+    def _extractor(ticker: str) -> RealB3DataExtractor:
+        return RealB3DataExtractor(
+            ticker=ticker,
+            dataset_name=dataset_name or ticker.lower(),
+            session=session,
+            cache=cache,
+            hedge_after=hedge_after,
+            rate_limiters=rate_limiters
+        )
+    
+    results: dict[str, pa.Table] = {}
+    failed: list[str] = []
+    
+    # Início efetivo por ticker (incremental: o próprio dia do watermark)
+    starts = {ticker: start_date for ticker in tickers}
+    if watermarks is not None:
+        for ticker in tickers:
+            last = watermarks.last_date(dataset_name or ticker.lower(), ticker.lower())
+            starts[ticker] = next_start_date(start_date, last)
+        up_to_date = [t for t in tickers if starts[t] > end_date]
+        if up_to_date:
+            logger.info(f"✅ Já atualizados (nada a extrair): {', '.join(up_to_date)}")
+        tickers = [t for t in tickers if starts[t] <= end_date]
+    
+    # Lote só para quem o range da BRAPI alcança; os demais (backfill) vão direto
+    # para a cadeia por ticker, que usa o Yahoo
+    batchable = [t for t in tickers if brapi_covers(starts[t])]
+    if batch_size > 1 and batchable:
+        batched = fetch_brapi_batch(
+            batchable,
+            range_period=brapi_range_for(min(starts[t] for t in batchable), end_date),
+            session=session,
+            batch_size=batch_size,
+            max_workers=max_workers,
+            cache=cache,
+            limiter=(rate_limiters or {}).get('brapi')
+        )
+        for ticker, table in batched.items():
+            table = _extractor(ticker)._finalize(table, starts[ticker], end_date)
+            if table.num_rows > 0:
+                results[ticker] = table
+        tickers = [t for t in tickers if t not in results]
+    
+    def _extract_one(ticker: str) -> pa.Table:
+        return _extractor(ticker).extract_table(start_date=starts[ticker], end_date=end_date)
+    
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        futures = {executor.submit(_extract_one, ticker): ticker for ticker in tickers}
+        for future in as_completed(futures):
+            ticker = futures[future]
+            try:
+                table = future.result()
+            except Exception as e:
+                logger.error(f"❌ {ticker}: erro inesperado na extração: {e}")
+                failed.append(ticker)
+                continue
+            if table.num_rows == 0:
+                failed.append(ticker)
+            else:
+                results[ticker] = table
+    
+    logger.info(f"✅ Lote concluído: {len(results)}/{len(results) + len(failed)} tickers com dados")
+    if failed:
+        logger.warning(f"Tickers sem dados: {', '.join(sorted(failed))}")
+    
+    return results
+
+
+def record_watermarks(watermarks, table: pa.Table):
+    """Atualiza o watermark de cada (dataset, ticker) com o último dia gravado"""
+    last_dates = table.group_by(['dataset', 'ticker']).aggregate([('date', 'max')])
+    for row in last_dates.to_pylist():
+        watermarks.update(row['dataset'], row['ticker'], row['date_max'])
+
+
+def log_run_stats(cache: HTTPResponseCache, rate_limiters: dict[str, TokenBucketRateLimiter]):
+    """Métricas de cache HTTP e de espera por rate limit ao final da execução"""
+    if cache is not None:
+        logger.info(f"Cache HTTP: {cache.stats()}")
+    for name, limiter in rate_limiters.items():
+        logger.info(f"Rate limit {name}: {limiter.stats()}")
 
 
 def main():
     parser = argparse.ArgumentParser(description='Extrator de dados REAIS da B3')
     parser.add_argument('--ticker', default='PETR4', help='Ticker (sem .SA)')
-    parser.add_argument('--dataset', default='petr4')
+    parser.add_argument('--tickers', help='Lista de tickers separados por vírgula (modo lote)')
+    parser.add_argument('--tickers-file', help='Arquivo com um ticker por linha (modo lote)')
+    parser.add_argument('--max-workers', type=int, default=8,
+                        help='Concorrência máxima no modo lote')
+    parser.add_argument('--batch-size', type=int, default=1,
+                        help='Símbolos por requisição BRAPI no modo lote (1 = uma requisição por ticker)')
+    parser.add_argument('--dataset', help='Dataset (padrão: petr4; no modo lote, o próprio ticker)')
+    parser.add_argument('--incremental', action='store_true',
+                        help='Busca apenas as datas a partir do último dia já gravado (watermark)')
+    parser.add_argument('--cache-dir', help='Diretório do cache HTTP em disco (desativado se omitido)')
+    parser.add_argument('--cache-max-mb', type=int, default=256, help='Tamanho máximo do cache HTTP')
+    parser.add_argument('--hedge-after', type=float,
+                        help='Segundos até disparar a fonte secundária em paralelo (desativado se omitido)')
+    parser.add_argument('--breaker-failures', type=int, default=3,
+                        help='Falhas seguidas para abrir o circuit breaker de uma fonte')
+    parser.add_argument('--breaker-cooldown', type=float, default=300,
+                        help='Segundos de resfriamento de uma fonte com circuit breaker aberto')
+    parser.add_argument('--rate-limit', action='append', default=[],
+                        help="Orçamento por fonte, ex: brapi:rps=2,burst=5,daily=15000 (repetível)")
+    parser.add_argument('--rate-limit-state',
+                        help='Arquivo JSON de estado do rate limit compartilhado entre execuções')
     parser.add_argument('--days', type=int, default=90)
     parser.add_argument('--start-date', help='YYYY-MM-DD')
     parser.add_argument('--end-date', help='YYYY-MM-DD')
     parser.add_argument('--output-dir', default='local_data/raw')
     parser.add_argument('--s3-bucket')
     parser.add_argument('--s3-prefix', default='raw')
+    parser.add_argument('--upload-workers', type=int, default=16, help='Uploads S3 simultâneos')
+    parser.add_argument('--force-upload', action='store_true',
+                        help='Reenvia partições mesmo sem alteração de conteúdo')
     
     args = parser.parse_args()
     
@@ -342,25 +785,113 @@ def main():
         end_date = datetime.now().strftime('%Y-%m-%d')
         start_date = (datetime.now() - timedelta(days=args.days)).strftime('%Y-%m-%d')
     
+    watermarks = None
+    if args.incremental:
+        if args.s3_bucket:
+            watermarks = S3WatermarkStore(bucket=args.s3_bucket, prefix=args.s3_prefix)
+        else:
+            watermarks = LocalWatermarkStore(Path(args.output_dir))
+    
+    for breaker in SOURCE_BREAKERS.values():
+        breaker.failure_threshold = args.breaker_failures
+        breaker.cooldown_seconds = args.breaker_cooldown
+    
+    rate_limiters = {}
+    for spec in args.rate_limit:
+        limiter = parse_rate_limit_spec(spec, state_path=args.rate_limit_state)
+        rate_limiters[limiter.name] = limiter
+    
+    cache = None
+    if args.cache_dir:
+        cache = HTTPResponseCache(Path(args.cache_dir), max_bytes=args.cache_max_mb * 1024 * 1024)
+    
+    if args.tickers or args.tickers_file:
+        tickers = parse_tickers(args.tickers, args.tickers_file)
+        if not tickers:
+            logger.error("Nenhum ticker informado em --tickers/--tickers-file")
+            sys.exit(1)
+        
+        logger.info("\n" + "="*70)
+        logger.info("EXTRATOR DE DADOS REAIS DA B3 - MODO LOTE")
+        logger.info(f"Tickers: {len(tickers)} (concorrência: {args.max_workers})")
+        logger.info(f"Período: {start_date} até {end_date}")
+        logger.info("="*70 + "\n")
+        
+        session = build_shared_session(pool_size=args.max_workers)
+        frames = extract_many(
+            tickers,
+            start_date=start_date,
+            end_date=end_date,
+            dataset_name=args.dataset,
+            max_workers=args.max_workers,
+            session=session,
+            batch_size=args.batch_size,
+            watermarks=watermarks,
+            cache=cache,
+            hedge_after=args.hedge_after,
+            rate_limiters=rate_limiters
+        )
+        log_run_stats(cache, rate_limiters)
+        
+        if not frames:
+            if watermarks is not None:
+                logger.info("Nenhum dado novo para gravar")
+                return
+            sys.exit(1)
+        
+        writer = RealB3DataExtractor(session=session)
+        if args.s3_bucket:
+            # Upload único para todo o lote
+            table = pa.concat_tables(frames.values())
+            writer.upload_to_s3(df=table, bucket=args.s3_bucket, prefix=args.s3_prefix,
+                             max_workers=args.upload_workers, skip_unchanged=not args.force_upload)
+            if watermarks is not None:
+                record_watermarks(watermarks, table)
+        else:
+            # Um sink para o lote: ticker a ticker, sem concatenar o lote inteiro
+            with PartitionedParquetSink(Path(args.output_dir)) as sink:
+                for table in frames.values():
+                    writer.save_local_parquet(df=table, output_path=Path(args.output_dir), sink=sink)
+            if watermarks is not None:
+                for table in frames.values():
+                    record_watermarks(watermarks, table)
+        return
+    
     logger.info("\n" + "="*70)
     logger.info("EXTRATOR DE DADOS REAIS DA B3")
     logger.info(f"Ticker: {args.ticker}")
     logger.info(f"Período: {start_date} até {end_date}")
     logger.info("="*70 + "\n")
     
-    extractor = RealB3DataExtractor(ticker=args.ticker, dataset_name=args.dataset)
-    df = extractor.extract_data(start_date=start_date, end_date=end_date)
+    extractor = RealB3DataExtractor(ticker=args.ticker, dataset_name=args.dataset or 'petr4',
+                                    cache=cache, hedge_after=args.hedge_after,
+                                    rate_limiters=rate_limiters)
+    if watermarks is not None:
+        last = watermarks.last_date(extractor.dataset_name, extractor.ticker_normalized)
+        if next_start_date(start_date, last) > end_date:
+            logger.info(f"✅ {extractor.ticker} já atualizado até {last}; nada a extrair")
+            return
+        table = extractor.extract_incremental(start_date=start_date, end_date=end_date, watermarks=watermarks)
+    else:
+        table = extractor.extract_table(start_date=start_date, end_date=end_date)
+    
+    log_run_stats(cache, rate_limiters)
     
-    if df.empty:
+    if table.num_rows == 0:
         sys.exit(1)
     
-    print(f"\n{df.head(10)}\n")
-    print(f"Estatísticas:\n{df[['Open', 'High', 'Low', 'Close', 'Volume']].describe()}\n")
+    # Conversão para pandas apenas para exibição
+    print(f"\n{table.slice(0, 10).to_pandas()}\n")
+    stats = table.select(['Open', 'High', 'Low', 'Close', 'Volume']).to_pandas().describe()
+    print(f"Estatísticas:\n{stats}\n")
     
     if args.s3_bucket:
-        extractor.upload_to_s3(df=df, bucket=args.s3_bucket, prefix=args.s3_prefix)
+        extractor.upload_to_s3(df=table, bucket=args.s3_bucket, prefix=args.s3_prefix,
+                             max_workers=args.upload_workers, skip_unchanged=not args.force_upload)
     else:
-        extractor.save_local_parquet(df=df, output_path=Path(args.output_dir))
+        extractor.save_local_parquet(df=table, output_path=Path(args.output_dir))
+    if watermarks is not None:
+        record_watermarks(watermarks, table)
 
 
 if __name__ == '__main__':
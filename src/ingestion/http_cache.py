@@ -0,0 +1,154 @@
+#!/usr/bin/env python3
+"""
+Cache persistente (em disco) de respostas HTTP JSON das APIs de cotação
+
+- Chave: URL normalizada + parâmetros ordenados (sha256)
+- TTL por requisição: períodos só com pregões encerrados não mudam (sem expiração);
+  períodos que incluem o dia corrente expiram rápido
+- Tamanho limitado com despejo LRU (menos acessado recentemente sai primeiro)
+- Contadores de hit/miss/despejo para acompanhar a efetividade
+"""
+
+import hashlib
+import json
+import logging
+import sqlite3
+import threading
+import time
+from contextlib import contextmanager
+from datetime import datetime
+from pathlib import Path
+from urllib.parse import urlsplit, urlunsplit
+
+logger = logging.getLogger(__name__)
+
+# Dados que incluem o dia corrente (barra ainda em formação)
+DEFAULT_TODAY_TTL = 15 * 60
+
+
+def ttl_for_period(end_timestamp: float, today_ttl: float = DEFAULT_TODAY_TTL) -> float | None:
+    """
+    TTL para uma resposta cujo período termina em `end_timestamp` (epoch, segundos).
+    None = nunca expira (só dias anteriores a hoje, que não mudam mais).
+    """
+    start_of_today = datetime.combine(datetime.now().date(), datetime.min.time()).timestamp()
+    if end_timestamp < start_of_today:
+        return None
+    return today_ttl
+
+
+class HTTPResponseCache:
+    """Cache LRU em SQLite para payloads JSON, seguro para uso entre threads e processos"""
+
+    def __init__(self, cache_dir: Path, max_bytes: int = 256 * 1024 * 1024):
+        self.cache_dir = Path(cache_dir)
+        self.cache_dir.mkdir(parents=True, exist_ok=True)
+        self.db_path = self.cache_dir / "http_cache.sqlite3"
+        self.max_bytes = max_bytes
+
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+        with self._connect() as conn:
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS responses ("
+                " key TEXT PRIMARY KEY,"
+                " url TEXT NOT NULL,"
+                " body TEXT NOT NULL,"
+                " size INTEGER NOT NULL,"
+                " expires_at REAL,"
+                " last_access REAL NOT NULL)"
+            )
+            conn.execute("CREATE INDEX IF NOT EXISTS idx_last_access ON responses (last_access)")
+
+    @contextmanager
+    def _connect(self):
+        conn = sqlite3.connect(self.db_path, timeout=30)
+        try:
+            with conn:
+                yield conn
+        finally:
+            conn.close()
+
+    @staticmethod
+    def make_key(url: str, params: dict = None) -> str:
+        """Chave estável: esquema/host em minúsculas, sem barra final, parâmetros ordenados"""
+        parts = urlsplit(url)
+        normalized_url = urlunsplit((
+            parts.scheme.lower(),
+            parts.netloc.lower(),
+            parts.path.rstrip('/'),
+            parts.query,
+            ''
+        ))
+        normalized_params = sorted((str(k), str(v)) for k, v in (params or {}).items())
+        raw = json.dumps([normalized_url, normalized_params], separators=(',', ':'))
+        return hashlib.sha256(raw.encode('utf-8')).hexdigest()
+
+    def get(self, url: str, params: dict = None):
+        """Retorna o payload JSON em cache (ou None se ausente/expirado)"""
+        key = self.make_key(url, params)
+        now = time.time()
+
+        with self._connect() as conn:
+            row = conn.execute(
+                "SELECT body, expires_at FROM responses WHERE key = ?", (key,)
+            ).fetchone()
+            if row is not None and (row[1] is None or row[1] > now):
+                conn.execute("UPDATE responses SET last_access = ? WHERE key = ?", (now, key))
+                with self._lock:
+                    self.hits += 1
+                return json.loads(row[0])
+            if row is not None:
+                conn.execute("DELETE FROM responses WHERE key = ?", (key,))
+
+        with self._lock:
+            self.misses += 1
+        return None
+
+    def set(self, url: str, params: dict, payload, ttl: float | None) -> None:
+        """Grava o payload; ttl=None significa sem expiração"""
+        key = self.make_key(url, params)
+        body = json.dumps(payload, separators=(',', ':'))
+        now = time.time()
+        expires_at = None if ttl is None else now + ttl
+
+        with self._connect() as conn:
+            conn.execute(
+                "INSERT OR REPLACE INTO responses (key, url, body, size, expires_at, last_access)"
+                " VALUES (?, ?, ?, ?, ?, ?)",
+                (key, url, body, len(body), expires_at, now)
+            )
+            self._evict(conn)
+
+    def _evict(self, conn: sqlite3.Connection) -> None:
+        """Remove expirados e, se ainda acima do limite, os menos acessados recentemente"""
+        conn.execute("DELETE FROM responses WHERE expires_at IS NOT NULL AND expires_at <= ?",
+                     (time.time(),))
+        total = conn.execute("SELECT COALESCE(SUM(size), 0) FROM responses").fetchone()[0]
+        if total <= self.max_bytes:
+            return
+
+        evicted = 0
+        for key, size in conn.execute(
+                "SELECT key, size FROM responses ORDER BY last_access ASC").fetchall():
+            if total <= self.max_bytes:
+                break
+            conn.execute("DELETE FROM responses WHERE key = ?", (key,))
+            total -= size
+            evicted += 1
+
+        with self._lock:
+            self.evictions += evicted
+
+    def stats(self) -> dict:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                'hits': self.hits,
+                'misses': self.misses,
+                'evictions': self.evictions,
+                'hit_ratio': round(self.hits / lookups, 3) if lookups else 0.0,
+            }
@@ -0,0 +1,288 @@
+#!/usr/bin/env python3
+"""
+Escrita incremental (streaming) de Parquet particionado em disco
+
+- Recebe tabelas/record batches à medida que chegam (não exige o histórico em memória)
+- Um ParquetWriter aberto por partição (year=/month=/day=), com buffer até
+  `row_group_size` linhas antes de gravar cada row group
+- Um único `data.parquet` por partição: ao abrir uma partição que já existe em
+  disco, as linhas antigas são regravadas no mesmo arquivo no fechamento
+- Deduplicação por (ticker, Date): a linha nova substitui a antiga de mesma chave
+  e repetições dentro do próprio fluxo são descartadas
+- Arquivo escrito em nome temporário e trocado por rename ao fechar a partição
+- Limite de writers abertos: o menos usado recentemente é suspenso (o segmento
+  temporário é fechado e a partição continua na sessão); ao voltar, grava um novo
+  segmento. Os segmentos e as linhas antigas são consolidados uma única vez, no
+  fechamento da partição: cada partição é regravada uma vez por sessão (não a
+  cada reabertura), mesmo num lote multi-ticker com mais dias que o limite
+"""
+
+import logging
+import os
+import threading
+import uuid
+from collections import OrderedDict
+from pathlib import Path
+
+import pyarrow as pa
+import pyarrow.compute as pc
+import pyarrow.parquet as pq
+
+from ingestion.arrow_utils import partition_slices, to_arrow
+
+logger = logging.getLogger(__name__)
+
+PARTITION_FILENAME = "data.parquet"
+
+
+def _conform(table: pa.Table, schema: pa.Schema) -> pa.Table:
+    """Alinha a tabela ao schema do writer (ordem, tipos; colunas ausentes viram nulas)"""
+    columns = []
+    for field in schema:
+        if field.name in table.column_names:
+            columns.append(table[field.name].cast(field.type))
+        else:
+            columns.append(pa.nulls(table.num_rows, field.type))
+    return pa.Table.from_arrays(columns, schema=schema)
+
+
+class _PartitionWriter:
+    """Estado de uma partição aberta: writer temporário, buffer e chaves já gravadas"""
+
+    def __init__(self, directory: Path, schema: pa.Schema, key_cols: tuple, row_group_size: int,
+                 compression: str):
+        self.directory = directory
+        self.schema = schema
+        self.key_cols = key_cols
+        self.row_group_size = row_group_size
+        self.compression = compression
+        self.target = directory / PARTITION_FILENAME
+        # Arquivos já existentes (incluindo os do antigo write_to_dataset): regravados no fechamento
+        self.existing = sorted(
+            path for path in directory.glob("*.parquet") if not path.name.startswith(('.', '_'))
+        ) if directory.exists() else []
+
+        directory.mkdir(parents=True, exist_ok=True)
+        # Segmentos temporários já fechados (suspensões) e o segmento aberto
+        self.segments: list[Path] = []
+        self.tmp_path: Path | None = None
+        self.writer: pq.ParquetWriter | None = None
+        self.buffer: list[pa.Table] = []
+        self.buffered_rows = 0
+        self.seen: set = set()
+        self.rows_written = 0
+        self.duplicates = 0
+
+    def _open_segment(self) -> None:
+        self.tmp_path = self.directory / f".{PARTITION_FILENAME}.{uuid.uuid4().hex}.tmp"
+        self.writer = pq.ParquetWriter(self.tmp_path, self.schema, compression=self.compression)
+
+    def _keys(self, table: pa.Table) -> list[tuple]:
+        return list(zip(*(table[col].to_pylist() for col in self.key_cols)))
+
+    def _unseen_mask(self, table: pa.Table) -> pa.Array:
+        """Máscara das linhas cuja chave ainda não foi gravada (registra as novas)"""
+        mask = []
+        for key in self._keys(table):
+            keep = key not in self.seen
+            if keep:
+                self.seen.add(key)
+            mask.append(keep)
+        return pa.array(mask, pa.bool_())
+
+    def append(self, table: pa.Table) -> None:
+        table = _conform(table, self.schema)
+        if self.key_cols:
+            mask = self._unseen_mask(table)
+            kept = table.filter(mask)
+            self.duplicates += table.num_rows - kept.num_rows
+            table = kept
+        if table.num_rows == 0:
+            return
+
+        self.buffer.append(table)
+        self.buffered_rows += table.num_rows
+        if self.buffered_rows >= self.row_group_size:
+            self.flush()
+
+    def flush(self) -> None:
+        if not self.buffer:
+            return
+        table = pa.concat_tables(self.buffer)
+        if self.writer is None:
+            self._open_segment()
+        self.writer.write_table(table, row_group_size=self.row_group_size)
+        self.rows_written += table.num_rows
+        self.buffer = []
+        self.buffered_rows = 0
+
+    def suspend(self) -> None:
+        """Fecha o segmento aberto (libera o arquivo); a partição segue na sessão"""
+        self.flush()
+        if self.writer is not None:
+            self.writer.close()
+            self.segments.append(self.tmp_path)
+            self.writer, self.tmp_path = None, None
+
+    def close(self) -> None:
+        """Consolida segmentos + linhas antigas não substituídas e troca o arquivo da partição"""
+        if self.segments:
+            # Segmentos de suspensões anteriores entram no arquivo final, na ordem de chegada
+            self.suspend()
+            segments, self.segments = self.segments, []
+            self._open_segment()
+            for path in segments:
+                for batch in pq.ParquetFile(path).iter_batches(batch_size=self.row_group_size):
+                    self.writer.write_table(_conform(pa.Table.from_batches([batch]), self.schema),
+                                            row_group_size=self.row_group_size)
+                path.unlink()
+        self.flush()
+        if self.writer is None:
+            self._open_segment()
+        for path in self.existing:
+            parquet_file = pq.ParquetFile(path)
+            for batch in parquet_file.iter_batches(batch_size=self.row_group_size):
+                old = pa.Table.from_batches([batch])
+                if self.key_cols and all(col in old.column_names for col in self.key_cols):
+                    old = _conform(old, self.schema)
+                    keys = self._keys(old)
+                    # Chaves já gravadas nesta sessão têm precedência (dado mais novo)
+                    keep = pa.array([key not in self.seen for key in keys], pa.bool_())
+                    self.duplicates += old.num_rows - pc.sum(keep).as_py()
+                    old = old.filter(keep)
+                    self.seen.update(self._keys(old))
+                else:
+                    old = _conform(old, self.schema)
+                self.buffer.append(old)
+                self.buffered_rows += old.num_rows
+                if self.buffered_rows >= self.row_group_size:
+                    self.flush()
+        self.flush()
+        self.writer.close()
+
+        os.replace(self.tmp_path, self.target)
+        for path in self.existing:
+            if path != self.target:
+                path.unlink()
+
+    def abort(self) -> None:
+        if self.writer is not None:
+            self.writer.close()
+            self.segments.append(self.tmp_path)
+        for path in self.segments:
+            path.unlink(missing_ok=True)
+
+
+class PartitionedParquetSink:
+    """
+    Sink Parquet particionado em modo append, seguro entre threads.
+
+    Uso:
+        with PartitionedParquetSink(root) as sink:
+            for table in tabelas:
+                sink.write(table)
+    """
+
+    def __init__(self, root_path: Path, partition_cols: list[str] = None,
+                 key_cols: tuple = ('ticker', 'Date'), row_group_size: int = 64 * 1024,
+                 max_open_writers: int = 256, compression: str = 'snappy'):
+        self.root_path = Path(root_path)
+        self.partition_cols = list(partition_cols or ['year', 'month', 'day'])
+        self.key_cols = tuple(key_cols or ())
+        self.row_group_size = row_group_size
+        self.max_open_writers = max(1, max_open_writers)
+        self.compression = compression
+
+        self._lock = threading.Lock()
+        self._writers: OrderedDict[tuple, _PartitionWriter] = OrderedDict()
+        # Partições suspensas pelo limite de writers: consolidadas no flush/close
+        self._suspended: dict[tuple, _PartitionWriter] = {}
+        self._schema: pa.Schema | None = None
+        self.partitions_written = 0
+        self.rows_written = 0
+        self.duplicates = 0
+
+    def _partition_dir(self, values: tuple) -> Path:
+        path = self.root_path
+        for col, value in zip(self.partition_cols, values):
+            path = path / f"{col}={value}"
+        return path
+
+    def write(self, data) -> None:
+        """Acrescenta linhas (pa.Table, pa.RecordBatch ou DataFrame)"""
+        if isinstance(data, pa.RecordBatch):
+            data = pa.Table.from_batches([data])
+        table = to_arrow(data)
+        if table.num_rows == 0:
+            return
+
+        with self._lock:
+            # As colunas de partição ficam no caminho (mesmo layout do write_to_dataset);
+            # metadata do pandas é descartada, a demais (ex: versão do contrato raw) é mantida
+            data_schema = table.drop_columns(self.partition_cols).schema
+            metadata = {k: v for k, v in (data_schema.metadata or {}).items() if k != b'pandas'}
+            data_schema = data_schema.with_metadata(metadata) if metadata else data_schema.remove_metadata()
+            if self._schema is None:
+                self._schema = data_schema
+            key_cols = self.key_cols if all(c in table.column_names for c in self.key_cols) else ()
+
+            for values, part in partition_slices(table, self.partition_cols):
+                writer = self._writers.get(values)
+                if writer is None:
+                    writer = self._suspended.pop(values, None) or _PartitionWriter(
+                        self._partition_dir(values), self._schema, key_cols, self.row_group_size,
+                        self.compression)
+                    self._writers[values] = writer
+                    self._evict()
+                else:
+                    self._writers.move_to_end(values)
+                writer.append(part.drop_columns(self.partition_cols))
+
+    def _evict(self) -> None:
+        """Suspende as partições menos usadas recentemente acima do limite de writers abertos"""
+        while len(self._writers) > self.max_open_writers:
+            values, writer = self._writers.popitem(last=False)
+            writer.suspend()
+            self._suspended[values] = writer
+
+    def _drain(self):
+        """Retira da sessão todas as partições (abertas e suspensas)"""
+        while self._writers:
+            yield self._writers.popitem(last=False)[1]
+        while self._suspended:
+            yield self._suspended.popitem()[1]
+
+    def _close_writer(self, writer: _PartitionWriter) -> None:
+        writer.close()
+        self.partitions_written += 1
+        self.rows_written += writer.rows_written
+        self.duplicates += writer.duplicates
+
+    def flush(self) -> None:
+        """Fecha todas as partições abertas (os arquivos ficam completos em disco)"""
+        with self._lock:
+            for writer in self._drain():
+                self._close_writer(writer)
+
+    def close(self) -> None:
+        self.flush()
+        logger.info(
+            f"Parquet em {self.root_path}: {self.partitions_written} partições, "
+            f"{self.rows_written} linhas, {self.duplicates} duplicadas descartadas"
+        )
+
+    def abort(self) -> None:
+        """Descarta as partições abertas sem tocar nos arquivos existentes"""
+        with self._lock:
+            for writer in self._drain():
+                writer.abort()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        if exc_type is None:
+            self.close()
+        else:
+            self.abort()
+        return False
@@ -11,10 +11,14 @@ from pathlib import Path
 import sys
 
 import pandas as pd
-import pyarrow as pa
-import pyarrow.parquet as pq
-import boto3
-from botocore.exceptions import ClientError
+
+# Permitir execução direta do script (python src/ingestion/process_csv_local.py)
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from ingestion.arrow_utils import partition_slices, to_arrow
+from ingestion.parquet_sink import PartitionedParquetSink
+from ingestion.raw_schema import conform_raw
+from ingestion.s3_uploader import ParallelS3Uploader
 
 logging.basicConfig(
     level=logging.INFO,
@@ -95,51 +99,44 @@ class CSVProcessor:
             partition_cols = ['year', 'month', 'day']
         
         output_path = Path(output_path)
-        output_path.mkdir(parents=True, exist_ok=True)
-        
-        table = pa.Table.from_pandas(df)
         
         logger.info(f"Salvando em Parquet particionado por {partition_cols}")
-        pq.write_to_dataset(
-            table,
-            root_path=str(output_path),
-            partition_cols=partition_cols,
-            existing_data_behavior='overwrite_or_ignore'
-        )
+        # Reprocessar o mesmo CSV substitui as linhas (ticker, Date) em vez de duplicar arquivos
+        with PartitionedParquetSink(output_path, partition_cols=partition_cols) as sink:
+            sink.write(conform_raw(to_arrow(df), keep=tuple(partition_cols)))
         
         logger.info(f"✅ Dados salvos em Parquet: {output_path}")
         return output_path
     
-    def upload_to_s3(self, df: pd.DataFrame, bucket: str, prefix: str = "raw"):
-        """Upload para S3 em Parquet particionado"""
+    def upload_to_s3(self, df: pd.DataFrame, bucket: str, prefix: str = "raw",
+                     max_workers: int = 16, skip_unchanged: bool = True):
+        """
+        Upload para S3 em Parquet particionado.
+        Partições enviadas em paralelo; as que não mudaram desde o último upload são puladas.
+        """
         logger.info(f"Iniciando upload para s3://{bucket}/{prefix}")
         
-        s3_client = boto3.client('s3')
+        table = to_arrow(df)
         
-        for date, group in df.groupby(['year', 'month', 'day']):
-            year, month, day = date
-            
-            s3_key = (
-                f"{prefix}/dataset={self.dataset_name}/ticker={self.ticker_normalized}/"
-                f"year={year}/month={month:02d}/day={day:02d}/data.parquet"
-            )
-            
-            table = pa.Table.from_pandas(group)
-            buffer = pa.BufferOutputStream()
-            pq.write_table(table, buffer)
-            
-            try:
-                s3_client.put_object(
-                    Bucket=bucket,
-                    Key=s3_key,
-                    Body=buffer.getvalue().to_pybytes()
+        def _partitions():
+            for keys, group in partition_slices(table, ['year', 'month', 'day']):
+                year, month, day = keys
+                
+                s3_key = (
+                    f"{prefix}/dataset={self.dataset_name}/ticker={self.ticker_normalized}/"
+                    f"year={year}/month={month:02d}/day={day:02d}/data.parquet"
                 )
-                logger.info(f"Upload concluído: s3://{bucket}/{s3_key}")
-            except ClientError as e:
-                logger.error(f"Erro no upload: {str(e)}")
-                raise
+                yield s3_key, conform_raw(group)
+        
+        uploader = ParallelS3Uploader(bucket, max_workers=max_workers, skip_unchanged=skip_unchanged)
+        try:
+            result = uploader.upload(_partitions())
+        except RuntimeError as e:
+            logger.error(f"Erro no upload: {str(e)}")
+            raise
         
         logger.info(f"✅ Upload completo para s3://{bucket}/{prefix}")
+        return result
 
 
 def main():
@@ -153,6 +150,9 @@ def main():
     parser.add_argument('--format', choices=['json', 'parquet'], default='parquet')
     parser.add_argument('--s3-bucket', help='Bucket S3 (opcional)')
     parser.add_argument('--s3-prefix', default='raw', help='Prefixo S3')
+    parser.add_argument('--upload-workers', type=int, default=16, help='Uploads S3 simultâneos')
+    parser.add_argument('--force-upload', action='store_true',
+                        help='Reenvia partições mesmo sem alteração de conteúdo')
     
     args = parser.parse_args()
     
@@ -182,7 +182,8 @@ def main():
     
     # Salvar
     if args.s3_bucket:
-        processor.upload_to_s3(df=df, bucket=args.s3_bucket, prefix=args.s3_prefix)
+        processor.upload_to_s3(df=df, bucket=args.s3_bucket, prefix=args.s3_prefix,
+                               max_workers=args.upload_workers, skip_unchanged=not args.force_upload)
     else:
         output_path = Path(args.output_dir)
         
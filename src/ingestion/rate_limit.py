@@ -0,0 +1,171 @@
+#!/usr/bin/env python3
+"""
+Rate limiter (token bucket) por fonte de cotação
+
+- Orçamento por fonte: requisições/segundo, rajada (burst) e cota diária
+- Um limiter por fonte é compartilhado por todas as threads do processo
+- Estado opcional em arquivo (com lock entre processos) para que execuções
+  locais consecutivas respeitem a mesma cota diária e o mesmo ritmo
+- Métricas de espera (quantas requisições esperaram, total e máximo)
+"""
+
+import json
+import logging
+import threading
+import time
+from datetime import date
+from pathlib import Path
+
+try:
+    import fcntl
+except ImportError:  # Windows: sem lock entre processos, só entre threads
+    fcntl = None
+
+logger = logging.getLogger(__name__)
+
+
+class RateLimitExceeded(RuntimeError):
+    """Cota diária da fonte esgotada"""
+
+
+class TokenBucketRateLimiter:
+    """Token bucket thread-safe: `acquire()` bloqueia até haver orçamento para a requisição"""
+
+    def __init__(self, name: str, rate_per_second: float, burst: int = 1,
+                 daily_quota: int = None, state_path: Path = None):
+        if rate_per_second <= 0:
+            raise ValueError("rate_per_second deve ser positivo")
+        self.name = name
+        self.rate = rate_per_second
+        self.burst = max(1, burst)
+        self.daily_quota = daily_quota
+        self.state_path = Path(state_path) if state_path else None
+
+        self._lock = threading.Lock()
+        self._tokens = float(self.burst)
+        self._updated_at = time.time()
+        self._day = date.today().isoformat()
+        self._used_today = 0
+
+        self.requests = 0
+        self.waited_requests = 0
+        self.total_wait = 0.0
+        self.max_wait = 0.0
+
+    def acquire(self) -> float:
+        """Reserva uma requisição; retorna quantos segundos esperou"""
+        with self._lock:
+            with self._file_state():
+                now = time.time()
+                today = date.today().isoformat()
+                if today != self._day:
+                    self._day = today
+                    self._used_today = 0
+
+                if self.daily_quota is not None and self._used_today >= self.daily_quota:
+                    raise RateLimitExceeded(
+                        f"Cota diária de {self.name} esgotada ({self.daily_quota} requisições)"
+                    )
+
+                # Reabastecer e reservar (tokens negativos = fila de espera)
+                elapsed = max(0.0, now - self._updated_at)
+                self._tokens = min(float(self.burst), self._tokens + elapsed * self.rate)
+                self._updated_at = now
+                self._tokens -= 1
+                self._used_today += 1
+                wait = max(0.0, -self._tokens / self.rate)
+
+            self.requests += 1
+            if wait > 0:
+                self.waited_requests += 1
+                self.total_wait += wait
+                self.max_wait = max(self.max_wait, wait)
+
+        if wait > 0:
+            time.sleep(wait)
+        return wait
+
+    def _file_state(self):
+        return _FileState(self) if self.state_path else _NoState()
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                'requests': self.requests,
+                'waited_requests': self.waited_requests,
+                'total_wait_s': round(self.total_wait, 3),
+                'max_wait_s': round(self.max_wait, 3),
+                'used_today': self._used_today,
+                'daily_quota': self.daily_quota,
+            }
+
+
+class _NoState:
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+
+class _FileState:
+    """Carrega/grava o estado do bucket em JSON sob lock exclusivo do arquivo"""
+
+    def __init__(self, limiter: TokenBucketRateLimiter):
+        self.limiter = limiter
+        self.handle = None
+
+    def __enter__(self):
+        limiter = self.limiter
+        limiter.state_path.parent.mkdir(parents=True, exist_ok=True)
+        self.handle = open(limiter.state_path, 'a+', encoding='utf-8')
+        if fcntl is not None:
+            fcntl.flock(self.handle, fcntl.LOCK_EX)
+
+        self.handle.seek(0)
+        content = self.handle.read().strip()
+        self._all = json.loads(content) if content else {}
+        state = self._all.get(limiter.name)
+        if state:
+            limiter._tokens = state['tokens']
+            limiter._updated_at = state['updated_at']
+            limiter._day = state['day']
+            limiter._used_today = state['used_today']
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        limiter = self.limiter
+        try:
+            self._all[limiter.name] = {
+                'tokens': limiter._tokens,
+                'updated_at': limiter._updated_at,
+                'day': limiter._day,
+                'used_today': limiter._used_today,
+            }
+            self.handle.seek(0)
+            self.handle.truncate()
+            self.handle.write(json.dumps(self._all, indent=2, sort_keys=True))
+            self.handle.flush()
+        finally:
+            if fcntl is not None:
+                fcntl.flock(self.handle, fcntl.LOCK_UN)
+            self.handle.close()
+        return False
+
+
+def parse_rate_limit_spec(spec: str, state_path: Path = None) -> TokenBucketRateLimiter:
+    """
+    Converte 'fonte:rps=2,burst=5,daily=15000' em um limiter
+    (burst padrão = 1; daily opcional)
+    """
+    name, _, options = spec.partition(':')
+    values = dict(item.split('=', 1) for item in options.split(',') if item)
+    if 'rps' not in values:
+        raise ValueError(f"Especificação de rate limit sem rps: {spec}")
+    return TokenBucketRateLimiter(
+        name=name.strip(),
+        rate_per_second=float(values['rps']),
+        burst=int(values.get('burst', 1)),
+        daily_quota=int(values['daily']) if 'daily' in values else None,
+        state_path=state_path,
+    )
@@ -0,0 +1,118 @@
+#!/usr/bin/env python3
+"""
+Contrato de schema da camada raw (versionado)
+
+Todos os produtores (extrator, processador de CSV e Lambda de scraping) gravam
+exatamente este schema, com a versão na metadata do Parquet. Assim o Glue valida
+só pelo footer e lê com o leitor vetorizado, sem conversões por arquivo.
+
+- Date: date32 (DATE no Parquet; nada de timestamp em nanossegundos)
+- Preços e Volume: float64
+- ticker/dataset/extraction_timestamp/data_source: string (metadados opcionais, podem ser nulos)
+
+A Lambda de scraping (arquivo único) mantém uma cópia: ao mudar o schema, altere
+os dois e incremente RAW_SCHEMA_VERSION (scripts/migrate_raw_schema.py regrava o legado).
+"""
+
+import pyarrow as pa
+import pyarrow.compute as pc
+
+RAW_SCHEMA_VERSION = 1
+
+# Chave da metadata do Parquet com a versão do contrato
+SCHEMA_VERSION_KEY = b"raw_schema_version"
+
+RAW_SCHEMA = pa.schema(
+    [
+        ("Date", pa.date32()),
+        ("Open", pa.float64()),
+        ("High", pa.float64()),
+        ("Low", pa.float64()),
+        ("Close", pa.float64()),
+        ("Adj Close", pa.float64()),
+        ("Volume", pa.float64()),
+        ("ticker", pa.string()),
+        ("dataset", pa.string()),
+        ("extraction_timestamp", pa.string()),
+        ("data_source", pa.string()),
+    ],
+    metadata={SCHEMA_VERSION_KEY: str(RAW_SCHEMA_VERSION).encode()},
+)
+
+REQUIRED_COLUMNS = ("Date", "Open", "High", "Low", "Close", "Volume", "ticker")
+
+# Nomes alternativos vistos nos produtores antigos
+_ALIASES = {"Ticker": "ticker"}
+
+
+class RawSchemaError(ValueError):
+    """Tabela ou arquivo fora do contrato do raw"""
+
+
+def _to_date32(column: pa.ChunkedArray) -> pa.ChunkedArray:
+    if pa.types.is_date32(column.type):
+        return column
+    if pa.types.is_timestamp(column.type) or pa.types.is_date64(column.type):
+        # Barras diárias podem ter horário (ex: 03:00 UTC): só o dia importa
+        return pc.cast(pc.floor_temporal(column, unit='day'), pa.date32())
+    if pa.types.is_string(column.type) or pa.types.is_large_string(column.type):
+        # "2025-01-02" ou "2025-01-02 00:00:00"
+        return pc.cast(pc.utf8_slice_codeunits(column, 0, 10), pa.date32())
+    raise RawSchemaError(f"Tipo de Date não suportado: {column.type}")
+
+
+def conform_raw(table: pa.Table, keep: tuple = ()) -> pa.Table:
+    """
+    Converte a tabela para o contrato (ordem, tipos e metadata de versão).
+
+    Colunas fora do contrato são descartadas, exceto as de `keep` (ex: colunas de
+    particionamento usadas pelo sink local, que não vão para o arquivo).
+
+    Raises:
+        RawSchemaError: coluna obrigatória ausente ou tipo não conversível
+    """
+    table = table.rename_columns([_ALIASES.get(name, name) for name in table.column_names])
+    missing = [name for name in REQUIRED_COLUMNS if name not in table.column_names]
+    if missing:
+        raise RawSchemaError(f"Colunas obrigatórias ausentes no raw: {missing}")
+
+    columns, fields = [], []
+    for field in RAW_SCHEMA:
+        if field.name not in table.column_names:
+            column = pa.nulls(table.num_rows, field.type)
+        elif field.name == "Date":
+            column = _to_date32(table[field.name])
+        else:
+            try:
+                column = table[field.name].cast(field.type)
+            except (pa.ArrowInvalid, pa.ArrowNotImplementedError) as e:
+                raise RawSchemaError(f"Coluna {field.name} não conversível para {field.type}: {e}") from e
+        columns.append(column)
+        fields.append(field)
+
+    for name in keep:
+        if name in table.column_names and name not in RAW_SCHEMA.names:
+            columns.append(table[name])
+            fields.append(table.schema.field(name))
+
+    return pa.Table.from_arrays(columns, schema=pa.schema(fields, metadata=RAW_SCHEMA.metadata))
+
+
+def schema_version(schema: pa.Schema) -> int | None:
+    """Versão do contrato gravada no arquivo (None: arquivo legado, sem versão)"""
+    value = (schema.metadata or {}).get(SCHEMA_VERSION_KEY)
+    return int(value) if value is not None else None
+
+
+def validate_raw_schema(schema: pa.Schema) -> list[str]:
+    """Problemas do schema de um arquivo em relação ao contrato (lista vazia = conforme)"""
+    problems = []
+    version = schema_version(schema)
+    if version != RAW_SCHEMA_VERSION:
+        problems.append(f"versão {version} (esperada {RAW_SCHEMA_VERSION})")
+    for field in RAW_SCHEMA:
+        if field.name not in schema.names:
+            problems.append(f"coluna ausente: {field.name}")
+        elif not schema.field(field.name).type.equals(field.type):
+            problems.append(f"{field.name}: {schema.field(field.name).type} (esperado {field.type})")
+    return problems
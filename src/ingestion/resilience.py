@@ -0,0 +1,153 @@
+#!/usr/bin/env python3
+"""
+Resiliência entre fontes de cotação (BRAPI, Yahoo)
+
+- CircuitBreaker: após N falhas seguidas a fonte é pulada por um período de
+  resfriamento, compartilhado entre todos os tickers do processo
+- hedged_call: dispara a fonte secundária se a primária não responder dentro
+  de um limiar de latência; vence o primeiro resultado válido e a outra
+  chamada é sinalizada para parar (Event de cancelamento)
+"""
+
+import logging
+import threading
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from typing import Callable
+
+logger = logging.getLogger(__name__)
+
+
+class CircuitOpenError(RuntimeError):
+    """Fonte em resfriamento: chamada não realizada"""
+
+
+class CircuitBreaker:
+    """
+    Estados:
+    - closed: chamadas liberadas
+    - open: chamadas bloqueadas até `cooldown_seconds` após a última falha
+    - half_open: após o resfriamento, uma chamada de teste; sucesso fecha, falha reabre
+      e cancelamento (abort_trial) libera o teste para a próxima chamada
+    """
+
+    def __init__(self, name: str, failure_threshold: int = 3, cooldown_seconds: float = 300):
+        self.name = name
+        self.failure_threshold = failure_threshold
+        self.cooldown_seconds = cooldown_seconds
+
+        self._lock = threading.Lock()
+        self._failures = 0
+        self._opened_at = None
+        self._trial_in_flight = False
+
+    @property
+    def state(self) -> str:
+        with self._lock:
+            return self._state()
+
+    def _state(self) -> str:
+        if self._opened_at is None:
+            return 'closed'
+        if time.monotonic() - self._opened_at >= self.cooldown_seconds:
+            return 'half_open'
+        return 'open'
+
+    def allow(self) -> bool:
+        """True se a chamada pode ser feita agora"""
+        with self._lock:
+            state = self._state()
+            if state == 'closed':
+                return True
+            if state == 'half_open' and not self._trial_in_flight:
+                self._trial_in_flight = True
+                return True
+            return False
+
+    def record_success(self) -> None:
+        with self._lock:
+            if self._opened_at is not None:
+                logger.info(f"Circuit breaker {self.name}: fonte recuperada (fechado)")
+            self._failures = 0
+            self._opened_at = None
+            self._trial_in_flight = False
+
+    def record_failure(self) -> None:
+        with self._lock:
+            self._failures += 1
+            if self._trial_in_flight or self._failures >= self.failure_threshold:
+                if self._opened_at is None or self._trial_in_flight:
+                    logger.warning(
+                        f"Circuit breaker {self.name}: aberto por {self.cooldown_seconds:.0f}s "
+                        f"após {self._failures} falhas"
+                    )
+                self._opened_at = time.monotonic()
+            self._trial_in_flight = False
+
+    def abort_trial(self) -> None:
+        """Chamada cancelada (ex: hedge): não conta como sucesso nem falha da fonte"""
+        with self._lock:
+            self._trial_in_flight = False
+
+
+def build_breakers(sources: list[str], failure_threshold: int = 3,
+                   cooldown_seconds: float = 300) -> dict[str, CircuitBreaker]:
+    return {
+        source: CircuitBreaker(source, failure_threshold, cooldown_seconds)
+        for source in sources
+    }
+
+
+def hedged_call(primary: Callable, secondary: Callable | None, hedge_after: float,
+                is_valid: Callable = bool):
+    """
+    Executa `primary` e, se não houver resultado válido em `hedge_after` segundos
+    (ou se ela falhar antes disso), dispara `secondary` em paralelo.
+
+    Cada callable recebe um threading.Event de cancelamento, sinalizado quando a
+    outra chamada vence; cabe a ela parar retries/esperas ao vê-lo ativo.
+
+    Returns:
+        (índice da chamada vencedora: 0 primária / 1 secundária, resultado)
+    """
+    calls = [primary] + ([secondary] if secondary is not None else [])
+    cancels = [threading.Event() for _ in calls]
+    executor = ThreadPoolExecutor(max_workers=len(calls))
+    errors: list[BaseException] = []
+
+    try:
+        futures = {executor.submit(calls[0], cancels[0]): 0}
+        started_secondary = False
+        pending = set(futures)
+
+        while pending:
+            timeout = None if started_secondary or len(calls) == 1 else hedge_after
+            done, pending = wait(pending, timeout=timeout, return_when=FIRST_COMPLETED)
+
+            for future in done:
+                index = futures[future]
+                try:
+                    result = future.result()
+                except Exception as e:
+                    errors.append(e)
+                    continue
+                if is_valid(result):
+                    for other, cancel in enumerate(cancels):
+                        if other != index:
+                            cancel.set()
+                    return index, result
+
+            if not started_secondary and len(calls) > 1:
+                # Limiar de latência estourado ou primária sem resultado válido
+                reason = "sem resposta válida" if done else f"sem resposta em {hedge_after:.1f}s"
+                logger.info(f"Hedge: primária {reason}; disparando fonte secundária")
+                future = executor.submit(calls[1], cancels[1])
+                futures[future] = 1
+                pending.add(future)
+                started_secondary = True
+    finally:
+        executor.shutdown(wait=False, cancel_futures=True)
+
+    if errors:
+        raise errors[-1]
+    raise ValueError("Nenhuma fonte retornou resultado válido")
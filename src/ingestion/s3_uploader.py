@@ -0,0 +1,126 @@
+#!/usr/bin/env python3
+"""
+Upload paralelo de partições Parquet para o S3, pulando as que não mudaram
+
+- Um único cliente boto3 (thread-safe) com pool de conexões do tamanho do pool de threads
+- Fingerprint do conteúdo (sha256 dos dados, sem colunas voláteis como
+  extraction_timestamp) gravado em metadata do objeto; reexecuções comparam
+  via HEAD e só enviam partições novas ou alteradas
+"""
+
+import hashlib
+import logging
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+import boto3
+import pyarrow as pa
+import pyarrow.parquet as pq
+from botocore.config import Config
+from botocore.exceptions import ClientError
+
+logger = logging.getLogger(__name__)
+
+FINGERPRINT_METADATA_KEY = "content-sha256"
+
+# Mudam a cada execução sem que os dados mudem
+VOLATILE_COLUMNS = ("extraction_timestamp",)
+
+
+def content_fingerprint(table: pa.Table) -> str:
+    """sha256 dos dados da partição (ignora colunas voláteis e metadata de schema)"""
+    stable = table.drop_columns([c for c in VOLATILE_COLUMNS if c in table.column_names])
+    # take() materializa buffers a partir do offset 0: fatias com os mesmos dados
+    # geram bytes idênticos independentemente da posição na tabela de origem
+    stable = stable.replace_schema_metadata(None)
+    stable = stable.take(pa.array(range(stable.num_rows), pa.int64()))
+
+    sink = pa.BufferOutputStream()
+    with pa.ipc.new_stream(sink, stable.schema) as writer:
+        writer.write_table(stable)
+    return hashlib.sha256(sink.getvalue().to_pybytes()).hexdigest()
+
+
+class ParallelS3Uploader:
+    """Envia (key, tabela) em paralelo para um bucket, com skip por fingerprint"""
+
+    def __init__(self, bucket: str, max_workers: int = 16, skip_unchanged: bool = True,
+                 s3_client=None):
+        self.bucket = bucket
+        self.max_workers = max_workers
+        self.skip_unchanged = skip_unchanged
+        self.s3_client = s3_client or boto3.client(
+            's3',
+            config=Config(
+                max_pool_connections=max_workers,
+                retries={'max_attempts': 10, 'mode': 'adaptive'}
+            )
+        )
+
+    def _stored_fingerprint(self, key: str) -> str | None:
+        try:
+            head = self.s3_client.head_object(Bucket=self.bucket, Key=key)
+        except ClientError as e:
+            if e.response.get('Error', {}).get('Code') in ('404', 'NoSuchKey', 'NotFound'):
+                return None
+            raise
+        return head.get('Metadata', {}).get(FINGERPRINT_METADATA_KEY)
+
+    def _upload_one(self, key: str, table: pa.Table) -> bool:
+        """Retorna True se enviou, False se pulou (conteúdo idêntico)"""
+        fingerprint = content_fingerprint(table)
+        if self.skip_unchanged and self._stored_fingerprint(key) == fingerprint:
+            return False
+
+        buffer = pa.BufferOutputStream()
+        pq.write_table(table, buffer)
+
+        self.s3_client.put_object(
+            Bucket=self.bucket,
+            Key=key,
+            Body=buffer.getvalue().to_pybytes(),
+            ContentType='application/x-parquet',
+            Metadata={FINGERPRINT_METADATA_KEY: fingerprint}
+        )
+        return True
+
+    def upload(self, partitions) -> dict:
+        """
+        Args:
+            partitions: iterável de (s3_key, pa.Table)
+
+        Returns:
+            Dict com contagens uploaded/skipped/failed e a lista de keys enviadas
+        """
+        uploaded: list[str] = []
+        skipped = 0
+        failed: list[str] = []
+
+        with ThreadPoolExecutor(max_workers=self.max_workers) as executor:
+            futures = {
+                executor.submit(self._upload_one, key, table): key
+                for key, table in partitions
+            }
+            for future in as_completed(futures):
+                key = futures[future]
+                try:
+                    if future.result():
+                        uploaded.append(key)
+                    else:
+                        skipped += 1
+                except ClientError as e:
+                    logger.error(f"Erro no upload de s3://{self.bucket}/{key}: {e}")
+                    failed.append(key)
+
+        logger.info(
+            f"Upload s3://{self.bucket}: {len(uploaded)} enviados, "
+            f"{skipped} sem alteração, {len(failed)} com erro"
+        )
+        if failed:
+            raise RuntimeError(f"{len(failed)} partições falharam no upload (ex: {failed[0]})")
+
+        return {
+            'uploaded': len(uploaded),
+            'skipped': skipped,
+            'failed': len(failed),
+            'keys': sorted(uploaded),
+        }
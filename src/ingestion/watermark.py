@@ -0,0 +1,189 @@
+#!/usr/bin/env python3
+"""
+Watermarks de ingestão: último dia já gravado por (dataset, ticker)
+Permite extração incremental (buscar apenas as datas que faltam)
+
+Fontes:
+- Local: saída de `save_local_parquet` (year=/month=/day=, ticker/dataset nas colunas),
+  com um índice `_watermarks.json` na raiz para evitar varrer os arquivos
+- S3: layout `raw/dataset=.../ticker=.../year=/month=/day=` (o próprio layout é o estado)
+
+Partições compactadas por mês/ano (compact_partitions) não têm o nível day=;
+nesse caso o último dia vem das colunas month/day dos arquivos compactados.
+"""
+
+import json
+import logging
+import re
+from datetime import date
+from io import BytesIO
+from pathlib import Path
+
+import boto3
+import pyarrow.compute as pc
+import pyarrow.parquet as pq
+
+logger = logging.getLogger(__name__)
+
+INDEX_FILENAME = "_watermarks.json"
+
+_PARTITION_RE = re.compile(r"^(year|month|day)=(\d+)$")
+
+
+def _partition_value(name: str) -> int | None:
+    match = _PARTITION_RE.match(name)
+    return int(match.group(2)) if match else None
+
+
+class LocalWatermarkStore:
+    """Watermarks lidos da saída local particionada (save_local_parquet)"""
+
+    def __init__(self, root_path: Path):
+        self.root_path = Path(root_path)
+        self.index_path = self.root_path / INDEX_FILENAME
+
+    def _load_index(self) -> dict:
+        if not self.index_path.exists():
+            return {}
+        try:
+            return json.loads(self.index_path.read_text(encoding='utf-8'))
+        except (OSError, ValueError) as e:
+            logger.warning(f"Índice de watermarks ilegível ({e}); varrendo partições")
+            return {}
+
+    def _scan_layout(self, dataset: str, ticker: str) -> date | None:
+        """Percorre as partições da mais recente para a mais antiga até achar o ticker"""
+        if not self.root_path.exists():
+            return None
+
+        def _children(path: Path) -> list[tuple[int, Path]]:
+            found = []
+            for child in path.iterdir():
+                value = _partition_value(child.name) if child.is_dir() else None
+                if value is not None:
+                    found.append((value, child))
+            return sorted(found, reverse=True)
+
+        def _scan(path: Path, parts: tuple[int, ...]) -> date | None:
+            for value, child in _children(path):
+                found = _scan(child, parts + (value,))
+                if found:
+                    return found
+            # Arquivos no próprio diretório: dia, ou mês/ano compactado (compact_partitions)
+            files = sorted(path.glob("*.parquet")) if parts else []
+            return _last_date_in_files(
+                [pq.ParquetFile(file_path) for file_path in files], parts, dataset, ticker
+            )
+
+        return _scan(self.root_path, ())
+
+    def last_date(self, dataset: str, ticker: str) -> date | None:
+        """Último dia gravado para (dataset, ticker), ou None se nunca ingerido"""
+        entry = self._load_index().get(dataset, {}).get(ticker)
+        if entry:
+            return date.fromisoformat(entry)
+        return self._scan_layout(dataset, ticker)
+
+    def update(self, dataset: str, ticker: str, last: date) -> None:
+        """Registra o último dia gravado (nunca retrocede o watermark)"""
+        index = self._load_index()
+        current = index.get(dataset, {}).get(ticker)
+        if current and date.fromisoformat(current) >= last:
+            return
+        index.setdefault(dataset, {})[ticker] = last.isoformat()
+
+        self.root_path.mkdir(parents=True, exist_ok=True)
+        tmp_path = self.index_path.with_suffix('.tmp')
+        tmp_path.write_text(json.dumps(index, indent=2, sort_keys=True), encoding='utf-8')
+        tmp_path.replace(self.index_path)
+
+
+class S3WatermarkStore:
+    """Watermarks derivados do layout particionado do S3 (3 listagens por ticker)"""
+
+    def __init__(self, bucket: str, prefix: str = "raw", s3_client=None):
+        self.bucket = bucket
+        self.prefix = prefix.strip('/')
+        self.s3_client = s3_client or boto3.client('s3')
+
+    def _max_partition(self, prefix: str) -> tuple[int, str] | None:
+        paginator = self.s3_client.get_paginator('list_objects_v2')
+        best = None
+        for page in paginator.paginate(Bucket=self.bucket, Prefix=prefix, Delimiter='/'):
+            for common in page.get('CommonPrefixes', []):
+                name = common['Prefix'][len(prefix):].rstrip('/')
+                value = _partition_value(name)
+                if value is not None and (best is None or value > best[0]):
+                    best = (value, common['Prefix'])
+        return best
+
+    def _last_date_in_objects(self, prefix: str, parts: tuple[int, ...],
+                              dataset: str, ticker: str) -> date | None:
+        """Partição mês/ano compactada: lê as colunas de data dos objetos do prefixo"""
+        paginator = self.s3_client.get_paginator('list_objects_v2')
+        files = []
+        for page in paginator.paginate(Bucket=self.bucket, Prefix=prefix, Delimiter='/'):
+            for obj in page.get('Contents', []):
+                if obj['Key'].endswith('.parquet'):
+                    body = self.s3_client.get_object(Bucket=self.bucket, Key=obj['Key'])['Body']
+                    files.append(pq.ParquetFile(BytesIO(body.read())))
+        return _last_date_in_files(files, parts, dataset, ticker)
+
+    def last_date(self, dataset: str, ticker: str) -> date | None:
+        """Último dia gravado para (dataset, ticker), ou None se nunca ingerido"""
+        prefix = f"{self.prefix}/dataset={dataset}/ticker={ticker}/"
+        parts = []
+        for level in ('year', 'month', 'day'):
+            found = self._max_partition(prefix)
+            if found is None:
+                if level == 'year':
+                    return None
+                return self._last_date_in_objects(prefix, tuple(parts), dataset, ticker)
+            value, prefix = found
+            parts.append(value)
+        return date(*parts)
+
+    def update(self, dataset: str, ticker: str, last: date) -> None:
+        """No S3 o layout já é o estado; nada a registrar"""
+
+
+def _last_date_in_files(files: list[pq.ParquetFile], parts: tuple[int, ...],
+                        dataset: str, ticker: str) -> date | None:
+    """
+    Maior data do (dataset, ticker) nos arquivos de uma partição.
+    `parts` são os valores year/month/day do caminho; os níveis que faltam
+    (arquivos compactados por mês ou ano) vêm das colunas month/day do arquivo.
+    """
+    levels = ('year', 'month', 'day')[len(parts):]
+    best = None
+    for parquet_file in files:
+        columns = parquet_file.schema_arrow.names
+        if 'ticker' not in columns or any(level not in columns for level in levels):
+            continue
+        read_cols = ['ticker', *levels] + (['dataset'] if 'dataset' in columns else [])
+        table = parquet_file.read(columns=read_cols)
+        mask = pc.equal(table['ticker'], ticker)
+        if 'dataset' in read_cols:
+            mask = pc.and_(mask, pc.equal(table['dataset'], dataset))
+        table = table.filter(mask)
+        if table.num_rows == 0:
+            continue
+        if not levels:
+            return date(*parts)
+        table = table.sort_by([(level, 'descending') for level in levels])
+        last = parts + tuple(table[level][0].as_py() for level in levels)
+        best = max(best, last) if best else last
+    return date(*best) if best else None
+
+
+def next_start_date(start_date: str, last: date | None) -> str:
+    """
+    Início efetivo da extração: o próprio dia do watermark, se posterior a start_date.
+
+    O dia do watermark é buscado de novo: se foi gravado com o pregão ainda em
+    formação, o fechamento definitivo substitui a barra parcial (as escritas
+    por dia sobrescrevem a partição).
+    """
+    if last is None:
+        return start_date
+    return max(start_date, last.isoformat())
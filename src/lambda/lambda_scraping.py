@@ -4,54 +4,139 @@
 - R2: ingestão em S3 RAW em formato Parquet com partição diária
 
 Escreve Parquet diretamente em `raw/` para manter o pipeline simples e aderente ao Tech Challenge.
+
+Cold start: sem pandas nem requests (só pyarrow empacotado; boto3 e urllib3 já
+vêm no runtime). Cliente S3 e pool HTTP são criados uma vez no escopo do módulo
+e reaproveitados nas invocações "quentes". Medição: scripts/measure_lambda_cold_start.py
 """
 
+import hashlib
 import json
 import logging
 import os
-from datetime import datetime
-from io import BytesIO
+import threading
+import time
 
 import boto3
-import pandas as pd
-import requests
+import numpy as np
+import pyarrow as pa
+import pyarrow.compute as pc
+import pyarrow.parquet as pq
+import urllib3
+from botocore.exceptions import ClientError
 
 logger = logging.getLogger()
 logger.setLevel(logging.INFO)
 
 
-def fetch_brapi_data(ticker: str, days: int = 30) -> list:
+class _TokenBucket:
     """
-    Busca dados da BRAPI.DEV API
-    Retorna lista de dicts
+    Rate limiter mínimo para a BRAPI (mesma lógica de ingestion/rate_limit.py;
+    a Lambda é empacotada sem o pacote src/ingestion).
+
+    Vive no escopo do módulo: é compartilhado entre threads e entre invocações
+    "quentes" do mesmo container.
     """
-    logger.info(f"Fetching data for {ticker} from BRAPI.DEV")
-    
+
+    def __init__(self, rate_per_second: float, burst: int = 1):
+        self.rate = rate_per_second
+        self.burst = max(1, burst)
+        self._tokens = float(self.burst)
+        self._updated_at = time.monotonic()
+        self._lock = threading.Lock()
+        self.requests = 0
+        self.total_wait = 0.0
+        self.max_wait = 0.0
+
+    def acquire(self) -> float:
+        with self._lock:
+            now = time.monotonic()
+            self._tokens = min(float(self.burst), self._tokens + (now - self._updated_at) * self.rate)
+            self._updated_at = now
+            self._tokens -= 1
+            wait = max(0.0, -self._tokens / self.rate)
+            self.requests += 1
+            self.total_wait += wait
+            self.max_wait = max(self.max_wait, wait)
+        if wait > 0:
+            time.sleep(wait)
+        return wait
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "requests": self.requests,
+                "total_wait_s": round(self.total_wait, 3),
+                "max_wait_s": round(self.max_wait, 3),
+            }
+
+
+# BRAPI_RPS vazio = sem controle de ritmo
+_BRAPI_LIMITER = (
+    _TokenBucket(float(os.environ["BRAPI_RPS"]), int(os.environ.get("BRAPI_BURST", "1")))
+    if os.environ.get("BRAPI_RPS")
+    else None
+)
+
+
+# Clientes do escopo do módulo: criados no init e reaproveitados entre invocações
+_S3 = boto3.client("s3")
+_HTTP = urllib3.PoolManager(
+    timeout=urllib3.Timeout(total=30),
+    retries=False,
+    headers={"Accept": "application/json"},
+)
+
+
+class BrapiHTTPError(Exception):
+    """Resposta HTTP de erro da BRAPI (status disponível para decidir retry)"""
+
+    def __init__(self, status: int, url: str):
+        super().__init__(f"HTTP {status} for {url}")
+        self.status = status
+
+
+def _brapi_get(url: str) -> dict:
+    if _BRAPI_LIMITER is not None:
+        _BRAPI_LIMITER.acquire()
+    response = _HTTP.request("GET", url)
+    if response.status >= 400:
+        raise BrapiHTTPError(response.status, url)
+    return json.loads(response.data)
+
+
+def _brapi_range(days: int) -> str:
     # BRAPI suporta: 1d, 5d, 1mo, 3mo, 6mo, 1y, 2y, 5y, 10y, ytd, max
     if days <= 5:
-        range_param = f"{days}d"
+        return f"{days}d"
     elif days <= 30:
-        range_param = "1mo"
+        return "1mo"
     elif days <= 90:
-        range_param = "3mo"
+        return "3mo"
     elif days <= 180:
-        range_param = "6mo"
+        return "6mo"
     elif days <= 365:
-        range_param = "1y"
-    else:
-        range_param = "max"
+        return "1y"
+    return "max"
+
+
+def fetch_brapi_data(ticker: str, days: int = 30) -> list:
+    """
+    Busca dados da BRAPI.DEV API
+    Retorna lista de dicts
+    """
+    logger.info(f"Fetching data for {ticker} from BRAPI.DEV")
+    
+    range_param = _brapi_range(days)
     
     # interval=1d necessário para obter historicalDataPrice
     url = f"https://brapi.dev/api/quote/{ticker}?range={range_param}&interval=1d"
-    headers = {"Accept": "application/json"}
     
     # Retry logic
     max_retries = 3
     for attempt in range(max_retries):
         try:
-            response = requests.get(url, headers=headers, timeout=30)
-            response.raise_for_status()
-            data = response.json()
+            data = _brapi_get(url)
             
             # Estrutura: {"results": [{"symbol": "PETR4", "historicalDataPrice": [...]}]}
             if "results" in data and len(data["results"]) > 0:
@@ -62,7 +147,7 @@ def fetch_brapi_data(ticker: str, days: int = 30) -> list:
                 logger.warning(f"No data in response: {data}")
                 return []
                 
-        except requests.exceptions.RequestException as e:
+        except (BrapiHTTPError, urllib3.exceptions.HTTPError, ValueError) as e:
             logger.warning(f"Attempt {attempt + 1}/{max_retries} failed: {e}")
             if attempt == max_retries - 1:
                 raise
@@ -70,140 +155,397 @@ def fetch_brapi_data(ticker: str, days: int = 30) -> list:
     return []
 
 
-def prepare_records(raw_data: list, ticker: str) -> list[dict]:
+def fetch_brapi_data_batch(tickers: list[str], days: int = 30, batch_size: int = 10) -> dict[str, list]:
     """
-    Transforma dados brutos em formato padronizado.
-    Retorna lista de dicts com colunas: Date, Open, High, Low, Close, Volume, ticker
+    Busca vários tickers na BRAPI.DEV com uma requisição por lote
+    (símbolos separados por vírgula) e separa `results` por ticker.
+
+    Falhas parciais: símbolos ausentes no `results` ficam fora do retorno; se o
+    lote inteiro falhar, ele é dividido ao meio até isolar o símbolo problemático.
+    Retorna dict ticker -> lista de dicts (mesmo formato de fetch_brapi_data).
     """
-    records = []
-    
-    for item in raw_data:
-        try:
-            # Timestamp UNIX → datetime
-            timestamp = item.get("date")
-            if timestamp:
-                dt = datetime.fromtimestamp(timestamp)
-                date_str = dt.strftime("%Y-%m-%d")
-                
-                record = {
-                    "Date": date_str,
-                    "Open": item.get("open", 0),
-                    "High": item.get("high", 0),
-                    "Low": item.get("low", 0),
-                    "Close": item.get("close", 0),
-                    "Volume": item.get("volume", 0),
-                    "ticker": ticker.lower()
-                }
-                records.append(record)
-        except Exception as e:
-            logger.warning(f"Error processing record: {e}")
-            continue
-    
-    return records
+    range_param = _brapi_range(days)
+    fetched: dict[str, list] = {}
 
+    def _fetch(symbols: list[str]) -> None:
+        url = f"https://brapi.dev/api/quote/{','.join(symbols)}?range={range_param}&interval=1d"
 
-def save_to_s3_parquet(records: list[dict], bucket: str, dataset: str, ticker: str) -> list[str]:
-    """Salva Parquet particionado por data em raw/ (R2)."""
+        max_retries = 3
+        for attempt in range(max_retries):
+            try:
+                results = _brapi_get(url).get("results") or []
+                break
+            except (BrapiHTTPError, urllib3.exceptions.HTTPError, ValueError) as e:
+                logger.warning(f"Batch {symbols} attempt {attempt + 1}/{max_retries} failed: {e}")
+                status = getattr(e, "status", None)
+                client_error = status is not None and 400 <= status < 500 and status != 429
+                if client_error or attempt == max_retries - 1:
+                    if len(symbols) > 1:
+                        middle = len(symbols) // 2
+                        _fetch(symbols[:middle])
+                        _fetch(symbols[middle:])
+                    return
+
+        for item in results:
+            symbol = str(item.get("symbol", "")).upper()
+            historical = item.get("historicalDataPrice") or []
+            if symbol in symbols and historical:
+                fetched[symbol] = historical
+
+    tickers = [t.upper() for t in tickers]
+    for i in range(0, len(tickers), batch_size):
+        _fetch(tickers[i:i + batch_size])
+
+    missing = [t for t in tickers if t not in fetched]
+    logger.info(f"Fetched {len(fetched)}/{len(tickers)} tickers in batches of {batch_size}")
+    if missing:
+        logger.warning(f"No data for: {', '.join(missing)}")
+
+    return fetched
+
+
+# Schema do payload BRAPI (historicalDataPrice) decodificado direto em Arrow
+_PAYLOAD_SCHEMA = pa.schema([
+    ("date", pa.int64()),
+    ("open", pa.float64()),
+    ("high", pa.float64()),
+    ("low", pa.float64()),
+    ("close", pa.float64()),
+    ("volume", pa.float64()),
+])
+
+
+# Cópia do contrato do raw (src/ingestion/raw_schema.py): a Lambda é empacotada
+# como arquivo único. Mudou lá, muda aqui (mesma RAW_SCHEMA_VERSION).
+RAW_SCHEMA_VERSION = 1
+RAW_SCHEMA = pa.schema(
+    [
+        ("Date", pa.date32()),
+        ("Open", pa.float64()),
+        ("High", pa.float64()),
+        ("Low", pa.float64()),
+        ("Close", pa.float64()),
+        ("Adj Close", pa.float64()),
+        ("Volume", pa.float64()),
+        ("ticker", pa.string()),
+        ("dataset", pa.string()),
+        ("extraction_timestamp", pa.string()),
+        ("data_source", pa.string()),
+    ],
+    metadata={b"raw_schema_version": str(RAW_SCHEMA_VERSION).encode()},
+)
+
+
+def prepare_records(raw_data: list, ticker: str) -> pa.Table:
+    """
+    Transforma dados brutos em uma tabela Arrow no contrato do raw (RAW_SCHEMA).
+    Date (date32), preços e Volume (float64), ticker; dataset/extraction_timestamp nulos
+    """
+    payload = pa.Table.from_pylist(raw_data, schema=_PAYLOAD_SCHEMA)
+
+    # Itens sem timestamp são descartados
+    payload = payload.filter(pc.fill_null(pc.greater(payload["date"], 0), False))
+
+    n_rows = payload.num_rows
+    return pa.Table.from_arrays([
+        payload["date"].cast(pa.timestamp("s")).cast(pa.date32()),
+        payload["open"],
+        payload["high"],
+        payload["low"],
+        payload["close"],
+        # Adj Close igual Close (mesma simplificação do extrator)
+        payload["close"],
+        payload["volume"],
+        pa.repeat(ticker.lower(), n_rows),
+        pa.nulls(n_rows, pa.string()),
+        # Fixo (sem horário de extração): mantém o fingerprint estável entre execuções
+        pa.nulls(n_rows, pa.string()),
+        pa.repeat("brapi_lambda", n_rows),
+    ], schema=RAW_SCHEMA)
+
+
+def _partition_slices(table: pa.Table):
+    """
+    Itera (data, fatia) por valor de Date: ordena uma vez (se preciso) e
+    devolve fatias zero-copy da tabela ordenada.
+    """
+    if table.num_rows == 0:
+        return
+
+    dates = table["Date"].combine_chunks()
+    if table.num_rows > 1 and not pc.all(pc.greater_equal(dates[1:], dates[:-1])).as_py():
+        table = table.sort_by("Date")
+        dates = table["Date"].combine_chunks()
+
+    changed = pc.not_equal(dates[1:], dates[:-1]).to_numpy(zero_copy_only=False)
+    bounds = [0, *(np.flatnonzero(changed) + 1).tolist(), table.num_rows]
+    for start, end in zip(bounds[:-1], bounds[1:]):
+        yield dates[start].as_py(), table.slice(start, end - start)
 
-    s3_client = boto3.client("s3")
-    ticker_normalized = ticker.lower()
 
-    by_date: dict[str, list[dict]] = {}
-    for record in records:
-        by_date.setdefault(record["Date"], []).append(record)
+# Mesma chave de metadata de ingestion/s3_uploader.py (fingerprint do conteúdo)
+FINGERPRINT_METADATA_KEY = "content-sha256"
+
+# Índice de fingerprints por (dataset, ticker): fora de raw/, não dispara o trigger do Glue
+STATE_PREFIX = "_state/lambda_scraping"
+
+
+def content_fingerprint(table: pa.Table) -> str:
+    """sha256 dos dados da partição (IPC normalizado: independe do offset da fatia)"""
+    table = table.replace_schema_metadata(None)
+    table = table.take(pa.array(range(table.num_rows), pa.int64()))
+    sink = pa.BufferOutputStream()
+    with pa.ipc.new_stream(sink, table.schema) as writer:
+        writer.write_table(table)
+    return hashlib.sha256(sink.getvalue().to_pybytes()).hexdigest()
+
+
+def _state_key(dataset: str, ticker_normalized: str) -> str:
+    return f"{STATE_PREFIX}/dataset={dataset}/ticker={ticker_normalized}.json"
+
+
+def _load_state(bucket: str, key: str) -> dict:
+    try:
+        body = _S3.get_object(Bucket=bucket, Key=key)["Body"].read()
+    except ClientError as e:
+        if e.response.get("Error", {}).get("Code") in ("NoSuchKey", "404"):
+            return {}
+        raise
+    return json.loads(body)
+
+
+def _stored_fingerprint(bucket: str, key: str) -> str | None:
+    """Fingerprint na metadata do objeto (sem índice: primeira execução ou índice perdido)"""
+    try:
+        head = _S3.head_object(Bucket=bucket, Key=key)
+    except ClientError as e:
+        if e.response.get("Error", {}).get("Code") in ("404", "NoSuchKey", "NotFound"):
+            return None
+        raise
+    return head.get("Metadata", {}).get(FINGERPRINT_METADATA_KEY)
+
+
+def save_to_s3_parquet(table: pa.Table, bucket: str, dataset: str, ticker: str) -> list[str]:
+    """
+    Salva Parquet particionado por data em raw/ (R2), apenas dias novos ou alterados.
+
+    Cada partição tem um fingerprint do conteúdo, guardado na metadata do objeto e
+    num índice por ticker (1 GET por execução). Dias idênticos ao já gravado não
+    geram PUT (nem evento S3 / execução do Glue).
+    """
+
+    ticker_normalized = ticker.lower()
+    state_key = _state_key(dataset, ticker_normalized)
+    state = _load_state(bucket, state_key)
+    state_changed = False
 
     uploaded_files: list[str] = []
-    for date_str, group in by_date.items():
-        dt = datetime.strptime(date_str, "%Y-%m-%d")
-
-        df = pd.DataFrame(group)
-
-        # Tipos consistentes (evita schema drift entre dias)
-        df["Date"] = df["Date"].astype(str)
-        for col_name in ["Open", "High", "Low", "Close", "Volume"]:
-            df[col_name] = pd.to_numeric(df[col_name], errors="coerce").astype("float64")
-        df["ticker"] = df["ticker"].astype(str)
-
-        parquet_buffer = BytesIO()
-        df.to_parquet(
-            parquet_buffer,
-            engine="pyarrow",
-            compression="snappy",
-            index=False,
-        )
-        parquet_buffer.seek(0)
+    skipped = 0
+    for day_date, group in _partition_slices(table):
+        year, month, day = day_date.isoformat().split("-")
 
         s3_key = (
             f"raw/dataset={dataset}/ticker={ticker_normalized}/"
-            f"year={dt.year}/month={dt.month:02d}/day={dt.day:02d}/data.parquet"
+            f"year={year}/month={month}/day={day}/data.parquet"
         )
 
-        s3_client.put_object(
+        fingerprint = content_fingerprint(group)
+        if s3_key not in state and _stored_fingerprint(bucket, s3_key) == fingerprint:
+            state[s3_key] = fingerprint
+            state_changed = True
+        if state.get(s3_key) == fingerprint:
+            skipped += 1
+            continue
+
+        parquet_buffer = pa.BufferOutputStream()
+        pq.write_table(group, parquet_buffer, compression="snappy")
+
+        _S3.put_object(
             Bucket=bucket,
             Key=s3_key,
-            Body=parquet_buffer.getvalue(),
+            Body=parquet_buffer.getvalue().to_pybytes(),
             ContentType="application/x-parquet",
+            Metadata={FINGERPRINT_METADATA_KEY: fingerprint},
         )
+        state[s3_key] = fingerprint
+        state_changed = True
 
         uploaded_files.append(s3_key)
-        logger.info(f"Uploaded Parquet: s3://{bucket}/{s3_key} ({len(group)} records)")
+        logger.info(f"Uploaded Parquet: s3://{bucket}/{s3_key} ({group.num_rows} records)")
+
+    if state_changed:
+        _S3.put_object(
+            Bucket=bucket,
+            Key=state_key,
+            Body=json.dumps(state, sort_keys=True).encode("utf-8"),
+            ContentType="application/json",
+        )
+    logger.info(f"{ticker_normalized}: {len(uploaded_files)} partitions written, {skipped} unchanged")
 
     return uploaded_files
 
 
+def _parse_ticker_list(value) -> list[str]:
+    """Lista, texto separado por vírgula ou um por linha (# comenta) → tickers únicos em ordem"""
+    if isinstance(value, str):
+        value = [part for line in value.splitlines()
+                 for part in line.split("#", 1)[0].split(",")]
+    tickers: list[str] = []
+    for item in value or []:
+        ticker = str(item).strip().upper().replace(".SA", "")
+        if ticker and ticker not in tickers:
+            tickers.append(ticker)
+    return tickers
+
+
+def _read_s3_text(uri: str) -> str:
+    bucket, _, key = uri[len("s3://"):].partition("/")
+    return _S3.get_object(Bucket=bucket, Key=key)["Body"].read().decode("utf-8")
+
+
+def resolve_universe(event: dict) -> tuple[list[str], str]:
+    """
+    Universo de tickers, na ordem de precedência:
+    event["tickers"] → event["tickers_s3_uri"] / env TICKERS_S3_URI (arquivo no S3)
+    → env TICKERS → env TICKER (modo legado, um ticker)
+
+    Returns:
+        (tickers, origem): origem "legacy" só no modo TICKER/DATASET
+    """
+    if event.get("tickers"):
+        return _parse_ticker_list(event["tickers"]), "event"
+    uri = event.get("tickers_s3_uri") or os.environ.get("TICKERS_S3_URI")
+    if uri:
+        return _parse_ticker_list(_read_s3_text(uri)), "s3"
+    if os.environ.get("TICKERS"):
+        return _parse_ticker_list(os.environ["TICKERS"]), "env"
+    return _parse_ticker_list([os.environ.get("TICKER", "PETR4")]), "legacy"
+
+
+_LAMBDA_CLIENT = None
+
+
+def _lambda_client():
+    """Cliente Lambda só no coordenador (workers não pagam a criação no cold start)"""
+    global _LAMBDA_CLIENT
+    if _LAMBDA_CLIENT is None:
+        _LAMBDA_CLIENT = boto3.client("lambda")
+    return _LAMBDA_CLIENT
+
+
+def dispatch_shards(tickers: list[str], shard_size: int, function_name: str, days: int) -> list[dict]:
+    """Divide o universo em shards e dispara uma invocação assíncrona (worker) por shard"""
+    shards = [tickers[i:i + shard_size] for i in range(0, len(tickers), shard_size)]
+    dispatched = []
+    for index, shard in enumerate(shards):
+        payload = {"shard": {"index": index, "count": len(shards), "tickers": shard}, "days": days}
+        response = _lambda_client().invoke(
+            FunctionName=function_name,
+            InvocationType="Event",
+            Payload=json.dumps(payload).encode("utf-8"),
+        )
+        dispatched.append({"index": index, "tickers": len(shard), "status": response.get("StatusCode")})
+        logger.info(f"Shard {index + 1}/{len(shards)} dispatched ({len(shard)} tickers)")
+    return dispatched
+
+
+def process_tickers(tickers: list[str], bucket: str, days: int, dataset: str = None) -> dict:
+    """
+    Busca, transforma e grava os tickers (um worker ou o modo legado).
+    dataset=None: cada ticker no próprio dataset (ex: petr4).
+    """
+    if len(tickers) == 1:
+        raw_data = fetch_brapi_data(tickers[0], days)
+        fetched = {tickers[0]: raw_data} if raw_data else {}
+    else:
+        fetched = fetch_brapi_data_batch(tickers, days, int(os.environ.get("BRAPI_BATCH_SIZE", "10")))
+
+    uploaded_files: list[str] = []
+    for ticker, raw_data in fetched.items():
+        table = prepare_records(raw_data, ticker)
+        logger.info(f"{ticker}: processing {table.num_rows} records")
+        # Parquet direto no RAW
+        uploaded_files.extend(save_to_s3_parquet(table, bucket, dataset or ticker.lower(), ticker))
+
+    return {
+        "tickers": len(tickers),
+        "tickers_with_data": len(fetched),
+        "missing": [t for t in tickers if t not in fetched],
+        "files_uploaded": len(uploaded_files),
+        "s3_keys": uploaded_files,
+    }
+
+
 def lambda_handler(event, context):
     """
     Lambda handler - executado pelo EventBridge Schedule
+
+    - Coordenador (evento do schedule): resolve o universo; se couber em um
+      shard (SHARD_SIZE), processa direto; senão dispara um worker por shard
+    - Worker (evento com "shard"): processa apenas os tickers do shard
     """
     logger.info("="*70)
     logger.info("LAMBDA SCRAPING B3 - INICIANDO (LIGHTWEIGHT)")
     logger.info(f"Event: {json.dumps(event)}")
     logger.info("="*70)
     
+    event = event or {}
+    
     # Configurações (via environment variables ou event)
-    ticker = os.environ.get('TICKER', 'PETR4')
-    dataset = os.environ.get('DATASET', 'petr4')
     bucket = os.environ.get('S3_BUCKET')
-    days = int(os.environ.get('DAYS', '30'))
+    days = int(event.get('days') or os.environ.get('DAYS', '30'))
+    shard_size = int(os.environ.get('SHARD_SIZE', '50'))
     
     if not bucket:
         raise ValueError("S3_BUCKET environment variable not set")
     
-    logger.info(f"Config: ticker={ticker}, dataset={dataset}, bucket={bucket}, days={days}")
-    
     try:
-        # 1. Fetch data
-        raw_data = fetch_brapi_data(ticker, days)
-        
-        if not raw_data:
-            logger.warning("No data fetched from API")
-            return {
-                "statusCode": 200,
-                "body": json.dumps({
-                    "message": "No new data available",
-                    "files_uploaded": 0
-                })
-            }
-        
-        # 2. Transform
-        records = prepare_records(raw_data, ticker)
-        logger.info(f"Processing {len(records)} records")
+        if "shard" in event:
+            shard = event["shard"]
+            tickers = _parse_ticker_list(shard["tickers"])
+            logger.info(f"Worker: shard {shard.get('index', 0) + 1}/{shard.get('count', 1)} "
+                        f"({len(tickers)} tickers), days={days}")
+            result = process_tickers(tickers, bucket, days)
+        else:
+            tickers, source = resolve_universe(event)
+            if not tickers:
+                raise ValueError("Empty ticker universe")
+            
+            if len(tickers) > shard_size:
+                function_name = os.environ.get('WORKER_FUNCTION_NAME') or context.function_name
+                logger.info(f"Coordinator: {len(tickers)} tickers in shards of {shard_size} → {function_name}")
+                dispatched = dispatch_shards(tickers, shard_size, function_name, days)
+                return {
+                    "statusCode": 202,
+                    "body": json.dumps({
+                        "message": "Universe dispatched to shard workers",
+                        "tickers": len(tickers),
+                        "shards": len(dispatched),
+                    })
+                }
+            
+            # Universo pequeno: processa aqui mesmo. DATASET só vale no modo legado
+            # (env TICKER); nos demais cada ticker vai para o próprio dataset
+            dataset = os.environ.get('DATASET', 'petr4') if source == "legacy" else None
+            logger.info(f"Config: tickers={tickers}, dataset={dataset or 'per-ticker'}, "
+                        f"bucket={bucket}, days={days}")
+            result = process_tickers(tickers, bucket, days, dataset)
         
-        # 3. Save to S3 (Parquet direto no RAW)
-        uploaded_files = save_to_s3_parquet(records, bucket, dataset, ticker)
+        if _BRAPI_LIMITER is not None:
+            logger.info(f"BRAPI rate limit: {_BRAPI_LIMITER.stats()}")
         
         logger.info("="*70)
         logger.info("LAMBDA SCRAPING B3 - CONCLUÍDO COM SUCESSO")
-        logger.info(f"Files uploaded: {len(uploaded_files)}")
+        logger.info(f"Files uploaded: {result['files_uploaded']}")
         logger.info("="*70)
         
+        if not result["tickers_with_data"]:
+            message = "No new data available"
+        else:
+            message = "Data scraped and uploaded to RAW (Parquet) successfully"
         return {
             "statusCode": 200,
-            "body": json.dumps({
-                "message": "Data scraped and uploaded to RAW (Parquet) successfully",
-                "files_uploaded": len(uploaded_files),
-                "s3_keys": uploaded_files
-            })
+            "body": json.dumps({"message": message, **result})
         }
         
     except Exception as e:
@@ -2,21 +2,54 @@
 Lambda function para acionar Glue Job
 Acionada via S3 Event Notification (ObjectCreated)
 Atende Requisito R3: Lambda aciona job ETL no Glue
+
+Coalescência dos eventos por (dataset, ticker):
+- Cada evento S3 só registra a data alterada (year=/month=/day=) num estado
+  pendente; um backfill ou uma carga de 30 dias vira um único job run
+- O run é iniciado quando a primeira alteração pendente tem mais de
+  COALESCE_WINDOW_SECONDS; as chaves vencidas de um dataset vão num único run
+  (--TICKERS=a,b,c), com as datas de cada ticker em --CHANGED_DATES=a:data,b:data
+- Se já há um run em andamento para a chave, as novas datas ficam na fila e
+  viram um run de follow-up quando ele terminar
+- Flush: no próprio evento S3 (janela 0), por agendamento (EventBridge) e no
+  evento "Glue Job State Change" (run terminou; runs com falha voltam à fila)
+
+Estado plugável: DynamoDB (TRIGGER_STATE_TABLE) ou em memória (testes / sem tabela).
 """
 
 import json
 import logging
 import os
+import threading
+import time
 from datetime import datetime
 from urllib.parse import unquote_plus
 
 import boto3
+from botocore.exceptions import ClientError
 
 logger = logging.getLogger()
 logger.setLevel(logging.INFO)
 
 glue_client = boto3.client('glue')
 
+# Prefixo dos arquivos gerados por src/ingestion/compact_partitions.py
+COMPACTED_PREFIX = "compacted-"
+
+# Data sentinela: alteração sem day= no caminho (ex: arquivo fora do layout) -> reprocessar tudo
+ALL_DATES = "*"
+
+# Run reservado (claim) mas ainda sem JobRunId: em andamento por até CLAIM_TTL_SECONDS
+STARTING_RUN_ID = "starting"
+CLAIM_TTL_SECONDS = 900
+
+IN_FLIGHT_STATES = {"STARTING", "RUNNING", "STOPPING", "WAITING"}
+FAILED_STATES = {"FAILED", "TIMEOUT", "ERROR", "STOPPED"}
+
+
+def _now() -> float:
+    return time.time()
+
 
 def _extract_partition_value(key: str, partition_name: str) -> str | None:
     needle = f"{partition_name}="
@@ -27,80 +60,434 @@ def _extract_partition_value(key: str, partition_name: str) -> str | None:
     return None
 
 
+def _changed_date(key: str) -> str:
+    """YYYY-MM-DD a partir de year=/month=/day= (ALL_DATES se o caminho não tiver o dia)"""
+    year = _extract_partition_value(key, "year")
+    month = _extract_partition_value(key, "month")
+    day = _extract_partition_value(key, "day")
+    if not (year and month and day):
+        return ALL_DATES
+    return f"{int(year):04d}-{int(month):02d}-{int(day):02d}"
+
+
+def state_key(dataset: str, ticker: str) -> str:
+    return f"{dataset}#{ticker}"
+
+
+class InMemoryTriggerStore:
+    """
+    Estado de coalescência em memória (testes e execução sem DynamoDB).
+
+    Item por chave: pending (datas), first_event_at, run_id, run_started_at,
+    inflight (datas do run atual) e version (controle otimista de concorrência).
+    """
+
+    def __init__(self):
+        self._items: dict[str, dict] = {}
+        self._lock = threading.Lock()
+
+    def add_changes(self, key: str, dates: set[str], now: float) -> None:
+        with self._lock:
+            item = self._items.setdefault(key, {'pending': set(), 'version': 0})
+            item['pending'] |= set(dates)
+            item.setdefault('first_event_at', now)
+            item['version'] += 1
+
+    def get(self, key: str) -> dict | None:
+        with self._lock:
+            item = self._items.get(key)
+            if item is None:
+                return None
+            return {**item, 'pending': set(item['pending']), 'inflight': set(item.get('inflight', ()))}
+
+    def pending_keys(self) -> list[str]:
+        """Chaves com datas pendentes ou com reserva (claim) ainda sem JobRunId"""
+        with self._lock:
+            return sorted(key for key, item in self._items.items()
+                          if item['pending'] or item.get('run_id') == STARTING_RUN_ID)
+
+    def claim(self, key: str, version: int, now: float) -> bool:
+        """Reserva o run: move pending -> inflight se ninguém alterou o item desde a leitura"""
+        with self._lock:
+            item = self._items.get(key)
+            if item is None or item['version'] != version:
+                return False
+            item['inflight'] = item['pending']
+            item['pending'] = set()
+            item.pop('first_event_at', None)
+            item['run_id'] = STARTING_RUN_ID
+            item['run_started_at'] = now
+            item['version'] += 1
+            return True
+
+    def set_run(self, key: str, run_id: str) -> None:
+        with self._lock:
+            self._items[key]['run_id'] = run_id
+
+    def release(self, key: str, dates: set[str], now: float, run_id: str = None) -> bool:
+        """Devolve datas à fila e libera o run (se run_id for informado, só se ainda for o atual)"""
+        with self._lock:
+            item = self._items.get(key)
+            if item is None or (run_id is not None and item.get('run_id') != run_id):
+                return False
+            item['pending'] |= set(dates)
+            item.setdefault('first_event_at', now)
+            for field in ('run_id', 'run_started_at', 'inflight'):
+                item.pop(field, None)
+            item['version'] += 1
+            return True
+
+
+# Nomes de atributo via placeholder (evita colisão com palavras reservadas do DynamoDB)
+_NAMES = {'#version': 'version'}
+
+
+class DynamoDBTriggerStore:
+    """Mesmo contrato do InMemoryTriggerStore numa tabela DynamoDB (hash key 'pk')"""
+
+    def __init__(self, table_name: str, client=None):
+        self.table_name = table_name
+        self.client = client or boto3.client('dynamodb')
+
+    def add_changes(self, key: str, dates: set[str], now: float) -> None:
+        self.client.update_item(
+            TableName=self.table_name,
+            Key={'pk': {'S': key}},
+            UpdateExpression="ADD pending :dates, #version :one "
+                             "SET first_event_at = if_not_exists(first_event_at, :now)",
+            ExpressionAttributeNames=_NAMES,
+            ExpressionAttributeValues={
+                ':dates': {'SS': sorted(dates)},
+                ':one': {'N': '1'},
+                ':now': {'N': str(now)},
+            },
+        )
+
+    def get(self, key: str) -> dict | None:
+        response = self.client.get_item(TableName=self.table_name, Key={'pk': {'S': key}},
+                                        ConsistentRead=True)
+        raw = response.get('Item')
+        if raw is None:
+            return None
+        item = {
+            'pending': set(raw.get('pending', {}).get('SS', [])),
+            'inflight': set(raw.get('inflight', {}).get('SS', [])),
+            'version': int(raw['version']['N']),
+        }
+        for field in ('first_event_at', 'run_started_at'):
+            if field in raw:
+                item[field] = float(raw[field]['N'])
+        if 'run_id' in raw:
+            item['run_id'] = raw['run_id']['S']
+        return item
+
+    def pending_keys(self) -> list[str]:
+        keys = []
+        paginator = self.client.get_paginator('scan')
+        for page in paginator.paginate(TableName=self.table_name, ProjectionExpression='pk',
+                                       FilterExpression='attribute_exists(pending) OR run_id = :starting',
+                                       ExpressionAttributeValues={':starting': {'S': STARTING_RUN_ID}}):
+            keys.extend(item['pk']['S'] for item in page.get('Items', []))
+        return sorted(keys)
+
+    def claim(self, key: str, version: int, now: float) -> bool:
+        item = self.get(key)
+        if item is None or item['version'] != version or not item['pending']:
+            return False
+        try:
+            self.client.update_item(
+                TableName=self.table_name,
+                Key={'pk': {'S': key}},
+                UpdateExpression="SET inflight = :dates, run_id = :starting, run_started_at = :now "
+                                 "REMOVE pending, first_event_at ADD #version :one",
+                ConditionExpression="#version = :version",
+                ExpressionAttributeNames=_NAMES,
+                ExpressionAttributeValues={
+                    ':dates': {'SS': sorted(item['pending'])},
+                    ':starting': {'S': STARTING_RUN_ID},
+                    ':now': {'N': str(now)},
+                    ':one': {'N': '1'},
+                    ':version': {'N': str(version)},
+                },
+            )
+        except ClientError as e:
+            if e.response.get('Error', {}).get('Code') == 'ConditionalCheckFailedException':
+                return False
+            raise
+        return True
+
+    def set_run(self, key: str, run_id: str) -> None:
+        self.client.update_item(
+            TableName=self.table_name,
+            Key={'pk': {'S': key}},
+            UpdateExpression="SET run_id = :run_id",
+            ExpressionAttributeValues={':run_id': {'S': run_id}},
+        )
+
+    def release(self, key: str, dates: set[str], now: float, run_id: str = None) -> bool:
+        values = {':one': {'N': '1'}, ':now': {'N': str(now)}}
+        update = "SET first_event_at = if_not_exists(first_event_at, :now) " \
+                 "REMOVE run_id, run_started_at, inflight ADD #version :one"
+        if dates:
+            update += ", pending :dates"
+            values[':dates'] = {'SS': sorted(dates)}
+        kwargs = {}
+        if run_id is not None:
+            kwargs['ConditionExpression'] = "run_id = :run_id"
+            values[':run_id'] = {'S': run_id}
+        try:
+            self.client.update_item(TableName=self.table_name, Key={'pk': {'S': key}},
+                                    UpdateExpression=update, ExpressionAttributeNames=_NAMES,
+                                    ExpressionAttributeValues=values, **kwargs)
+        except ClientError as e:
+            if e.response.get('Error', {}).get('Code') == 'ConditionalCheckFailedException':
+                return False
+            raise
+        return True
+
+
+_STATE_STORE = None
+
+
+def _state_store():
+    """DynamoDB se TRIGGER_STATE_TABLE estiver definido; senão, memória (só coalesce por invocação)"""
+    global _STATE_STORE
+    if _STATE_STORE is None:
+        table_name = os.environ.get('TRIGGER_STATE_TABLE')
+        _STATE_STORE = DynamoDBTriggerStore(table_name) if table_name else InMemoryTriggerStore()
+    return _STATE_STORE
+
+
+def collect_changes(records: list[dict]) -> dict[tuple[str, str], set[str]]:
+    """Agrupa os registros S3 em {(dataset, ticker): datas alteradas}"""
+    changes: dict[tuple[str, str], set[str]] = {}
+    for record in records:
+        bucket = record['s3']['bucket']['name']
+        key = unquote_plus(record['s3']['object']['key'])
+
+        logger.info(f"New object detected: s3://{bucket}/{key}")
+
+        # Verificar se está no path raw/
+        if not key.startswith('raw/'):
+            logger.info(f"Skipping: object not in raw/ path")
+            continue
+
+        # Arquivos da compactação (compact_partitions) só reorganizam dados já processados
+        if key.rsplit('/', 1)[-1].startswith(COMPACTED_PREFIX):
+            logger.info(f"Skipping: compacted file")
+            continue
+
+        # Extrair partições do path (raw/dataset=.../ticker=...)
+        dataset = _extract_partition_value(key, "dataset")
+        ticker = _extract_partition_value(key, "ticker")
+
+        if not dataset or not ticker:
+            logger.warning(
+                "Skipping: could not extract dataset/ticker from key: %s",
+                key,
+            )
+            continue
+
+        changes.setdefault((dataset, ticker), set()).add(_changed_date(key))
+    return changes
+
+
+def _run_in_flight(item: dict, job_name: str, now: float, run_states: dict) -> bool:
+    """run_states: cache {JobRunId: estado} da invocação (um run cobre várias chaves)"""
+    run_id = item.get('run_id')
+    if not run_id:
+        return False
+    if run_id == STARTING_RUN_ID:
+        return now - item.get('run_started_at', 0) < CLAIM_TTL_SECONDS
+    if run_id not in run_states:
+        run_states[run_id] = glue_client.get_job_run(JobName=job_name, RunId=run_id)['JobRun']['JobRunState']
+    return run_states[run_id] in IN_FLIGHT_STATES
+
+
+def _requeue_stale_claim(store, key: str, item: dict, now: float) -> dict | None:
+    """
+    Reserva vencida sem JobRunId (a invocação morreu entre o claim e o set_run):
+    as datas inflight voltam para a fila. Devolve o item relido.
+    """
+    if item.get('run_id') != STARTING_RUN_ID or now - item.get('run_started_at', 0) < CLAIM_TTL_SECONDS:
+        return item
+    if store.release(key, item.get('inflight', set()), item.get('run_started_at', now),
+                     run_id=STARTING_RUN_ID):
+        logger.warning(f"{key}: reserva sem run venceu; {len(item.get('inflight', ()))} datas reenfileiradas")
+    return store.get(key)
+
+
+def _claim_due(store, key: str, job_name: str, window_seconds: float, now: float,
+               run_states: dict) -> tuple[str, dict | None]:
+    """
+    Reserva as datas pendentes da chave, se a janela venceu e não há run em andamento.
+
+    Returns:
+        ('claimed', item lido) ou (motivo, None): 'empty' | 'waiting' | 'queued' | 'contended'
+    """
+    item = store.get(key)
+    if item:
+        item = _requeue_stale_claim(store, key, item, now)
+    if not item or not item['pending']:
+        return 'empty', None
+    if now - item.get('first_event_at', now) < window_seconds:
+        return 'waiting', None
+    if _run_in_flight(item, job_name, now, run_states):
+        logger.info(f"{key}: run {item['run_id']} em andamento; {len(item['pending'])} datas na fila")
+        return 'queued', None
+    if not store.claim(key, item['version'], now):
+        # Outro evento alterou o item (ou outra invocação reservou o run): fica para o próximo flush
+        return 'contended', None
+    return 'claimed', item
+
+
+def format_changed_dates(claimed: dict[str, set[str]]) -> str:
+    """{ticker: datas} -> "ticker:data,..." (--CHANGED_DATES); ticker:* = histórico completo"""
+    pairs = []
+    for ticker, dates in sorted(claimed.items()):
+        pairs.extend(f"{ticker}:{date}" for date in ([ALL_DATES] if ALL_DATES in dates else sorted(dates)))
+    return ",".join(pairs)
+
+
+def flush_dataset(store, dataset: str, keys: list[str], job_name: str, bucket: str,
+                  window_seconds: float, now: float, run_states: dict = None) -> dict[str, str]:
+    """
+    Inicia um único run com todas as chaves vencidas do dataset (custo de início pago uma vez).
+
+    Returns:
+        {chave: JobRunId iniciado, ou 'empty' | 'waiting' | 'queued' | 'contended'}
+    """
+    run_states = {} if run_states is None else run_states
+    results, claimed = {}, {}
+    for key in keys:
+        status, item = _claim_due(store, key, job_name, window_seconds, now, run_states)
+        if item is None:
+            results[key] = status
+        else:
+            claimed[key] = item
+    if not claimed:
+        return results
+
+    tickers = [key.split('#', 1)[1] for key in claimed]
+    changed_dates = format_changed_dates({key.split('#', 1)[1]: item['pending'] for key, item in claimed.items()})
+    try:
+        response = glue_client.start_job_run(
+            JobName=job_name,
+            Arguments={
+                '--S3_BUCKET': bucket,
+                '--DATASET': dataset,
+                '--TICKER': tickers[0],
+                # Só os tickers reservados: não herda um --TICKERS padrão do job
+                '--TICKERS': ",".join(tickers),
+                '--CHANGED_DATES': changed_dates,
+                '--EXECUTION_TIME': datetime.now().isoformat()
+            }
+        )
+    except Exception as e:
+        # Qualquer falha (API, rede, timeout): devolve com o instante original,
+        # a janela dessas datas já venceu
+        for key, item in claimed.items():
+            store.release(key, item['pending'], item.get('first_event_at', now))
+        if isinstance(e, ClientError) and \
+                e.response.get('Error', {}).get('Code') == 'ConcurrentRunsExceededException':
+            logger.info(f"{dataset}: limite de runs simultâneos do job; {len(claimed)} chaves mantidas na fila")
+            results.update({key: 'queued' for key in claimed})
+            return results
+        raise
+
+    job_run_id = response['JobRunId']
+    for key in claimed:
+        store.set_run(key, job_run_id)
+        results[key] = job_run_id
+
+    logger.info(f"✅ Glue Job started successfully!")
+    logger.info(f"   Job Name: {job_name}")
+    logger.info(f"   Job Run ID: {job_run_id}")
+    logger.info(f"   Dataset: {dataset} ({len(tickers)} tickers: {changed_dates})")
+    return results
+
+
+def _requeue_failed_run(store, detail: dict, job_name: str, now: float) -> None:
+    """Run terminou com falha: as datas dele voltam para a fila da chave"""
+    if detail.get('state') not in FAILED_STATES:
+        return
+    run = glue_client.get_job_run(JobName=job_name, RunId=detail['jobRunId'])['JobRun']
+    arguments = run.get('Arguments', {})
+    dataset = arguments.get('--DATASET')
+    tickers = [t for t in (arguments.get('--TICKERS') or arguments.get('--TICKER') or '').split(',') if t]
+    if not dataset:
+        return
+    for ticker in tickers:
+        key = state_key(dataset, ticker)
+        item = store.get(key) or {}
+        if store.release(key, item.get('inflight', set()), item.get('run_started_at', now),
+                         run_id=detail['jobRunId']):
+            logger.warning(f"{key}: run {detail['jobRunId']} terminou em {detail['state']}; datas reenfileiradas")
+
+
 def lambda_handler(event, context):
     """
-    Lambda handler - executado quando novo objeto é criado no S3 raw/
+    Lambda handler - eventos S3 (raw/), agendamento de flush ou "Glue Job State Change"
     """
     logger.info("="*70)
     logger.info("LAMBDA TRIGGER GLUE - INICIANDO")
     logger.info(f"Event: {json.dumps(event)}")
     logger.info("="*70)
-    
+
     # Configurações
     glue_job_name = os.environ.get('GLUE_JOB_NAME')
-    
+
     if not glue_job_name:
         raise ValueError("GLUE_JOB_NAME environment variable is required")
-    
-    # Processar evento S3
+
+    window_seconds = float(os.environ.get('COALESCE_WINDOW_SECONDS', '0'))
+    default_bucket = os.environ.get('S3_BUCKET', '')
+
     try:
-        for record in event['Records']:
-            # Obter informações do objeto S3
-            bucket = record['s3']['bucket']['name']
-            key = unquote_plus(record['s3']['object']['key'])
-            
-            logger.info(f"New object detected: s3://{bucket}/{key}")
-            
-            # Verificar se está no path raw/
-            if not key.startswith('raw/'):
-                logger.info(f"Skipping: object not in raw/ path")
-                continue
-            
-            # Extrair partições do path (raw/dataset=.../ticker=...)
-            dataset = _extract_partition_value(key, "dataset")
-            ticker = _extract_partition_value(key, "ticker")
-
-            if not dataset or not ticker:
-                logger.warning(
-                    "Skipping: could not extract dataset/ticker from key: %s",
-                    key,
-                )
-                continue
-
-            # Iniciar Glue Job
-            response = glue_client.start_job_run(
-                JobName=glue_job_name,
-                Arguments={
-                    '--S3_BUCKET': bucket,
-                    '--DATASET': dataset,
-                    '--TICKER': ticker,
-                    '--S3_KEY': key,
-                    '--EXECUTION_TIME': datetime.now().isoformat()
-                }
-            )
-            
-            job_run_id = response['JobRunId']
-            
-            logger.info(f"✅ Glue Job started successfully!")
-            logger.info(f"   Job Name: {glue_job_name}")
-            logger.info(f"   Job Run ID: {job_run_id}")
-            logger.info(f"   Trigger: s3://{bucket}/{key}")
-        
+        store = _state_store()
+        now = _now()
+        buckets: dict[str, str] = {}
+
+        if 'Records' in event:
+            changes = collect_changes(event['Records'])
+            for (dataset, ticker), dates in changes.items():
+                store.add_changes(state_key(dataset, ticker), dates, now)
+            buckets = {state_key(*k): event['Records'][0]['s3']['bucket']['name'] for k in changes}
+            keys = sorted(buckets)
+        else:
+            if event.get('source') == 'aws.glue':
+                _requeue_failed_run(store, event.get('detail', {}), glue_job_name, now)
+            keys = store.pending_keys()
+
+        # Um run por dataset com as chaves vencidas dele
+        by_dataset: dict[str, list[str]] = {}
+        for key in keys:
+            by_dataset.setdefault(key.split('#', 1)[0], []).append(key)
+        results, run_states = {}, {}
+        for dataset, dataset_keys in by_dataset.items():
+            results.update(flush_dataset(store, dataset, dataset_keys, glue_job_name,
+                                         buckets.get(dataset_keys[0], default_bucket), window_seconds, now,
+                                         run_states))
+        started = {key: result for key, result in results.items()
+                   if result not in ('empty', 'waiting', 'queued', 'contended')}
+
         logger.info("="*70)
-        logger.info("LAMBDA TRIGGER GLUE - CONCLUÍDO")
+        logger.info(f"LAMBDA TRIGGER GLUE - CONCLUÍDO ({len(set(started.values()))} runs iniciados, "
+                    f"{len(results) - len(started)} chaves aguardando)")
         logger.info("="*70)
-        
+
         return {
             'statusCode': 200,
             'body': json.dumps({
-                'message': 'Glue job triggered successfully',
-                'job_run_id': job_run_id
+                'message': 'Glue job triggers processed',
+                'job_run_ids': started,
+                'deferred': {key: result for key, result in results.items() if key not in started}
             })
         }
-        
+
     except Exception as e:
         logger.error(f"ERROR: {str(e)}", exc_info=True)
-        
+
         return {
             'statusCode': 500,
             'body': json.dumps({
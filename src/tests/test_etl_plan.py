@@ -0,0 +1,188 @@
+"""
+Testes do planejamento do Glue ETL (funções puras de etl_plan.py, sem Spark)
+"""
+
+import sys
+from datetime import date
+from pathlib import Path
+
+import pyarrow as pa
+import pytest
+
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from glue.etl_plan import (
+    check_raw_contract,
+    file_date_range,
+    group_by_schema,
+    indicator_carry_ok,
+    month_checkpoint_split,
+    months_in_ranges,
+    parse_changed_dates,
+    pick_indicator_carry,
+    plan_incremental_read,
+    plan_output_files,
+)
+
+PREFIX = "s3://bucket/raw/dataset=petr4/ticker=petr4"
+
+# Pregões de janeiro/2025 (dias úteis)
+JANUARY = [2, 3, 6, 7, 8, 9, 10, 13, 14, 15]
+
+
+def day_uri(year: int, month: int, day: int) -> str:
+    return f"{PREFIX}/year={year}/month={month:02d}/day={day:02d}/data.parquet"
+
+
+def month_uri(year: int, month: int) -> str:
+    return f"{PREFIX}/year={year}/month={month:02d}/compacted-abc.parquet"
+
+
+def test_file_date_range_by_layout():
+    assert file_date_range(day_uri(2025, 1, 2)) == (date(2025, 1, 2), date(2025, 1, 2))
+    assert file_date_range(month_uri(2024, 2)) == (date(2024, 2, 1), date(2024, 2, 29))
+    assert file_date_range(f"{PREFIX}/year=2023/compacted-abc.parquet") == (date(2023, 1, 1), date(2023, 12, 31))
+    assert file_date_range(f"{PREFIX}/data.parquet") is None
+
+
+def test_changed_day_rewrites_window_and_reads_lookback():
+    uris = [day_uri(2025, 1, d) for d in JANUARY]
+
+    read, ranges = plan_incremental_read(uris, ["2025-01-08"])
+
+    # A data e as 4 seguintes (que a têm na janela de 5); cada uma precisa das 4 anteriores
+    assert ranges == [(date(2025, 1, 8), date(2025, 1, 14))]
+    assert read == [day_uri(2025, 1, d) for d in JANUARY[:9]]
+
+
+def test_new_last_day_rewrites_only_itself():
+    uris = [day_uri(2025, 1, d) for d in JANUARY]
+
+    read, ranges = plan_incremental_read(uris, ["2025-01-15"])
+
+    assert ranges == [(date(2025, 1, 15), date(2025, 1, 15))]
+    assert read == [day_uri(2025, 1, d) for d in JANUARY[-5:]]
+
+
+def test_compacted_month_counts_as_a_whole_window():
+    uris = [month_uri(2024, 11), month_uri(2024, 12)] + [day_uri(2025, 1, d) for d in JANUARY]
+
+    # Lookback de 2025-01-02: dezembro compactado basta, novembro não é lido
+    read, ranges = plan_incremental_read(uris, ["2025-01-02"])
+    assert ranges == [(date(2025, 1, 2), date(2025, 1, 8))]
+    assert month_uri(2024, 12) in read and month_uri(2024, 11) not in read
+
+
+def test_change_inside_compacted_month_reaches_following_days():
+    uris = [month_uri(2024, 11), month_uri(2024, 12)] + [day_uri(2025, 1, d) for d in JANUARY]
+
+    # 30/12 pode ser a última linha de dezembro: os 4 pregões seguintes também mudam
+    read, ranges = plan_incremental_read(uris, ["2024-12-30"])
+    assert ranges == [(date(2024, 12, 1), date(2025, 1, 7))]
+    assert read[0] == month_uri(2024, 11)
+
+
+def test_whole_months_expands_touched_months():
+    uris = [day_uri(2025, 1, d) for d in (28, 29, 30, 31)] + [day_uri(2025, 2, d) for d in (3, 4, 5, 6)]
+
+    _, ranges = plan_incremental_read(uris, ["2025-01-30"])
+    assert ranges == [(date(2025, 1, 30), date(2025, 2, 5))]
+
+    read, ranges = plan_incremental_read(uris, ["2025-01-30"], whole_months=True)
+    assert ranges == [(date(2025, 1, 28), date(2025, 2, 6))]
+    assert read == sorted(uris)
+    assert months_in_ranges(ranges) == ["2025-01", "2025-02"]
+
+
+def test_file_outside_layout_falls_back_to_full_history():
+    uris = [day_uri(2025, 1, d) for d in JANUARY] + [f"{PREFIX}/legacy.parquet"]
+    assert plan_incremental_read(uris, ["2025-01-08"]) is None
+
+
+def test_months_in_ranges_crosses_years():
+    assert months_in_ranges([(date(2024, 11, 20), date(2025, 1, 3)), (date(2025, 1, 10), date(2025, 1, 12))]) \
+        == ["2024-11", "2024-12", "2025-01"]
+
+
+def test_indicator_carry_requires_state_right_before_changes():
+    uris = [day_uri(2025, 1, d) for d in JANUARY]
+    ranges = [(date(2025, 1, 14), date(2025, 1, 15))]
+
+    assert indicator_carry_ok(uris, "2025-01-13", ranges)
+    # Estado atrasado: 13/01 nunca entrou no estado
+    assert not indicator_carry_ok(uris, "2025-01-10", ranges)
+    # Estado já passou do início das linhas a reescrever (correção no passado)
+    assert not indicator_carry_ok(uris, "2025-01-14", ranges)
+    assert not indicator_carry_ok(uris + [f"{PREFIX}/legacy.parquet"], "2025-01-13", ranges)
+
+
+def test_indicator_carry_rejects_rows_outside_affected_ranges():
+    uris = [day_uri(2025, 1, d) for d in range(1, 31)]
+    _, ranges = plan_incremental_read(uris, ["2025-01-10", "2025-01-25"])
+    assert ranges == [(date(2025, 1, 10), date(2025, 1, 14)), (date(2025, 1, 25), date(2025, 1, 29))]
+
+    # 15 a 24 e 30 nunca entrariam no estado: a reescrita vai até o fim da série
+    assert not indicator_carry_ok(uris, "2025-01-09", ranges)
+    read, ranges = plan_incremental_read(uris, ["2025-01-10", "2025-01-25"], through_end=True)
+    assert ranges == [(date(2025, 1, 10), date(2025, 1, 30))]
+    assert read == uris[5:]
+    assert indicator_carry_ok(uris, "2025-01-09", ranges)
+
+
+def test_month_layout_resumes_from_end_of_previous_month():
+    uris = [day_uri(2024, 12, d) for d in (27, 30, 31)] + [day_uri(2025, 1, d) for d in JANUARY]
+    # Layout "month": o pregão novo (15/01) reescreve janeiro inteiro
+    _, ranges = plan_incremental_read(uris, ["2025-01-15"], whole_months=True)
+    assert ranges[0][0] == date(2025, 1, 2)
+
+    stored = [("2025-01-14", "ultimo"), ("2024-12-31", "fim-dezembro")]
+    assert pick_indicator_carry(uris, stored, ranges) == ("2024-12-31", "fim-dezembro")
+    assert pick_indicator_carry(uris, stored[:1], ranges) is None
+    # Layout "day": o último estado continua direto
+    _, ranges = plan_incremental_read(uris, ["2025-01-15"])
+    assert pick_indicator_carry(uris, stored, ranges) == ("2025-01-14", "ultimo")
+
+    assert month_checkpoint_split(["2024-12-30", "2024-12-31", "2025-01-02", "2025-01-03"]) == 2
+    assert month_checkpoint_split(["2025-01-02", "2025-01-03"]) == 0
+    assert month_checkpoint_split([]) == 0
+
+
+def test_parse_changed_dates_per_ticker():
+    tickers = ["itub4", "petr4", "vale3"]
+    assert parse_changed_dates("petr4:2025-01-03,PETR4:2025-01-02,vale3:*,itub4:2025-01-02", tickers) \
+        == {"itub4": ["2025-01-02"], "petr4": ["2025-01-02", "2025-01-03"]}
+    # Formato antigo (sem ticker): as datas valem para todos
+    assert parse_changed_dates("2025-01-02", ["petr4", "vale3"]) == {"petr4": ["2025-01-02"],
+                                                                    "vale3": ["2025-01-02"]}
+    assert parse_changed_dates("", tickers) == {}
+
+
+def test_plan_output_files_targets_file_size():
+    # 1 MB de entrada para 10 mil linhas: ~210 bytes por linha no refined
+    num_partitions, max_records = plan_output_files(1_000_000, 1024 * 1024, 10_000, 64 * 1024 * 1024)
+    assert num_partitions == 4
+    assert max_records == 320_000
+    assert plan_output_files(0, 0, 0, 64 * 1024 * 1024)[0] == 1
+
+
+def test_group_by_schema_and_raw_contract():
+    versioned = {b"raw_schema_version": b"1"}
+    extractor = pa.schema([("Date", pa.timestamp("ms")), ("Close", pa.float64()), ("Volume", pa.int64()),
+                           ("ticker", pa.string())], metadata=versioned)
+    csv = pa.schema([("Date", pa.string()), ("Close", pa.float64()), ("Volume", pa.int64()),
+                     ("Ticker", pa.string()), ("source_file", pa.string())])
+    # Colunas extras (metadados de produtor) não separam grupos
+    csv_extra = csv.append(pa.field("Adj Close", pa.float64()))
+    schemas = {"s3://b/raw/a.parquet": extractor, "s3://b/raw/b.parquet": csv,
+               "s3://b/raw/c.parquet": extractor, "s3://b/raw/d.parquet": csv_extra}
+
+    groups = group_by_schema(schemas)
+    assert sorted(groups.values()) == [["s3://b/raw/a.parquet", "s3://b/raw/c.parquet"],
+                                       ["s3://b/raw/b.parquet", "s3://b/raw/d.parquet"]]
+    csv_signature = next(key for key, uris in groups.items() if "s3://b/raw/b.parquet" in uris)
+    assert csv_signature[0] == ("ticker", "Ticker", "string")
+    assert ("Date", "Date", "string") in csv_signature
+
+    assert check_raw_contract(schemas) == ["s3://b/raw/b.parquet", "s3://b/raw/d.parquet"]
+    with pytest.raises(ValueError, match="nanossegundos"):
+        check_raw_contract({"s3://b/raw/d.parquet": pa.schema([("Date", pa.timestamp("ns"))])})
@@ -0,0 +1,134 @@
+"""
+Testes dos indicadores técnicos (kernels vetorizados e retomada pelo estado)
+"""
+
+import sys
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+import pytest
+
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from glue.indicators import (
+    EMA,
+    compute_indicators,
+    compute_indicators_split,
+    dumps_state,
+    ewm,
+    indicator_columns,
+    loads_state,
+    update_indicators,
+)
+
+
+@pytest.fixture
+def bars():
+    rng = np.random.default_rng(7)
+    n = 300
+    close = 30 * np.exp(rng.normal(0, 0.02, n).cumsum())
+    return {
+        "high": close + rng.random(n),
+        "low": close - rng.random(n),
+        "close": close,
+        "volume": rng.integers(1_000, 5_000, n).astype(float),
+    }
+
+
+def test_ewm_blocks_match_recursion():
+    values = np.random.default_rng(1).normal(size=200)
+    expected, previous = [], 5.0
+    for value in values:
+        previous = 0.9 * previous + 0.1 * value
+        expected.append(previous)
+    np.testing.assert_allclose(ewm(values, 0.1, initial=5.0), expected)
+
+
+def test_indicators_match_pandas_reference(bars):
+    columns, _ = compute_indicators(bars)
+    close = pd.Series(bars["close"])
+
+    np.testing.assert_allclose(columns["EMA_9d"][8:], close.ewm(span=9, adjust=False).mean()[8:])
+    assert np.isnan(columns["EMA_9d"][:8]).all()
+
+    mean, std = close.rolling(20).mean(), close.rolling(20).std(ddof=0)
+    np.testing.assert_allclose(columns["Bollinger_Media_20d"][19:], mean[19:])
+    np.testing.assert_allclose(columns["Bollinger_Inferior_20d"][19:], (mean - 2 * std)[19:])
+
+    change = close.diff().iloc[1:]
+    gain = change.clip(lower=0).ewm(alpha=1 / 14, adjust=False).mean()
+    loss = (-change).clip(lower=0).ewm(alpha=1 / 14, adjust=False).mean()
+    np.testing.assert_allclose(columns["RSI_14d"][14:], (100 - 100 / (1 + gain / loss))[13:])
+
+    returns = np.log(close / close.shift())
+    np.testing.assert_allclose(columns["Volatilidade_20d"][20:],
+                               (returns.rolling(20).std() * np.sqrt(252) * 100)[20:])
+
+    typical = (bars["high"] + bars["low"] + bars["close"]) / 3
+    vwap = pd.Series(typical * bars["volume"]).rolling(20).sum() / pd.Series(bars["volume"]).rolling(20).sum()
+    np.testing.assert_allclose(columns["VWAP_20d"][19:], vwap[19:])
+
+
+def test_resumed_state_matches_full_history(bars):
+    full, full_state = compute_indicators(bars)
+
+    head, state = compute_indicators({name: values[:200] for name, values in bars.items()})
+    middle, state = compute_indicators({name: values[200:280] for name, values in bars.items()},
+                                       loads_state(dumps_state(state)))
+    tail = []
+    for index in range(280, 300):
+        values, state = update_indicators({name: float(series[index]) for name, series in bars.items()}, state)
+        tail.append(values)
+
+    for column in indicator_columns():
+        resumed = np.concatenate([head[column], middle[column],
+                                  [np.nan if row[column] is None else row[column] for row in tail]])
+        np.testing.assert_allclose(resumed, full[column], rtol=1e-10, equal_nan=True)
+    assert dumps_state(loads_state(dumps_state(state))) == dumps_state(state)
+    assert state["indicators"]["EMA_9d"]["value"] == pytest.approx(full_state["indicators"]["EMA_9d"]["value"])
+
+
+def test_split_checkpoint_matches_resume(bars):
+    full, full_state = compute_indicators(bars)
+    columns, checkpoint, state = compute_indicators_split(bars, 250)
+
+    for column in indicator_columns():
+        np.testing.assert_allclose(columns[column], full[column], rtol=1e-10, equal_nan=True)
+    assert state["indicators"]["EMA_9d"]["value"] == pytest.approx(full_state["indicators"]["EMA_9d"]["value"])
+    # Retomar do ponto intermediário reproduz as barras seguintes
+    tail, _ = compute_indicators({name: values[250:] for name, values in bars.items()}, checkpoint)
+    np.testing.assert_allclose(tail["RSI_14d"], full["RSI_14d"][250:], rtol=1e-10)
+    assert compute_indicators_split(bars, 0)[1] is None
+
+
+def test_null_bars_keep_state(bars):
+    _, state = compute_indicators({name: values[:50] for name, values in bars.items()})
+    values, same = update_indicators({"high": None, "low": 1.0, "close": 1.0, "volume": 1.0}, state)
+
+    assert all(value is None for value in values.values())
+    assert same == state
+
+
+@pytest.mark.parametrize("close", [[10.0], [10.0, np.nan], [np.nan, 10.0]])
+def test_single_valid_bar_without_state(close):
+    # 1º pregão de um ticker novo: ainda sem retorno para a volatilidade
+    close = np.array(close)
+    columns, state = compute_indicators({"high": close + 1, "low": close - 1, "close": close,
+                                         "volume": np.full(len(close), 100.0)})
+
+    assert all(len(values) == len(close) for values in columns.values())
+    assert all(np.isnan(values).all() for values in columns.values())  # janelas ainda incompletas
+    assert state["indicators"]["Volatilidade_20d"]["returns"] == []
+
+    # O dia seguinte continua do estado e produz o 1º retorno
+    values, state = update_indicators({"high": 12.0, "low": 10.0, "close": 11.0, "volume": 100.0}, state)
+    assert values["Volatilidade_20d"] is None
+    assert state["indicators"]["Volatilidade_20d"]["returns"] == [pytest.approx(np.log(1.1))]
+
+
+def test_state_of_other_indicator_set_is_rejected(bars):
+    _, state = compute_indicators(bars)
+    assert loads_state(dumps_state(state)) is not None
+    assert loads_state(dumps_state(state), indicators=[EMA(9)]) is None
+    assert loads_state(dumps_state({**state, "version": 0})) is None
@@ -0,0 +1,204 @@
+"""
+Testes da Lambda de scraping (sem rede nem AWS: S3 e BRAPI simulados)
+"""
+
+import io
+import json
+import os
+import sys
+from pathlib import Path
+
+import pyarrow as pa
+import pyarrow.parquet as pq
+from botocore.exceptions import ClientError
+
+# A Lambda é empacotada como arquivo único (fora do pacote ingestion)
+sys.path.insert(0, str(Path(__file__).parent.parent / "lambda"))
+os.environ.setdefault("AWS_DEFAULT_REGION", "sa-east-1")  # cliente S3 criado no import
+
+import lambda_scraping
+
+
+DAY = 86400
+FIRST_TS = 1735819200  # 2025-01-02 12:00 UTC
+
+
+def raw_items(n_days: int) -> list[dict]:
+    return [
+        {"date": FIRST_TS + i * DAY, "open": 10 + i, "high": 11.0 + i, "low": 9.0 + i,
+         "close": 10.5 + i, "volume": 1000 * (i + 1)}
+        for i in range(n_days)
+    ]
+
+
+class FakeS3:
+    """S3 em memória: objetos gravados pela Lambda + arquivos pré-existentes (files)"""
+
+    def __init__(self, files: dict = None):
+        self.objects = {}
+        self.metadata = {}
+        self.files = files or {}
+        self.puts = []
+
+    def put_object(self, Bucket, Key, Body, Metadata=None, **kwargs):
+        self.objects[Key] = Body
+        self.metadata[Key] = Metadata or {}
+        self.puts.append(Key)
+
+    def get_object(self, Bucket, Key):
+        if (Bucket, Key) in self.files:
+            return {"Body": io.BytesIO(self.files[(Bucket, Key)].encode("utf-8"))}
+        if Key not in self.objects:
+            raise ClientError({"Error": {"Code": "NoSuchKey"}}, "GetObject")
+        return {"Body": io.BytesIO(self.objects[Key])}
+
+    def head_object(self, Bucket, Key):
+        if Key not in self.objects:
+            raise ClientError({"Error": {"Code": "404"}}, "HeadObject")
+        return {"Metadata": self.metadata[Key]}
+
+
+class FakeHTTPResponse:
+    def __init__(self, status: int, payload: dict):
+        self.status = status
+        self.data = json.dumps(payload).encode("utf-8")
+
+
+class FakeBrapiPool:
+    """PoolManager simulado: responde lotes BRAPI (símbolos separados por vírgula)"""
+
+    def __init__(self, n_days: int = 2):
+        self.n_days = n_days
+        self.urls = []
+
+    def request(self, method, url):
+        self.urls.append(url)
+        symbols = url.split("/quote/", 1)[1].split("?", 1)[0].split(",")
+        results = [{"symbol": s, "historicalDataPrice": raw_items(self.n_days)} for s in symbols]
+        return FakeHTTPResponse(200, {"results": results})
+
+
+class FakeLambda:
+    def __init__(self):
+        self.invocations = []
+
+    def invoke(self, FunctionName, InvocationType, Payload):
+        self.invocations.append((FunctionName, InvocationType, json.loads(Payload)))
+        return {"StatusCode": 202}
+
+
+class FakeContext:
+    function_name = "b3-pipeline-scraping-dev"
+
+
+def test_prepare_records_builds_typed_table():
+    """Testa decodificação do payload direto em Arrow (tipos fixos, itens sem data descartados)"""
+    items = raw_items(3) + [{"open": 1.0}]
+
+    table = lambda_scraping.prepare_records(items, "PETR4")
+
+    assert table.schema.equals(lambda_scraping.RAW_SCHEMA, check_metadata=True)
+    assert [str(d) for d in table["Date"].to_pylist()] == ["2025-01-02", "2025-01-03", "2025-01-04"]
+    assert table.schema.field("Open").type == pa.float64()
+    assert table.schema.field("Volume").type == pa.float64()
+    assert set(table["ticker"].to_pylist()) == {"petr4"}
+
+
+def test_save_to_s3_parquet_writes_one_object_per_day(monkeypatch):
+    """Testa particionamento vetorizado: um objeto por dia, com as linhas do dia"""
+    s3 = FakeS3()
+    monkeypatch.setattr(lambda_scraping, "_S3", s3)
+    items = raw_items(3)
+    table = lambda_scraping.prepare_records(items[::-1] + items[:1], "PETR4")
+
+    keys = lambda_scraping.save_to_s3_parquet(table, "bucket", "petr4", "PETR4")
+
+    assert keys == [
+        f"raw/dataset=petr4/ticker=petr4/year=2025/month=01/day={d:02d}/data.parquet"
+        for d in (2, 3, 4)
+    ]
+    assert s3.metadata[keys[0]]["content-sha256"]
+    first_day = pq.read_table(io.BytesIO(s3.objects[keys[0]]))
+    assert first_day.num_rows == 2
+    assert first_day["Close"].to_pylist() == [10.5, 10.5]
+
+
+def test_coordinator_dispatches_one_worker_per_shard(monkeypatch):
+    """Testa fan-out: universo do S3 dividido em shards, uma invocação assíncrona por shard"""
+    universe = "\n".join(["# universo", "PETR4, VALE3", "ITUB4", "BBDC4", "ABEV3", "petr4"])
+    s3 = FakeS3({("config", "universe.txt"): universe})
+    fake_lambda = FakeLambda()
+    monkeypatch.setattr(lambda_scraping, "_S3", s3)
+    monkeypatch.setattr(lambda_scraping, "_LAMBDA_CLIENT", fake_lambda)
+    monkeypatch.setenv("S3_BUCKET", "bucket")
+    monkeypatch.setenv("SHARD_SIZE", "2")
+
+    response = lambda_scraping.lambda_handler({"tickers_s3_uri": "s3://config/universe.txt"}, FakeContext())
+
+    assert response["statusCode"] == 202
+    shards = [payload["shard"]["tickers"] for _, _, payload in fake_lambda.invocations]
+    assert shards == [["PETR4", "VALE3"], ["ITUB4", "BBDC4"], ["ABEV3"]]
+    assert {(name, kind) for name, kind, _ in fake_lambda.invocations} == {
+        ("b3-pipeline-scraping-dev", "Event")
+    }
+    assert not s3.objects
+
+
+def test_worker_processes_only_its_shard(monkeypatch):
+    """Testa worker: um lote BRAPI para o shard e Parquet no dataset de cada ticker"""
+    s3 = FakeS3()
+    pool = FakeBrapiPool(n_days=2)
+    monkeypatch.setattr(lambda_scraping, "_S3", s3)
+    monkeypatch.setattr(lambda_scraping, "_HTTP", pool)
+    monkeypatch.setenv("S3_BUCKET", "bucket")
+
+    event = {"shard": {"index": 1, "count": 3, "tickers": ["ITUB4", "BBDC4"]}, "days": 5}
+    body = json.loads(lambda_scraping.lambda_handler(event, FakeContext())["body"])
+
+    assert len(pool.urls) == 1 and "ITUB4,BBDC4" in pool.urls[0]
+    assert body["files_uploaded"] == 4
+    assert sorted({key.split("/")[1] for key in s3.objects if key.startswith("raw/")}) == ["dataset=bbdc4", "dataset=itub4"]
+
+
+def test_single_ticker_universe_uses_own_dataset(monkeypatch):
+    """Testa universo de um ticker: DATASET só vale no modo legado (env TICKER)"""
+    s3 = FakeS3()
+    monkeypatch.setattr(lambda_scraping, "_S3", s3)
+    monkeypatch.setattr(lambda_scraping, "_HTTP", FakeBrapiPool(n_days=1))
+    monkeypatch.setenv("S3_BUCKET", "bucket")
+    monkeypatch.setenv("DATASET", "petr4")
+    monkeypatch.delenv("TICKERS", raising=False)
+    monkeypatch.delenv("TICKERS_S3_URI", raising=False)
+
+    lambda_scraping.lambda_handler({"tickers": ["VALE3"]}, FakeContext())
+    assert {key.split("/")[1] for key in s3.objects if key.startswith("raw/")} == {"dataset=vale3"}
+
+    s3.objects.clear()
+    monkeypatch.setenv("TICKER", "PETR4")
+    lambda_scraping.lambda_handler({}, FakeContext())
+    assert {key.split("/")[1] for key in s3.objects if key.startswith("raw/")} == {"dataset=petr4"}
+
+
+def test_save_to_s3_parquet_writes_only_new_or_changed_days(monkeypatch):
+    """Testa escrita por diff: reexecução diária grava só o dia novo (e o índice de estado)"""
+    s3 = FakeS3()
+    monkeypatch.setattr(lambda_scraping, "_S3", s3)
+
+    lambda_scraping.save_to_s3_parquet(
+        lambda_scraping.prepare_records(raw_items(22), "PETR4"), "bucket", "petr4", "PETR4")
+    assert len(s3.puts) == 23  # 22 dias + índice
+
+    s3.puts.clear()
+    keys = lambda_scraping.save_to_s3_parquet(
+        lambda_scraping.prepare_records(raw_items(23), "PETR4"), "bucket", "petr4", "PETR4")
+    assert keys == ["raw/dataset=petr4/ticker=petr4/year=2025/month=01/day=24/data.parquet"]
+    assert s3.puts == keys + ["_state/lambda_scraping/dataset=petr4/ticker=petr4.json"]
+
+    # Sem índice (perdido): a metadata dos objetos evita regravar; dia alterado é regravado
+    del s3.objects["_state/lambda_scraping/dataset=petr4/ticker=petr4.json"]
+    s3.puts.clear()
+    items = raw_items(23)
+    items[0]["close"] = 99.0
+    keys = lambda_scraping.save_to_s3_parquet(
+        lambda_scraping.prepare_records(items, "PETR4"), "bucket", "petr4", "PETR4")
+    assert keys == ["raw/dataset=petr4/ticker=petr4/year=2025/month=01/day=02/data.parquet"]
@@ -0,0 +1,249 @@
+"""
+Testes da Lambda de trigger do Glue (coalescência com estado em memória; Glue simulado)
+"""
+
+import json
+import os
+import sys
+from pathlib import Path
+
+import boto3
+import pytest
+from botocore.exceptions import ClientError, EndpointConnectionError
+from botocore.stub import Stubber
+
+# A Lambda é empacotada como arquivo único (fora do pacote ingestion)
+sys.path.insert(0, str(Path(__file__).parent.parent / "lambda"))
+os.environ.setdefault("AWS_DEFAULT_REGION", "sa-east-1")  # cliente Glue criado no import
+
+import lambda_trigger_glue
+
+
+class FakeGlue:
+    def __init__(self):
+        self.runs = {}
+        self.started = []
+        self.max_concurrent_runs = None
+
+    def start_job_run(self, JobName, Arguments):
+        in_flight = [r for r in self.runs.values() if r["JobRunState"] in lambda_trigger_glue.IN_FLIGHT_STATES]
+        if self.max_concurrent_runs is not None and len(in_flight) >= self.max_concurrent_runs:
+            raise ClientError({"Error": {"Code": "ConcurrentRunsExceededException"}}, "StartJobRun")
+        run_id = f"jr_{len(self.runs) + 1}"
+        self.runs[run_id] = {"Id": run_id, "JobRunState": "RUNNING", "Arguments": Arguments}
+        self.started.append(Arguments)
+        return {"JobRunId": run_id}
+
+    def get_job_run(self, JobName, RunId):
+        return {"JobRun": self.runs[RunId]}
+
+
+def s3_event(*keys: str) -> dict:
+    return {"Records": [
+        {"s3": {"bucket": {"name": "bucket"}, "object": {"key": key}}} for key in keys
+    ]}
+
+
+def day_key(ticker: str, day: int, dataset: str = None) -> str:
+    return f"raw/dataset={dataset or ticker}/ticker={ticker}/year=2025/month=01/day={day:02d}/data.parquet"
+
+
+@pytest.fixture
+def trigger(monkeypatch):
+    glue = FakeGlue()
+    clock = {"now": 1000.0}
+    monkeypatch.setattr(lambda_trigger_glue, "glue_client", glue)
+    monkeypatch.setattr(lambda_trigger_glue, "_STATE_STORE", lambda_trigger_glue.InMemoryTriggerStore())
+    monkeypatch.setattr(lambda_trigger_glue, "_now", lambda: clock["now"])
+    monkeypatch.setenv("GLUE_JOB_NAME", "etl")
+    monkeypatch.setenv("S3_BUCKET", "bucket")
+    monkeypatch.setenv("COALESCE_WINDOW_SECONDS", "120")
+    return glue, clock
+
+
+def test_events_are_coalesced_into_one_run_per_key(trigger):
+    glue, clock = trigger
+
+    # Carga de 30 dias em vários eventos: nada é iniciado dentro da janela
+    for day in range(1, 31, 10):
+        lambda_trigger_glue.lambda_handler(s3_event(*(day_key("petr4", d) for d in range(day, day + 10))), None)
+    lambda_trigger_glue.lambda_handler(s3_event(day_key("vale3", 5)), None)
+    assert glue.started == []
+
+    clock["now"] += 121
+    response = lambda_trigger_glue.lambda_handler({"source": "coalesce-flush"}, None)
+
+    assert response["statusCode"] == 200
+    assert len(glue.started) == 2
+    petr4 = next(args for args in glue.started if args["--TICKER"] == "petr4")
+    assert petr4["--CHANGED_DATES"].split(",") == [f"petr4:2025-01-{d:02d}" for d in range(1, 31)]
+    assert petr4["--DATASET"] == "petr4" and petr4["--S3_BUCKET"] == "bucket"
+
+
+def test_in_flight_run_queues_follow_up(trigger):
+    glue, clock = trigger
+    lambda_trigger_glue.lambda_handler(s3_event(day_key("petr4", 2)), None)
+    clock["now"] += 121
+    lambda_trigger_glue.lambda_handler({"source": "coalesce-flush"}, None)
+    assert len(glue.started) == 1
+
+    # Novo dia com o run anterior ainda em andamento: fica na fila
+    lambda_trigger_glue.lambda_handler(s3_event(day_key("petr4", 3)), None)
+    clock["now"] += 121
+    response = lambda_trigger_glue.lambda_handler({"source": "coalesce-flush"}, None)
+    assert len(glue.started) == 1
+    assert json.loads(response["body"])["deferred"] == {"petr4#petr4": "queued"}
+
+    # Run terminou (evento do EventBridge): follow-up só com a data nova
+    glue.runs["jr_1"]["JobRunState"] = "SUCCEEDED"
+    lambda_trigger_glue.lambda_handler(
+        {"source": "aws.glue", "detail": {"jobName": "etl", "jobRunId": "jr_1", "state": "SUCCEEDED"}}, None)
+    assert [args["--CHANGED_DATES"] for args in glue.started] == ["petr4:2025-01-02", "petr4:2025-01-03"]
+
+
+def test_due_keys_of_a_dataset_share_one_run(trigger):
+    glue, clock = trigger
+    glue.max_concurrent_runs = 1
+    lambda_trigger_glue.lambda_handler(s3_event(day_key("petr4", 2, "ibov"), day_key("vale3", 2, "ibov"),
+                                                day_key("vale3", 3, "ibov")), None)
+    lambda_trigger_glue._state_store().add_changes("ibov#itub4", {lambda_trigger_glue.ALL_DATES}, clock["now"])
+    clock["now"] += 121
+    response = lambda_trigger_glue.lambda_handler({"source": "coalesce-flush"}, None)
+
+    # Um único início de job para o dataset, com as datas de cada ticker
+    assert len(glue.started) == 1
+    assert glue.started[0]["--TICKERS"] == "itub4,petr4,vale3"
+    assert glue.started[0]["--CHANGED_DATES"] == "itub4:*,petr4:2025-01-02,vale3:2025-01-02,vale3:2025-01-03"
+    assert set(json.loads(response["body"])["job_run_ids"].values()) == {"jr_1"}
+
+    # Falha do run devolve as datas de todos os tickers dele
+    glue.runs["jr_1"]["JobRunState"] = "FAILED"
+    clock["now"] += 121
+    lambda_trigger_glue.lambda_handler(
+        {"source": "aws.glue", "detail": {"jobName": "etl", "jobRunId": "jr_1", "state": "FAILED"}}, None)
+    assert len(glue.started) == 2 and glue.started[1]["--TICKERS"] == "itub4,petr4,vale3"
+
+
+def test_failed_run_dates_are_requeued(trigger):
+    glue, clock = trigger
+    lambda_trigger_glue.lambda_handler(s3_event(day_key("petr4", 2)), None)
+    clock["now"] += 121
+    lambda_trigger_glue.lambda_handler({"source": "coalesce-flush"}, None)
+
+    glue.runs["jr_1"]["JobRunState"] = "FAILED"
+    lambda_trigger_glue.lambda_handler(s3_event(day_key("petr4", 3)), None)
+    clock["now"] += 121
+    lambda_trigger_glue.lambda_handler(
+        {"source": "aws.glue", "detail": {"jobName": "etl", "jobRunId": "jr_1", "state": "FAILED"}}, None)
+
+    assert glue.started[-1]["--CHANGED_DATES"] == "petr4:2025-01-02,petr4:2025-01-03"
+
+
+def test_concurrency_limit_keeps_dates_pending(trigger):
+    glue, clock = trigger
+    glue.max_concurrent_runs = 1
+    lambda_trigger_glue.lambda_handler(s3_event(day_key("petr4", 2), day_key("vale3", 2)), None)
+    clock["now"] += 121
+    lambda_trigger_glue.lambda_handler({"source": "coalesce-flush"}, None)
+    assert len(glue.started) == 1
+
+    glue.runs["jr_1"]["JobRunState"] = "SUCCEEDED"
+    lambda_trigger_glue.lambda_handler({"source": "coalesce-flush"}, None)
+    assert sorted(args["--TICKER"] for args in glue.started) == ["petr4", "vale3"]
+
+
+def test_compacted_and_non_raw_keys_are_ignored(trigger):
+    glue, _ = trigger
+    lambda_trigger_glue.lambda_handler(s3_event(
+        "raw/dataset=petr4/ticker=petr4/year=2025/month=01/compacted-abc.parquet",
+        "refined/dataset=petr4/ticker=petr4/year=2025/month=01/day=02/data.parquet",
+    ), None)
+    assert lambda_trigger_glue._state_store().pending_keys() == []
+    assert glue.started == []
+
+
+def test_network_error_on_start_releases_dates(trigger):
+    glue, clock = trigger
+    lambda_trigger_glue.lambda_handler(s3_event(day_key("petr4", 2)), None)
+    clock["now"] += 121
+
+    def unreachable(JobName, Arguments):
+        raise EndpointConnectionError(endpoint_url="https://glue.sa-east-1.amazonaws.com")
+
+    start_job_run = glue.start_job_run
+    glue.start_job_run = unreachable
+    response = lambda_trigger_glue.lambda_handler({"source": "coalesce-flush"}, None)
+    assert response["statusCode"] == 500
+    assert lambda_trigger_glue._state_store().get("petr4#petr4")["pending"] == {"2025-01-02"}
+
+    glue.start_job_run = start_job_run
+    lambda_trigger_glue.lambda_handler({"source": "coalesce-flush"}, None)
+    assert [args["--CHANGED_DATES"] for args in glue.started] == ["petr4:2025-01-02"]
+
+
+def test_stale_claim_without_run_is_requeued(trigger):
+    glue, clock = trigger
+    store = lambda_trigger_glue._state_store()
+    store.add_changes("petr4#petr4", {"2025-01-02"}, clock["now"])
+
+    # Invocação morreu entre o claim e o set_run: reserva "starting" com as datas inflight
+    assert store.claim("petr4#petr4", store.get("petr4#petr4")["version"], clock["now"])
+    lambda_trigger_glue.lambda_handler({"source": "coalesce-flush"}, None)
+    assert glue.started == []
+
+    clock["now"] += lambda_trigger_glue.CLAIM_TTL_SECONDS
+    lambda_trigger_glue.lambda_handler({"source": "coalesce-flush"}, None)
+    assert [args["--CHANGED_DATES"] for args in glue.started] == ["petr4:2025-01-02"]
+
+
+def test_dynamodb_store_requests(monkeypatch):
+    """Store DynamoDB com cliente stubado: updates condicionais e sem string sets vazios"""
+    client = boto3.client("dynamodb", region_name="sa-east-1",
+                          aws_access_key_id="test", aws_secret_access_key="test")
+    store = lambda_trigger_glue.DynamoDBTriggerStore("trigger-state", client=client)
+    key = {"pk": {"S": "petr4#petr4"}}
+    names = {"#version": "version"}
+
+    with Stubber(client) as stub:
+        stub.add_response("update_item", {}, {
+            "TableName": "trigger-state", "Key": key,
+            "UpdateExpression": "ADD pending :dates, #version :one "
+                                "SET first_event_at = if_not_exists(first_event_at, :now)",
+            "ExpressionAttributeNames": names,
+            "ExpressionAttributeValues": {":dates": {"SS": ["2025-01-02", "2025-01-03"]},
+                                          ":one": {"N": "1"}, ":now": {"N": "1000.0"}},
+        })
+        store.add_changes("petr4#petr4", {"2025-01-03", "2025-01-02"}, 1000.0)
+
+        # Claim condicionado à versão lida; perdeu a corrida -> False
+        item = {"pk": {"S": "petr4#petr4"}, "pending": {"SS": ["2025-01-02"]},
+                "version": {"N": "3"}, "first_event_at": {"N": "1000.0"}}
+        get_item = {"TableName": "trigger-state", "Key": key, "ConsistentRead": True}
+        stub.add_response("get_item", {"Item": item}, get_item)
+        stub.add_response("update_item", {}, {
+            "TableName": "trigger-state", "Key": key,
+            "UpdateExpression": "SET inflight = :dates, run_id = :starting, run_started_at = :now "
+                                "REMOVE pending, first_event_at ADD #version :one",
+            "ConditionExpression": "#version = :version",
+            "ExpressionAttributeNames": names,
+            "ExpressionAttributeValues": {":dates": {"SS": ["2025-01-02"]}, ":starting": {"S": "starting"},
+                                          ":now": {"N": "1100.0"}, ":one": {"N": "1"},
+                                          ":version": {"N": "3"}},
+        })
+        stub.add_response("get_item", {"Item": item}, get_item)
+        stub.add_client_error("update_item", service_error_code="ConditionalCheckFailedException")
+        assert store.claim("petr4#petr4", 3, 1100.0)
+        assert not store.claim("petr4#petr4", 3, 1100.0)
+
+        # Release de reserva vencida sem datas: nenhum SS vazio no update
+        stub.add_response("update_item", {}, {
+            "TableName": "trigger-state", "Key": key,
+            "UpdateExpression": "SET first_event_at = if_not_exists(first_event_at, :now) "
+                                "REMOVE run_id, run_started_at, inflight ADD #version :one",
+            "ConditionExpression": "run_id = :run_id",
+            "ExpressionAttributeNames": names,
+            "ExpressionAttributeValues": {":one": {"N": "1"}, ":now": {"N": "1100.0"},
+                                          ":run_id": {"S": "starting"}},
+        })
+        assert store.release("petr4#petr4", set(), 1100.0, run_id="starting")
+        stub.assert_no_pending_responses()
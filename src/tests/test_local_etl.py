@@ -0,0 +1,195 @@
+"""
+Testes do motor local das transformações do Glue (Arrow/NumPy, sem Spark)
+"""
+
+import sys
+from datetime import date, timedelta
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
+import pytest
+
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from glue import local_etl
+from ingestion.parquet_sink import PartitionedParquetSink
+from ingestion.raw_schema import conform_raw
+
+
+def business_days(start: date, count: int) -> list[date]:
+    days, current = [], start
+    while len(days) < count:
+        if current.weekday() < 5:
+            days.append(current)
+        current += timedelta(days=1)
+    return days
+
+
+def raw_table(ticker: str, days: list[date], seed: int = 0) -> pa.Table:
+    rng = np.random.default_rng(seed)
+    close = 30 + rng.normal(0, 1, len(days)).cumsum()
+    return pa.table({
+        "Date": pa.array(days, pa.date32()),
+        "Open": close - 0.2,
+        "High": close + 0.5,
+        "Low": close - 0.5,
+        "Close": close,
+        "Volume": rng.integers(1_000, 5_000, len(days)).astype(float),
+        "ticker": [ticker.upper()] * len(days),
+        "dataset": ["petr4"] * len(days),
+        "year": [d.year for d in days],
+        "month": [d.month for d in days],
+        "day": [d.day for d in days],
+    })
+
+
+def write_raw(root: Path, *tables: pa.Table) -> None:
+    with PartitionedParquetSink(root) as sink:
+        for table in tables:
+            sink.write(conform_raw(table, keep=tuple(sink.partition_cols)))
+
+
+@pytest.fixture
+def raw(tmp_path):
+    days = business_days(date(2025, 1, 2), 45)
+    write_raw(tmp_path / "raw", raw_table("petr4", days, seed=1), raw_table("vale3", days, seed=2))
+    return tmp_path / "raw", days
+
+
+def test_transforms_match_pandas_reference(raw, tmp_path):
+    root, days = raw
+    local_etl.run_local_etl(root, tmp_path / "out", "petr4", workers=1)
+
+    refined = pq.read_table(tmp_path / "out" / "refined" / "dataset=petr4" / "ticker=petr4"
+                            / "year=2025" / "month=1" / "day=2" / "data.parquet")
+    assert {"ticker", "year", "month", "day"}.isdisjoint(refined.column_names)
+    assert refined["Date"].to_pylist() == ["2025-01-02"]
+    assert {"EMA_9d", "RSI_14d", "ATR_14d", "Volatilidade_60d"} <= set(refined.column_names)
+    state = pq.read_table(tmp_path / "out" / "refined_agg" / "indicadores_estado" / "dataset=petr4"
+                          / "ticker=petr4" / "data.parquet")
+    assert state["Ultima_Data"].to_pylist() == [days[-1].isoformat()]
+    # Ponto de retomada do layout "month": último pregão do mês anterior
+    last_month = [d for d in days if (d.year, d.month) < (days[-1].year, days[-1].month)][-1]
+    assert state["Data_Fim_Mes_Anterior"].to_pylist() == [last_month.isoformat()]
+
+    series = local_etl.split_by_ticker(local_etl.read_raw(root))["petr4"]
+    refined, _ = local_etl.transform_ticker(series)
+    result = refined.to_pandas()
+    close = series["Close"].to_pandas()
+    np.testing.assert_allclose(result["Preco_Media_Movel_5d"], close.rolling(5, min_periods=1).mean())
+    np.testing.assert_allclose(result["Preco_Dia_Anterior"][1:], close.shift(1)[1:])
+    np.testing.assert_allclose(result["Variacao_Percentual_Diaria"][1:], close.pct_change()[1:] * 100)
+    assert pd.isna(result["Variacao_Percentual_Diaria"][0])
+    assert result["Dias_Desde_Inicio"][0] == (date(2025, 1, 2) - date(2025, 10, 20)).days
+
+    monthly = pq.read_table(tmp_path / "out" / "refined_agg" / "agg_mensal" / "dataset=petr4"
+                            / "ticker=petr4" / "data.parquet").to_pandas()
+    frame = pd.DataFrame({"month": [d.month for d in days], "close": close, "low": series["Low"].to_pandas()})
+    expected = frame.groupby("month").agg(mean=("close", "mean"), std=("close", "std"), low=("low", "min"))
+    np.testing.assert_allclose(monthly["Preco_Medio_Mensal"], expected["mean"])
+    np.testing.assert_allclose(monthly["Preco_Desvio_Padrao"], expected["std"])
+    np.testing.assert_allclose(monthly["Preco_Minimo_Mensal"], expected["low"])
+    assert monthly["Periodo"].tolist() == ["2025-01", "2025-02", "2025-03"]
+
+    total = pq.read_table(tmp_path / "out" / "refined_agg" / "agg_total" / "dataset=petr4"
+                          / "ticker=petr4" / "data.parquet").to_pandas()
+    assert total["Total_Dias_Analisados"][0] == len(days)
+    np.testing.assert_allclose(total["Preco_Desvio_Padrao_Periodo"][0], close.std())
+    np.testing.assert_allclose(total["Variacao_Percentual_Periodo"][0],
+                               (close.iloc[-1] / close.iloc[0] - 1) * 100)
+
+
+def test_duplicate_rows_keep_one_per_date(raw, tmp_path):
+    root, days = raw
+    table = local_etl.read_raw(root)
+    series = local_etl.split_by_ticker(pa.concat_tables([table, table]))
+    assert sorted(series) == ["petr4", "vale3"]
+    assert series["petr4"].num_rows == len(days)
+
+
+def test_duplicate_rows_follow_producer_priority():
+    day = [date(2025, 1, 2)]
+
+    def session(close, source, timestamp):
+        table = conform_raw(raw_table("petr4", day).set_column(4, "Close", pa.array([close])))
+        return table.set_column(table.schema.get_field_index("data_source"), "data_source",
+                                pa.array([source], pa.string())) \
+            .set_column(table.schema.get_field_index("extraction_timestamp"), "extraction_timestamp",
+                        pa.array([timestamp], pa.string()))
+
+    def close_kept(*tables):
+        return local_etl.split_by_ticker(pa.concat_tables(tables))["PETR4"]["Close"].to_pylist()
+
+    csv = session(1.0, "yahoo_finance_manual_csv", "2025-01-03T10:00:00")
+    lambda_ = session(2.0, "brapi_lambda", None)
+    extractor_old = session(3.0, "real_api_extraction", "2025-01-02T18:00:00")
+    extractor_new = session(4.0, "real_api_extraction", "2025-01-03T18:00:00")
+    unknown = session(5.0, None, "2025-01-04T18:00:00")
+
+    # Independe da ordem de leitura: produtor, depois extração mais recente
+    assert close_kept(csv, lambda_) == close_kept(lambda_, csv) == [2.0]
+    assert close_kept(extractor_new, extractor_old, lambda_) == [4.0]
+    assert close_kept(extractor_old, extractor_new, unknown) == [4.0]
+    # Empate completo: o último arquivo lido
+    assert close_kept(session(6.0, "brapi_lambda", None), lambda_) == [2.0]
+
+
+def test_ticker_with_a_single_day(raw, tmp_path):
+    root, days = raw
+    write_raw(root, raw_table("itub4", days[-1:], seed=3))
+
+    totals = local_etl.run_local_etl(root, tmp_path / "out", "petr4", tickers=["itub4"], workers=1)
+    assert totals["partitions"] == 1
+
+
+def test_process_pool_matches_single_process(raw, tmp_path):
+    root, _ = raw
+    local_etl.run_local_etl(root, tmp_path / "single", "petr4", workers=1)
+    totals = local_etl.run_local_etl(root, tmp_path / "pool", "petr4", workers=2)
+
+    assert totals["tickers"] == 2
+    assert local_etl.compare_refined(tmp_path / "single" / "refined" / "dataset=petr4",
+                                     tmp_path / "pool" / "refined" / "dataset=petr4") == []
+
+
+def test_changed_dates_rewrite_only_affected_partitions(raw, tmp_path):
+    root, days = raw
+    out = tmp_path / "out"
+    local_etl.run_local_etl(root, out, "petr4", workers=1)
+    refined = out / "refined" / "dataset=petr4"
+    before = {path: path.stat().st_mtime_ns for path in refined.rglob("*.parquet")}
+
+    # Correção de um dia: a partição dele e as seguintes mudam (janelas e indicadores)
+    changed = days[-3]
+    corrected = raw_table("petr4", days, seed=1).filter(pa.array([d == changed for d in days]))
+    corrected = corrected.set_column(corrected.schema.get_field_index("Close"), "Close", pa.array([99.0]))
+    write_raw(root, corrected)
+
+    totals = local_etl.run_local_etl(root, out, "petr4", tickers=["petr4"], workers=1,
+                                     changed_dates=[changed.isoformat()])
+    assert totals["partitions"] == 3
+    rewritten = {path for path, mtime in before.items() if path.stat().st_mtime_ns != mtime}
+    assert {p.parent.name for p in rewritten} == {f"day={d.day}" for d in days[-3:]}
+    assert all("ticker=petr4" in str(p) for p in rewritten)
+
+    # Resultado igual ao de um reprocessamento completo
+    local_etl.run_local_etl(root, tmp_path / "full", "petr4", workers=1)
+    assert local_etl.compare_refined(tmp_path / "full" / "refined" / "dataset=petr4", refined) == []
+
+
+def test_compare_reports_value_differences(raw, tmp_path):
+    root, _ = raw
+    local_etl.run_local_etl(root, tmp_path / "a", "petr4", tickers=["petr4"], workers=1)
+    local_etl.run_local_etl(root, tmp_path / "b", "petr4", tickers=["petr4"], workers=1)
+
+    path = tmp_path / "b" / "refined" / "dataset=petr4" / "ticker=petr4" / "year=2025" / "month=1" / "day=3"
+    table = pq.read_table(path / "data.parquet")
+    index = table.schema.get_field_index("Preco_Media_Movel_5d")
+    pq.write_table(table.set_column(index, "Preco_Media_Movel_5d", pa.array([0.0])), path / "data.parquet")
+
+    problems = local_etl.compare_refined(tmp_path / "a" / "refined" / "dataset=petr4",
+                                         tmp_path / "b" / "refined" / "dataset=petr4")
+    assert len(problems) == 1 and problems[0].startswith("Preco_Media_Movel_5d: 1 diferenças")
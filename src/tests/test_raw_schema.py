@@ -0,0 +1,77 @@
+"""
+Testes do contrato de schema do raw (conversão, validação e migração de legado)
+"""
+
+import os
+import sys
+from pathlib import Path
+
+import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
+import pytest
+
+sys.path.insert(0, str(Path(__file__).parent.parent))
+sys.path.insert(0, str(Path(__file__).parent.parent / "lambda"))
+sys.path.insert(0, str(Path(__file__).parent.parent.parent / "scripts"))
+os.environ.setdefault("AWS_DEFAULT_REGION", "sa-east-1")
+
+import lambda_scraping
+import migrate_raw_schema
+from ingestion.process_csv_local import CSVProcessor
+from ingestion.raw_schema import RAW_SCHEMA, RawSchemaError, conform_raw, validate_raw_schema
+
+
+def legacy_table() -> pa.Table:
+    """Como o processador de CSV gravava: Date em ns com horário, Volume int, Ticker maiúsculo"""
+    return pa.table({
+        "Date": pa.array(pd.to_datetime(["2025-01-02 03:00", "2025-01-03 03:00"])),
+        "Open": [10, 11],
+        "High": [11.0, 12.0],
+        "Low": [9.0, 10.0],
+        "Close": [10.5, 11.5],
+        "Volume": pa.array([1000, 2000], pa.int64()),
+        "Ticker": ["petr4", "petr4"],
+        "extra": ["x", "y"],
+    })
+
+
+def test_conform_raw_converts_legacy_types():
+    table = conform_raw(legacy_table())
+
+    assert table.schema.equals(RAW_SCHEMA, check_metadata=True)
+    assert [str(d) for d in table["Date"].to_pylist()] == ["2025-01-02", "2025-01-03"]
+    assert table["Volume"].to_pylist() == [1000.0, 2000.0]
+    assert table["dataset"].null_count == 2
+    assert validate_raw_schema(table.schema) == []
+
+
+def test_conform_raw_rejects_missing_required_columns():
+    with pytest.raises(RawSchemaError, match="Close"):
+        conform_raw(legacy_table().drop_columns(["Close"]))
+
+
+def test_lambda_copy_of_contract_matches():
+    assert lambda_scraping.RAW_SCHEMA.equals(RAW_SCHEMA, check_metadata=True)
+
+
+def test_csv_processor_writes_contract(tmp_path):
+    csv_path = tmp_path / "petr4.csv"
+    csv_path.write_text("Date,Open,High,Low,Close,Volume\n2025-01-02,10,11,9,10.5,1000\n")
+    processor = CSVProcessor(ticker="PETR4.SA", dataset_name="petr4")
+    processor.save_parquet(processor.process_csv(csv_path), tmp_path / "raw")
+
+    files = list((tmp_path / "raw").rglob("*.parquet"))
+    assert len(files) == 1
+    assert validate_raw_schema(pq.read_schema(files[0])) == []
+
+
+def test_migrate_local_rewrites_only_legacy_files(tmp_path):
+    legacy = tmp_path / "year=2025" / "month=1" / "day=2" / "data.parquet"
+    legacy.parent.mkdir(parents=True)
+    pq.write_table(legacy_table(), legacy)
+    assert validate_raw_schema(pq.read_schema(legacy))
+
+    assert migrate_raw_schema.migrate_local(tmp_path) == {"migrated": 1, "conform": 0, "failed": 0}
+    assert validate_raw_schema(pq.read_schema(legacy)) == []
+    assert migrate_raw_schema.migrate_local(tmp_path) == {"migrated": 0, "conform": 1, "failed": 0}
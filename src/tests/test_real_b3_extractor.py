@@ -0,0 +1,556 @@
+"""
+Testes do extrator de dados reais (sem rede: respostas da API simuladas)
+"""
+
+import os
+import pytest
+import pandas as pd
+import pyarrow.compute as pc
+import pyarrow.parquet as pq
+from pathlib import Path
+import sys
+import threading
+import time
+from datetime import date
+
+# Adicionar src ao path
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from ingestion.extract_real_b3_data import (
+    RealB3DataExtractor,
+    extract_many,
+    fetch_brapi_batch,
+    parse_tickers,
+)
+import ingestion.extract_real_b3_data as extract_module
+from ingestion.backfill import BackfillManifest, plan_chunks, run_backfill
+from ingestion.compact_partitions import LocalPartitionStorage, PartitionCompactor, storage_for
+from ingestion.http_cache import HTTPResponseCache
+from ingestion.parquet_sink import PartitionedParquetSink
+from ingestion.raw_schema import conform_raw
+from ingestion.rate_limit import RateLimitExceeded, TokenBucketRateLimiter
+from ingestion.resilience import build_breakers
+from ingestion.s3_uploader import ParallelS3Uploader
+from ingestion.watermark import LocalWatermarkStore
+
+
+DAY = 86400
+FIRST_TS = 1735819200  # 2025-01-02 12:00 UTC
+
+
+def brapi_payload(symbol: str, n_days: int = 3) -> dict:
+    return {
+        "symbol": symbol,
+        "historicalDataPrice": [
+            {
+                "date": FIRST_TS + i * DAY,
+                "open": 10.0 + i,
+                "high": 11.0 + i,
+                "low": 9.0 + i,
+                "close": 10.5 + i,
+                "volume": 1000 * (i + 1),
+            }
+            for i in range(n_days)
+        ],
+    }
+
+
+class FakeResponse:
+    def __init__(self, payload: dict, status: int = 200):
+        self._payload = payload
+        self.status_code = status
+
+    def raise_for_status(self):
+        if self.status_code >= 400:
+            raise RuntimeError(f"HTTP {self.status_code}")
+
+    def json(self):
+        return self._payload
+
+
+class FakeHTTPError(Exception):
+    def __init__(self, status: int):
+        super().__init__(f"HTTP {status}")
+        self.response = FakeResponse({}, status)
+
+
+class FakeSession:
+    """Session simulada: responde BRAPI a partir de um dict symbol -> payload"""
+
+    def __init__(self, payloads: dict, invalid: tuple = ()):
+        self.payloads = payloads
+        self.invalid = set(invalid)
+        self.calls = []
+        self.headers = {}
+
+    def get(self, url, params=None, headers=None, timeout=None):
+        self.calls.append((url, dict(params or {})))
+        if "/finance/chart/" in url:
+            return self._yahoo(url.rsplit("/", 1)[-1].replace(".SA", ""), params)
+        symbols = url.rsplit("/", 1)[-1].split(",")
+        if self.invalid.intersection(symbols):
+            raise FakeHTTPError(404)
+        results = [self.payloads[s] for s in symbols if s in self.payloads]
+        return FakeResponse({"results": results})
+
+    def _yahoo(self, symbol, params):
+        """Yahoo chart v8 a partir do mesmo payload, respeitando period1/period2"""
+        if symbol in self.invalid:
+            raise FakeHTTPError(404)
+        bars = [bar for bar in self.payloads.get(symbol, {}).get("historicalDataPrice", [])
+                if params["period1"] <= bar["date"] < params["period2"]]
+        quote = {field: [bar[field] for bar in bars]
+                 for field in ("open", "high", "low", "close", "volume")}
+        return FakeResponse({"chart": {"result": [{
+            "timestamp": [bar["date"] for bar in bars],
+            "indicators": {"quote": [quote]},
+        }]}})
+
+
+@pytest.fixture(autouse=True)
+def brapi_window(monkeypatch):
+    """Datas fixas dos testes (2025) tratadas como dentro do range da BRAPI"""
+    monkeypatch.setattr(extract_module, "brapi_covers", lambda start_date: True)
+
+
+def test_parse_tickers(tmp_path):
+    """Testa leitura de tickers de argumento e arquivo"""
+    tickers_file = tmp_path / "ibov.txt"
+    tickers_file.write_text("# universo\nvale3\nITUB4.SA, BBDC4\n\nPETR4\n")
+
+    tickers = parse_tickers("PETR4,petr4", str(tickers_file))
+
+    assert tickers == ["PETR4", "VALE3", "ITUB4", "BBDC4"]
+
+
+def test_extract_many_shares_session():
+    """Testa extração concorrente de vários tickers com uma Session compartilhada"""
+    session = FakeSession({t: brapi_payload(t) for t in ["PETR4", "VALE3"]})
+
+    frames = extract_many(
+        ["PETR4", "VALE3"],
+        start_date="2025-01-01",
+        end_date="2025-01-10",
+        max_workers=2,
+        session=session,
+    )
+
+    assert set(frames) == {"PETR4", "VALE3"}
+    assert frames["VALE3"]["ticker"][0].as_py() == "vale3"
+    assert frames["VALE3"]["dataset"][0].as_py() == "vale3"
+    assert frames["PETR4"].num_rows == 3
+
+
+
+def test_fetch_brapi_batch_splits_results_and_isolates_failures():
+    """Testa lote BRAPI: uma requisição por lote e símbolo inválido isolado por bisseção"""
+    tickers = ["PETR4", "VALE3", "ITUB4", "BBDC4", "XXXX3"]
+    session = FakeSession(
+        {t: brapi_payload(t) for t in tickers if t != "XXXX3"},
+        invalid=("XXXX3",),
+    )
+
+    frames = fetch_brapi_batch(tickers[:4], range_period="1mo", session=session, batch_size=4)
+    assert set(frames) == {"PETR4", "VALE3", "ITUB4", "BBDC4"}
+    assert len(session.calls) == 1
+    assert frames["ITUB4"].column_names[:2] == ["Date", "Open"]
+
+    session.calls.clear()
+    frames = fetch_brapi_batch(tickers, range_period="1mo", session=session, batch_size=5)
+    assert set(frames) == {"PETR4", "VALE3", "ITUB4", "BBDC4"}
+    assert "XXXX3" not in frames
+
+
+
+def test_batch_skips_tickers_outside_brapi_range(tmp_path, monkeypatch):
+    """Testa lote: início além do range da BRAPI vai direto ao Yahoo (sem truncar)"""
+    monkeypatch.setattr(extract_module, "brapi_covers", lambda start_date: start_date >= "2025-01-02")
+    session = FakeSession({t: brapi_payload(t, n_days=5) for t in ["PETR4", "VALE3", "ITUB4"]})
+    store = LocalWatermarkStore(tmp_path)
+    store.update("petr4", "petr4", date(2025, 1, 2))
+    store.update("vale3", "vale3", date(2025, 1, 2))
+
+    frames = extract_many(
+        ["PETR4", "VALE3", "ITUB4"], start_date="2025-01-01", end_date="2025-01-10",
+        session=session, batch_size=3, watermarks=store,
+    )
+
+    brapi_calls = [url for url, _ in session.calls if "/finance/chart/" not in url]
+    yahoo_calls = [url for url, _ in session.calls if "/finance/chart/" in url]
+    assert len(brapi_calls) == 1 and brapi_calls[0].endswith("PETR4,VALE3")
+    assert len(yahoo_calls) == 1 and "ITUB4" in yahoo_calls[0]
+    assert frames["ITUB4"].num_rows == 5
+
+
+def test_incremental_extraction_uses_local_watermark(tmp_path):
+    """Testa watermark local: varredura do layout e extração só das datas que faltam"""
+    session = FakeSession({"PETR4": brapi_payload("PETR4", n_days=5)})
+    extractor = RealB3DataExtractor(ticker="PETR4", session=session)
+
+    df = extractor.extract_data(start_date="2025-01-01", end_date="2025-01-03")
+    extractor.save_local_parquet(df=df, output_path=tmp_path)
+
+    store = LocalWatermarkStore(tmp_path)
+    assert str(store.last_date("petr4", "petr4")) == "2025-01-03"
+    assert store.last_date("petr4", "vale3") is None
+
+    frames = extract_many(
+        ["PETR4"],
+        start_date="2025-01-01",
+        end_date="2025-01-10",
+        dataset_name="petr4",
+        session=session,
+        watermarks=store,
+    )
+    # O dia do watermark é rebuscado (pode ter sido gravado com o pregão em formação)
+    dates = [str(d) for d in frames["PETR4"]["date"].to_pylist()]
+    assert dates == ["2025-01-03", "2025-01-04", "2025-01-05", "2025-01-06"]
+
+    store.update("petr4", "petr4", frames["PETR4"]["date"][-1].as_py())
+    frames = extract_many(
+        ["PETR4"], start_date="2025-01-01", end_date="2025-01-05",
+        dataset_name="petr4", session=session, watermarks=store,
+    )
+    assert frames == {}
+
+
+
+def test_http_cache_hits_and_lru_eviction(tmp_path):
+    """Testa cache HTTP: repetição não chama a API e o limite de tamanho despeja o LRU"""
+    session = FakeSession({"PETR4": brapi_payload("PETR4")})
+    cache = HTTPResponseCache(tmp_path / "cache")
+
+    for _ in range(2):
+        extractor = RealB3DataExtractor(ticker="PETR4", session=session, cache=cache)
+        df = extractor.extract_data(start_date="2025-01-01", end_date="2025-01-10")
+        assert len(df) == 3
+
+    assert len(session.calls) == 1
+    assert cache.stats()["hits"] == 1
+    assert cache.stats()["misses"] == 1
+
+    small = HTTPResponseCache(tmp_path / "small", max_bytes=150)
+    small.set("https://x/a", {"p": 1}, {"v": "a" * 60}, ttl=None)
+    small.set("https://x/b", {"p": 1}, {"v": "b" * 60}, ttl=None)
+    assert small.get("https://X/a/", {"p": "1"}) is not None  # chave normalizada; "a" fica recente
+    small.set("https://x/c", {"p": 1}, {"v": "c" * 60}, ttl=None)
+
+    assert small.get("https://x/b", {"p": 1}) is None
+    assert small.get("https://x/a", {"p": 1}) is not None
+    assert small.stats()["evictions"] == 1
+
+
+
+def test_extract_table_is_typed_and_partitioned():
+    """Testa decodificação Arrow: tipos, filtro de período e colunas de partição"""
+    session = FakeSession({"PETR4": brapi_payload("PETR4", n_days=5)})
+    extractor = RealB3DataExtractor(ticker="PETR4", session=session)
+
+    table = extractor.extract_table(start_date="2025-01-03", end_date="2025-01-05")
+
+    assert table.num_rows == 3
+    assert str(table.schema.field("Close").type) == "double"
+    assert str(table.schema.field("Volume").type) == "int64"
+    assert str(table.schema.field("date").type) == "date32[day]"
+    assert table["day"].to_pylist() == [3, 4, 5]
+    assert set(table["month"].to_pylist()) == {1}
+
+    df = extractor.extract_data(start_date="2025-01-03", end_date="2025-01-05")
+    assert isinstance(df, pd.DataFrame)
+    assert df["ticker"].iloc[0] == "petr4"
+
+
+
+class SlowBrapiSession(FakeSession):
+    """BRAPI lenta (ou fora do ar) e Yahoo respondendo na hora"""
+
+    def __init__(self, brapi_delay: float = 0.0, brapi_down: bool = False):
+        super().__init__({"PETR4": brapi_payload("PETR4")})
+        self.brapi_delay = brapi_delay
+        self.brapi_down = brapi_down
+
+    def get(self, url, params=None, headers=None, timeout=None):
+        if "brapi.dev" in url:
+            time.sleep(self.brapi_delay)
+            if self.brapi_down:
+                raise FakeHTTPError(503)
+            return super().get(url, params, headers, timeout)
+        self.calls.append((url, dict(params or {})))
+        quotes = {k: [1.0, 2.0] for k in ("open", "high", "low", "close")}
+        quotes["volume"] = [10, 20]
+        return FakeResponse({"chart": {"result": [{
+            "timestamp": [FIRST_TS, FIRST_TS + DAY],
+            "indicators": {"quote": [quotes]},
+        }]}})
+
+
+def test_hedged_extraction_takes_first_valid_source():
+    """Testa hedge: BRAPI lenta perde a corrida para o Yahoo após o limiar"""
+    session = SlowBrapiSession(brapi_delay=1.0)
+    extractor = RealB3DataExtractor(
+        ticker="PETR4", session=session, hedge_after=0.05, breakers=build_breakers(["brapi", "yahoo"])
+    )
+
+    started = time.monotonic()
+    table = extractor.extract_table(start_date="2025-01-01", end_date="2025-01-10")
+
+    assert time.monotonic() - started < 0.9
+    assert table.num_rows == 2  # resposta do Yahoo
+
+
+def test_circuit_breaker_skips_failing_source_across_tickers():
+    """Testa circuit breaker: fonte aberta é pulada pelos tickers seguintes até o resfriamento"""
+    session = SlowBrapiSession(brapi_down=True)
+    breakers = build_breakers(["brapi", "yahoo"], failure_threshold=2, cooldown_seconds=60)
+    breakers["brapi"].record_failure()
+    assert breakers["brapi"].state == "closed"
+    breakers["brapi"].record_failure()
+    assert breakers["brapi"].state == "open"
+
+    for ticker in ["PETR4", "VALE3"]:
+        extractor = RealB3DataExtractor(ticker=ticker, session=session, breakers=breakers)
+        assert extractor.extract_table(start_date="2025-01-01", end_date="2025-01-10").num_rows == 2
+
+    assert not [url for url, _ in session.calls if "brapi.dev" in url]
+
+    breakers["brapi"].cooldown_seconds = 0
+    assert breakers["brapi"].state == "half_open"
+    assert breakers["brapi"].allow()
+    assert not breakers["brapi"].allow()  # apenas uma chamada de teste
+    breakers["brapi"].record_success()
+    assert breakers["brapi"].state == "closed"
+
+
+def test_circuit_breaker_cancelled_trial_is_released():
+    """Testa half-open: chamada de teste cancelada pelo hedge não bloqueia a fonte"""
+    breakers = build_breakers(["brapi", "yahoo"], failure_threshold=1, cooldown_seconds=0)
+    breakers["brapi"].record_failure()
+    extractor = RealB3DataExtractor(ticker="PETR4", session=SlowBrapiSession(), breakers=breakers)
+    cancel = threading.Event()
+
+    def cancelled_call(event):
+        cancel.set()  # a outra fonte venceu durante a chamada
+        raise FakeHTTPError(503)
+
+    with pytest.raises(FakeHTTPError):
+        extractor._run_source("brapi", cancelled_call, cancel)
+
+    assert breakers["brapi"].state == "half_open"
+    assert breakers["brapi"].allow()
+
+
+
+def test_rate_limiter_paces_workers_and_persists_quota(tmp_path):
+    """Testa token bucket: ritmo entre workers, cota diária e estado compartilhado em arquivo"""
+    state_path = tmp_path / "rate_limit.json"
+    limiter = TokenBucketRateLimiter("brapi", rate_per_second=50, burst=2, daily_quota=8,
+                                     state_path=state_path)
+    session = FakeSession({t: brapi_payload(t) for t in ["PETR4", "VALE3", "ITUB4", "BBDC4"]})
+
+    started = time.monotonic()
+    frames = extract_many(
+        ["PETR4", "VALE3", "ITUB4", "BBDC4"],
+        start_date="2025-01-01", end_date="2025-01-10",
+        max_workers=4, session=session, rate_limiters={"brapi": limiter},
+    )
+    elapsed = time.monotonic() - started
+
+    assert len(frames) == 4
+    assert elapsed >= (4 - 2) / 50 * 0.9  # burst de 2, demais espaçados a 50 req/s
+    assert limiter.stats()["waited_requests"] == 2
+
+    # Próxima execução (novo processo) continua a mesma cota diária
+    next_run = TokenBucketRateLimiter("brapi", rate_per_second=1000, burst=10, daily_quota=8,
+                                      state_path=state_path)
+    for _ in range(4):
+        next_run.acquire()
+    with pytest.raises(RateLimitExceeded):
+        next_run.acquire()
+
+
+
+class FakeS3:
+    """Cliente S3 em memória (put_object/head_object)"""
+
+    def __init__(self):
+        self.objects = {}
+        self.puts = 0
+
+    def put_object(self, Bucket, Key, Body, Metadata=None, **kwargs):
+        self.puts += 1
+        self.objects[(Bucket, Key)] = (Body, Metadata or {})
+
+    def head_object(self, Bucket, Key):
+        from botocore.exceptions import ClientError
+        if (Bucket, Key) not in self.objects:
+            raise ClientError({"Error": {"Code": "404"}}, "HeadObject")
+        return {"Metadata": self.objects[(Bucket, Key)][1]}
+
+
+def test_parallel_upload_skips_unchanged_partitions():
+    """Testa upload paralelo: reexecução só envia partições novas ou alteradas"""
+    session = FakeSession({"PETR4": brapi_payload("PETR4", n_days=4)})
+    extractor = RealB3DataExtractor(ticker="PETR4", session=session)
+    s3 = FakeS3()
+
+    def upload(table):
+        keys = [
+            (f"raw/day={row['day']}/data.parquet", table.slice(i, 1))
+            for i, row in enumerate(table.select(["day"]).to_pylist())
+        ]
+        return ParallelS3Uploader("bucket", max_workers=4, s3_client=s3).upload(keys)
+
+    first = upload(extractor.extract_table("2025-01-01", "2025-01-04"))
+    assert first["uploaded"] == 3
+
+    # Nova extração (extraction_timestamp diferente) + um dia novo e um dia alterado
+    session.payloads["PETR4"]["historicalDataPrice"][1]["close"] = 99.0
+    second = upload(extractor.extract_table("2025-01-01", "2025-01-05"))
+    assert second["uploaded"] == 2
+    assert second["skipped"] == 2
+    assert s3.puts == 5
+
+
+
+def test_compaction_merges_closed_months_and_keeps_watermark(tmp_path):
+    """Testa compactação local: mês encerrado vira um arquivo; mês aberto e watermark intactos"""
+    session = FakeSession({"PETR4": brapi_payload("PETR4", n_days=45)})  # 02/01 a 15/02
+    extractor = RealB3DataExtractor(ticker="PETR4", session=session)
+    table = extractor.extract_table("2025-01-01", "2025-02-28")
+    extractor.save_local_parquet(table, tmp_path)
+
+    compactor = PartitionCompactor(LocalPartitionStorage(tmp_path), level='month',
+                                   today=date(2025, 2, 20))
+    totals = compactor.run()
+    assert totals['groups'] == 1 and totals['files_in'] == 30 and totals['rows'] == 30
+
+    january = tmp_path / "year=2025" / "month=1"
+    files = list(january.iterdir())
+    assert len(files) == 1 and files[0].name.startswith("compacted-")
+    compacted = pq.read_table(files[0], partitioning=None)
+    assert compacted['day'].to_pylist() == list(range(2, 32))
+    assert len(list((tmp_path / "year=2025" / "month=2").iterdir())) == 15
+
+    # Reexecução não tem o que compactar; watermark sai do arquivo compactado se preciso
+    assert compactor.run()['groups'] == 0
+    assert LocalWatermarkStore(tmp_path).last_date("petr4", "petr4") == date(2025, 2, 15)
+    PartitionCompactor(LocalPartitionStorage(tmp_path), today=date(2025, 3, 10)).run()
+    assert LocalWatermarkStore(tmp_path).last_date("petr4", "petr4") == date(2025, 2, 15)
+
+
+
+def test_compaction_day_rewritten_after_compaction_replaces_its_rows(tmp_path):
+    """Testa dia regravado num mês já compactado: o arquivo do dia vence, sem duplicar"""
+    session = FakeSession({"PETR4": brapi_payload("PETR4", n_days=30)})  # 02/01 a 31/01
+    extractor = RealB3DataExtractor(ticker="PETR4", session=session)
+    extractor.save_local_parquet(extractor.extract_table("2025-01-01", "2025-01-31"), tmp_path)
+    compactor = PartitionCompactor(LocalPartitionStorage(tmp_path), level='month', today=date(2025, 2, 20))
+    compactor.run()
+
+    # Lambda rebusca janeiro: o dia 10 volta corrigido em day=10/
+    session.payloads["PETR4"]["historicalDataPrice"][8]["close"] = 99.0
+    corrected = extractor.extract_table("2025-01-01", "2025-01-31")
+    extractor.save_local_parquet(corrected.filter(pc.equal(corrected["day"], 10)), tmp_path)
+
+    totals = compactor.run()
+    assert totals['groups'] == 1 and totals['rows'] == 30
+    files = list((tmp_path / "year=2025" / "month=1").iterdir())
+    assert len(files) == 1
+    compacted = pq.read_table(files[0], partitioning=None)
+    assert compacted['day'].to_pylist() == list(range(2, 32))
+    assert compacted.filter(pc.equal(compacted['day'], 10))['Close'].to_pylist() == [99.0]
+
+
+def test_compaction_refuses_glue_outputs():
+    """Testa escopo: refined/ (catálogo por dia, regravado pelo Glue) não é compactado"""
+    with pytest.raises(ValueError, match="raw/"):
+        storage_for("s3://bucket/refined/dataset=petr4")
+    with pytest.raises(ValueError, match="raw/"):
+        storage_for("local_data/refined_agg")
+    assert isinstance(storage_for("local_data/raw"), LocalPartitionStorage)
+
+
+def test_parquet_sink_streams_and_dedupes_reruns(tmp_path):
+    """Testa sink em streaming: um arquivo por partição, reexecução substitui em vez de duplicar"""
+    session = FakeSession({"PETR4": brapi_payload("PETR4", n_days=3)})
+    extractor = RealB3DataExtractor(ticker="PETR4", session=session)
+    first = extractor.extract_table("2025-01-01", "2025-01-04")
+
+    with PartitionedParquetSink(tmp_path, row_group_size=2, max_open_writers=1) as sink:
+        for batch in first.to_batches(max_chunksize=1):
+            sink.write(batch)
+        sink.write(first.slice(0, 1))  # repetição dentro do fluxo
+    assert sink.duplicates == 1
+
+    # Reexecução com um dia novo e o fechamento de 03/01 corrigido
+    session.payloads["PETR4"] = brapi_payload("PETR4", n_days=4)
+    session.payloads["PETR4"]["historicalDataPrice"][1]["close"] = 99.0
+    extractor.save_local_parquet(extractor.extract_table("2025-01-01", "2025-01-05"), tmp_path)
+
+    files = sorted(tmp_path.rglob("*.parquet"))
+    assert [f.name for f in files] == ["data.parquet"] * 4
+    stored = pq.read_table(tmp_path).sort_by("Date")
+    assert stored.num_rows == 4
+    assert stored["Close"].to_pylist() == [10.5, 99.0, 12.5, 13.5]
+
+
+
+def test_parquet_sink_rewrites_each_partition_once(tmp_path, monkeypatch):
+    """Testa limite de writers: partições suspensas são consolidadas uma vez, no fechamento"""
+    tickers = ["PETR4", "VALE3", "ITUB4"]
+    session = FakeSession({t: brapi_payload(t, n_days=5) for t in tickers})
+    frames = extract_many(tickers, "2025-01-01", "2025-01-10", dataset_name="petr4", session=session)
+    RealB3DataExtractor(ticker="PETR4", session=session).save_local_parquet(frames["PETR4"], tmp_path)
+
+    replaced = []
+    replace = os.replace
+    monkeypatch.setattr(os, "replace", lambda src, dst: (replaced.append(dst), replace(src, dst)))
+    with PartitionedParquetSink(tmp_path, max_open_writers=2) as sink:
+        for ticker in tickers:  # ticker a ticker: cada dia é reaberto a cada ticker
+            sink.write(conform_raw(frames[ticker], keep=tuple(sink.partition_cols)))
+        assert replaced == []  # partições suspensas ficam em segmentos temporários
+
+    assert len(replaced) == 5 and len(set(replaced)) == 5
+    assert not list(tmp_path.rglob(".*.tmp"))
+    stored = pq.read_table(tmp_path)
+    assert stored.num_rows == 15
+    assert sorted(stored["ticker"].unique().to_pylist()) == ["itub4", "petr4", "vale3"]
+
+
+def test_backfill_resumes_from_manifest(tmp_path, monkeypatch):
+    """Testa backfill: blocos via Yahoo (fora do range da BRAPI) e retomada só dos que falharam"""
+    monkeypatch.setattr(extract_module, "brapi_covers", lambda start_date: False)
+    # Sem backoff entre as tentativas do Yahoo para o ticker inválido
+    monkeypatch.setattr(RealB3DataExtractor._fetch_yahoo_query_api.retry, "wait",
+                        lambda retry_state: 0)
+    session = FakeSession(
+        {t: brapi_payload(t, n_days=20) for t in ["PETR4", "VALE3"]},  # 02/01 a 21/01
+        invalid=("VALE3",),
+    )
+    manifest_path = tmp_path / "manifest.json"
+    chunks = plan_chunks(["PETR4", "VALE3"], "2025-01-01", "2025-01-21", chunk_days=7)
+    assert [c['end'] for c in chunks[:3]] == ["2025-01-07", "2025-01-14", "2025-01-21"]
+
+    stats = run_backfill(["PETR4", "VALE3"], "2025-01-01", "2025-01-21",
+                         manifest=BackfillManifest(manifest_path), output_dir=tmp_path / "raw",
+                         chunk_days=7, max_workers=3, checkpoint_every=2, session=session,
+                         breakers=build_breakers(["brapi", "yahoo"], failure_threshold=100))
+    assert stats['done'] == 3 and stats['empty'] == 3 and stats['rows'] == 20
+    assert all("/finance/chart/" in url for url, _ in session.calls)
+
+    # Retomada: só os blocos de VALE3 são refeitos
+    session.invalid.clear()
+    session.calls.clear()
+    stats = run_backfill(["PETR4", "VALE3"], "2025-01-01", "2025-01-21",
+                         manifest=BackfillManifest(manifest_path), output_dir=tmp_path / "raw",
+                         chunk_days=7, max_workers=3, session=session, breakers={})
+    assert stats['skipped'] == 3 and stats['done'] == 3
+    assert {url.rsplit("/", 1)[-1] for url, _ in session.calls} == {"VALE3.SA"}
+
+    stored = pq.read_table(tmp_path / "raw")
+    assert stored.num_rows == 40
+    assert LocalWatermarkStore(tmp_path / "raw").last_date("vale3", "vale3") == date(2025, 1, 21)
+
+
+if __name__ == '__main__':
+    pytest.main([__file__, '-v'])
@@ -41,6 +41,10 @@ module "lambda" {
   ticker                       = var.ticker
   dataset                      = var.dataset_name
   scraping_days                = 5
+  tickers                      = var.tickers
+  tickers_s3_uri               = var.tickers_s3_uri
+  shard_size                   = var.scraping_shard_size
+  coalesce_window_seconds      = var.glue_trigger_window_seconds
   tags                         = local.common_tags
 
   depends_on = [module.iam]
@@ -50,12 +54,15 @@ module "lambda" {
 module "eventbridge" {
   source = "./modules/eventbridge"
 
-  project_name         = var.project_name
-  environment          = var.environment
-  lambda_scraping_arn  = module.lambda.scraping_function_arn
-  lambda_scraping_name = module.lambda.scraping_function_name
-  schedule_expression  = "cron(0 22 ? * MON-FRI *)" # 19h BRT, dias úteis
-  tags                 = local.common_tags
+  project_name             = var.project_name
+  environment              = var.environment
+  lambda_scraping_arn      = module.lambda.scraping_function_arn
+  lambda_scraping_name     = module.lambda.scraping_function_name
+  lambda_trigger_glue_arn  = module.lambda.trigger_glue_function_arn
+  lambda_trigger_glue_name = module.lambda.trigger_glue_function_name
+  glue_job_name            = "${var.project_name}-etl-${var.environment}"
+  schedule_expression      = "cron(0 22 ? * MON-FRI *)" # 19h BRT, dias úteis
+  tags                     = local.common_tags
 
   depends_on = [module.lambda]
 }
@@ -28,6 +28,64 @@ resource "aws_cloudwatch_event_target" "lambda_scraping" {
   })
 }
 
+# Flush periódico da coalescência: inicia runs cujas janelas venceram
+resource "aws_cloudwatch_event_rule" "trigger_glue_flush" {
+  name                = "${var.project_name}-trigger-glue-flush-${var.environment}"
+  description         = "Inicia os Glue Jobs pendentes (eventos S3 coalescidos)"
+  schedule_expression = var.trigger_flush_schedule
+
+  tags = var.tags
+}
+
+resource "aws_cloudwatch_event_target" "trigger_glue_flush" {
+  rule      = aws_cloudwatch_event_rule.trigger_glue_flush.name
+  target_id = "LambdaTriggerGlueFlush"
+  arn       = var.lambda_trigger_glue_arn
+
+  input = jsonencode({
+    source = "coalesce-flush"
+  })
+}
+
+# Fim de um run do Glue: inicia o follow-up enfileirado (e reenfileira runs com falha)
+resource "aws_cloudwatch_event_rule" "glue_job_state" {
+  name        = "${var.project_name}-glue-job-state-${var.environment}"
+  description = "Runs do Glue ETL finalizados"
+
+  event_pattern = jsonencode({
+    source        = ["aws.glue"]
+    "detail-type" = ["Glue Job State Change"]
+    detail = {
+      jobName = [var.glue_job_name]
+      state   = ["SUCCEEDED", "FAILED", "TIMEOUT", "STOPPED", "ERROR"]
+    }
+  })
+
+  tags = var.tags
+}
+
+resource "aws_cloudwatch_event_target" "glue_job_state" {
+  rule      = aws_cloudwatch_event_rule.glue_job_state.name
+  target_id = "LambdaTriggerGlueJobState"
+  arn       = var.lambda_trigger_glue_arn
+}
+
+resource "aws_lambda_permission" "allow_eventbridge_trigger_flush" {
+  statement_id  = "AllowFlushFromEventBridge"
+  action        = "lambda:InvokeFunction"
+  function_name = var.lambda_trigger_glue_name
+  principal     = "events.amazonaws.com"
+  source_arn    = aws_cloudwatch_event_rule.trigger_glue_flush.arn
+}
+
+resource "aws_lambda_permission" "allow_eventbridge_glue_state" {
+  statement_id  = "AllowGlueStateFromEventBridge"
+  action        = "lambda:InvokeFunction"
+  function_name = var.lambda_trigger_glue_name
+  principal     = "events.amazonaws.com"
+  source_arn    = aws_cloudwatch_event_rule.glue_job_state.arn
+}
+
 # Permissão para EventBridge invocar Lambda
 resource "aws_lambda_permission" "allow_eventbridge" {
   statement_id  = "AllowExecutionFromEventBridge"
@@ -18,6 +18,27 @@ variable "lambda_scraping_name" {
   type        = string
 }
 
+variable "lambda_trigger_glue_arn" {
+  description = "ARN da função Lambda que aciona o Glue"
+  type        = string
+}
+
+variable "lambda_trigger_glue_name" {
+  description = "Nome da função Lambda que aciona o Glue"
+  type        = string
+}
+
+variable "glue_job_name" {
+  description = "Nome do Glue Job ETL (eventos de mudança de estado)"
+  type        = string
+}
+
+variable "trigger_flush_schedule" {
+  description = "Frequência do flush dos triggers coalescidos"
+  type        = string
+  default     = "rate(5 minutes)"
+}
+
 variable "schedule_expression" {
   description = "Expressão cron para agendamento (UTC)"
   type        = string
@@ -85,6 +85,26 @@ resource "aws_s3_object" "glue_script" {
   tags = var.tags
 }
 
+# Biblioteca de indicadores importada pelo script (--extra-py-files)
+resource "aws_s3_object" "glue_indicators" {
+  bucket = var.s3_bucket_name
+  key    = "glue-scripts/indicators.py"
+  source = "${path.root}/../src/glue/indicators.py"
+  etag   = filemd5("${path.root}/../src/glue/indicators.py")
+
+  tags = var.tags
+}
+
+# Planejamento do job (leitura incremental, contrato do raw) importado pelo script
+resource "aws_s3_object" "glue_etl_plan" {
+  bucket = var.s3_bucket_name
+  key    = "glue-scripts/etl_plan.py"
+  source = "${path.root}/../src/glue/etl_plan.py"
+  etag   = filemd5("${path.root}/../src/glue/etl_plan.py")
+
+  tags = var.tags
+}
+
 # Glue Job ETL
 resource "aws_glue_job" "etl" {
   name              = "${var.project_name}-etl-${var.environment}"
@@ -108,10 +128,15 @@ resource "aws_glue_job" "etl" {
     "--enable-spark-ui"                  = "true"
     "--spark-event-logs-path"            = "s3://${var.s3_bucket_name}/glue-spark-logs/"
     "--TempDir"                          = "s3://${var.s3_bucket_name}/glue-temp/"
+    "--extra-py-files"                   = "s3://${var.s3_bucket_name}/${aws_s3_object.glue_indicators.key},s3://${var.s3_bucket_name}/${aws_s3_object.glue_etl_plan.key}"
     "--S3_BUCKET"                        = var.s3_bucket_name
     "--DATASET"                          = var.dataset
     "--TICKER"                           = var.ticker
+    "--TICKERS"                          = var.tickers
     "--CRAWLER_NAME"                      = aws_glue_crawler.refined.name
+    "--CHANGED_DATES"                    = ""
+    "--REFINED_LAYOUT"                   = var.refined_layout
+    "--TARGET_FILE_MB"                   = var.target_file_mb
   }
 
   execution_property {
@@ -148,6 +173,15 @@ resource "aws_glue_crawler" "refined" {
     path = "s3://${var.s3_bucket_name}/refined/dataset=${var.dataset}/"
   }
 
+  # Agregações persistidas pelo job (tabelas agg_mensal e agg_total, KBs por ticker)
+  s3_target {
+    path = "s3://${var.s3_bucket_name}/refined_agg/agg_mensal/"
+  }
+
+  s3_target {
+    path = "s3://${var.s3_bucket_name}/refined_agg/agg_total/"
+  }
+
   schedule = "cron(0 23 ? * MON-FRI *)" # 20h BRT (23h UTC), após o Glue Job
 
   schema_change_policy {
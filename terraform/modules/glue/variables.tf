@@ -23,12 +23,30 @@ variable "ticker" {
   type        = string
 }
 
+variable "tickers" {
+  description = "Tickers processados por run (lista separada por vírgula ou \"all\"); vazio = só ticker"
+  type        = string
+  default     = ""
+}
+
 variable "glue_version" {
   description = "Versão do AWS Glue"
   type        = string
   default     = "4.0"
 }
 
+variable "refined_layout" {
+  description = "Particionamento do refined: day (year/month/day, catálogo atual; um arquivo de uma linha por ticker/dia, target_file_mb não se aplica) ou month (year/month, arquivos no tamanho alvo; exige migrar a tabela refined)"
+  type        = string
+  default     = "day"
+}
+
+variable "target_file_mb" {
+  description = "Tamanho alvo dos arquivos Parquet do refined (MB)"
+  type        = number
+  default     = 128
+}
+
 variable "tags" {
   description = "Tags comuns para recursos"
   type        = map(string)
@@ -50,6 +50,23 @@ resource "aws_iam_role_policy" "lambda_s3_access" {
   })
 }
 
+# Coordenador invoca a própria função (workers por shard do universo de tickers)
+resource "aws_iam_role_policy" "lambda_scraping_fanout" {
+  name = "lambda-scraping-fanout"
+  role = aws_iam_role.lambda_scraping.id
+
+  policy = jsonencode({
+    Version = "2012-10-17"
+    Statement = [
+      {
+        Effect   = "Allow"
+        Action   = ["lambda:InvokeFunction"]
+        Resource = "arn:aws:lambda:*:*:function:${var.project_name}-scraping-${var.environment}"
+      }
+    ]
+  })
+}
+
 # Attach AWS managed policy para CloudWatch Logs
 resource "aws_iam_role_policy_attachment" "lambda_logs" {
   role       = aws_iam_role.lambda_scraping.name
@@ -102,6 +119,27 @@ resource "aws_iam_role_policy" "lambda_start_glue" {
   })
 }
 
+# Estado da coalescência de triggers (tabela criada no módulo lambda)
+resource "aws_iam_role_policy" "lambda_trigger_state" {
+  name = "lambda-trigger-state"
+  role = aws_iam_role.lambda_trigger_glue.id
+
+  policy = jsonencode({
+    Version = "2012-10-17"
+    Statement = [
+      {
+        Effect = "Allow"
+        Action = [
+          "dynamodb:GetItem",
+          "dynamodb:UpdateItem",
+          "dynamodb:Scan"
+        ]
+        Resource = "arn:aws:dynamodb:*:*:table/${var.project_name}-glue-trigger-state-${var.environment}"
+      }
+    ]
+  })
+}
+
 # Attach basic execution role para Lambda Trigger
 resource "aws_iam_role_policy_attachment" "lambda_trigger_logs" {
   role       = aws_iam_role.lambda_trigger_glue.name
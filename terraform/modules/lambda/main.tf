@@ -29,6 +29,10 @@ resource "aws_lambda_function" "scraping" {
       S3_BUCKET = var.s3_bucket_name
       S3_PREFIX = "raw"
       DAYS      = var.scraping_days
+      # Universo (fan-out por shards): lista no env ou arquivo no S3; vazio = só TICKER
+      TICKERS        = join(",", var.tickers)
+      TICKERS_S3_URI = var.tickers_s3_uri
+      SHARD_SIZE     = var.shard_size
     }
   }
 
@@ -65,6 +69,10 @@ resource "aws_lambda_function" "trigger_glue" {
   environment {
     variables = {
       GLUE_JOB_NAME = "${var.project_name}-etl-${var.environment}"
+      S3_BUCKET     = var.s3_bucket_name
+      # Coalescência de eventos por (dataset, ticker): estado no DynamoDB
+      TRIGGER_STATE_TABLE     = aws_dynamodb_table.trigger_state.name
+      COALESCE_WINDOW_SECONDS = var.coalesce_window_seconds
     }
   }
 
@@ -78,6 +86,27 @@ resource "aws_lambda_function" "trigger_glue" {
   )
 }
 
+# Estado da coalescência de triggers: datas pendentes e run em andamento por (dataset, ticker)
+resource "aws_dynamodb_table" "trigger_state" {
+  name         = "${var.project_name}-glue-trigger-state-${var.environment}"
+  billing_mode = "PAY_PER_REQUEST"
+  hash_key     = "pk"
+
+  attribute {
+    name = "pk"
+    type = "S"
+  }
+
+  tags = merge(
+    var.tags,
+    {
+      Name      = "${var.project_name}-glue-trigger-state-${var.environment}"
+      Component = "DynamoDB"
+      Function  = "GlueTrigger"
+    }
+  )
+}
+
 # CloudWatch Log Group para Lambda Trigger Glue
 resource "aws_cloudwatch_log_group" "trigger_glue" {
   name              = "/aws/lambda/${aws_lambda_function.trigger_glue.function_name}"
@@ -22,3 +22,8 @@ output "s3_permission_id" {
   description = "ID da permissão S3 para Lambda (usado para depends_on)"
   value       = aws_lambda_permission.allow_s3.id
 }
+
+output "trigger_state_table_name" {
+  description = "Tabela DynamoDB com o estado de coalescência dos triggers do Glue"
+  value       = aws_dynamodb_table.trigger_state.name
+}
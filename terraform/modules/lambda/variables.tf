@@ -41,6 +41,30 @@ variable "scraping_days" {
   default     = 5
 }
 
+variable "tickers" {
+  description = "Universo de tickers processado pela Lambda de scraping (vazio = apenas var.ticker)"
+  type        = list(string)
+  default     = []
+}
+
+variable "tickers_s3_uri" {
+  description = "Arquivo no S3 com o universo (um ticker por linha); tem precedência sobre var.tickers"
+  type        = string
+  default     = ""
+}
+
+variable "shard_size" {
+  description = "Tickers por invocação worker; universos maiores são divididos em shards"
+  type        = number
+  default     = 50
+}
+
+variable "coalesce_window_seconds" {
+  description = "Janela de coalescência dos eventos S3 antes de iniciar o Glue Job (0 = imediato)"
+  type        = number
+  default     = 120
+}
+
 variable "tags" {
   description = "Tags comuns para recursos"
   type        = map(string)
@@ -40,6 +40,30 @@ variable "ticker" {
   default     = "petr4"
 }
 
+variable "tickers" {
+  description = "Universo de tickers da Lambda de scraping (vazio = apenas var.ticker)"
+  type        = list(string)
+  default     = []
+}
+
+variable "tickers_s3_uri" {
+  description = "s3://bucket/arquivo com o universo de tickers (um por linha), opcional"
+  type        = string
+  default     = ""
+}
+
+variable "scraping_shard_size" {
+  description = "Tickers por invocação worker da Lambda de scraping"
+  type        = number
+  default     = 50
+}
+
+variable "glue_trigger_window_seconds" {
+  description = "Janela de coalescência dos eventos S3 por (dataset, ticker) antes de iniciar o Glue Job"
+  type        = number
+  default     = 120
+}
+
 variable "glue_database_name" {
   description = "Glue Catalog database name"
   type        = string